@@ -0,0 +1,67 @@
+"""Field-selective routing extraction vs json.loads of webhook payloads.
+
+Run from the repository root:
+
+    python -m benchmarks.routing_payload
+"""
+import io
+import json
+import timeit
+import tracemalloc
+from functools import partial
+
+from src.task_interfaces.routing import extract_routing
+
+from .webhooks import pull_request_bytes
+
+FIXTURES = {
+    'pr 26KB': dict(body_size=2000),
+    'pr 100KB body': dict(body_size=100000),
+    'pr 300KB body': dict(body_size=300000),
+    'pr 200 labels': dict(body_size=2000, labels=200),
+}
+
+
+def full_parse(raw):
+    payload = json.loads(raw)
+    pull_request = payload['pull_request']
+    return (payload['action'], payload['repository']['id'],
+            pull_request['user']['login'], pull_request['head']['ref'],
+            pull_request['title'])
+
+
+def best(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def peak_kb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _stream(extract, raw):
+    return extract(io.BytesIO(raw))
+
+
+def main():
+    print(f"{'fixture':<16}{'bytes':>9}{'json.loads':>13}{'extract':>11}"
+          f"{'stream':>11}{'peak parse':>13}{'peak stream':>13}")
+    for name, kwargs in FIXTURES.items():
+        raw = pull_request_bytes(**kwargs)
+        number = 200
+        extract = partial(extract_routing, 'pull_request')
+        parsed = best(partial(full_parse, raw), number)
+        extracted = best(partial(extract, raw), number)
+        streamed = best(partial(_stream, extract, raw), number)
+        parse_peak = peak_kb(partial(full_parse, raw))
+        stream_peak = peak_kb(partial(_stream, extract, raw))
+        print(f'{name:<16}{len(raw):>9}{parsed:>11.1f}us{extracted:>9.1f}us'
+              f'{streamed:>9.1f}us{parse_peak:>11.0f}KB{stream_peak:>11.0f}KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Benchmarks for model construction, manifest export and event routing.
+
+Run from the repository root:
+
+    python -m benchmarks.run                      # print results
+    python -m benchmarks.run --sizes 100,1000     # smaller catalogs
+    python -m benchmarks.run --output benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Timings are reported in microseconds per task (memory in bytes per task)
+so catalogs of different sizes can be compared. --compare exits non-zero
+when a metric is more than --threshold times slower than the baseline.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import pydantic
+
+from src.task_interfaces import TaskCatalog
+from src.task_interfaces.compact import memory_report
+from src.task_interfaces.loader import parse_task
+
+from .synthetic import task_configs
+
+SIZES = (100, 1000, 10000, 50000)
+
+V1_ACCESSORS = (
+    'has_check_run_capability',
+    'has_main_branch_capability',
+    'has_githaxs_worker_capability',
+    'has_task_orchestrator_capability',
+    'has_aws_iam_assume_role_capability',
+    'has_inject_ssm_parameters_capability',
+    'allows_for_hotfixes',
+    'ignored_authors',
+    'get_checkout_depth',
+    'has_checkout_capability',
+)
+
+
+def v2_accessors(task):
+    capabilities = task.capabilities
+    return (
+        capabilities.check_run.enabled,
+        capabilities.main_branch_analysis.enabled,
+        capabilities.githaxs_worker.enabled,
+        capabilities.task_orchestrator.enabled,
+        capabilities.assume_iam_role.enabled,
+        capabilities.assume_iam_role.inject_ssm_parameters,
+        capabilities.check_run.allow_hotfix,
+        capabilities.check_run.ignored_authors,
+        capabilities.checkout.depth,
+        capabilities.checkout.enabled,
+    )
+
+
+def timed(fn):
+    gc.collect()
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def per_task(seconds, count):
+    return round(seconds / count * 1e6, 3)
+
+
+def bench(version, size):
+    configs = task_configs(size, version)
+    results = {}
+
+    elapsed, models = timed(lambda: [parse_task(x) for x in configs])
+    results['construct_us'] = per_task(elapsed, size)
+
+    elapsed, _ = timed(lambda: [x.to_json() for x in models])
+    results['to_json_us'] = per_task(elapsed, size)
+    elapsed, _ = timed(lambda: [x.to_json() for x in models])
+    results['to_json_cached_us'] = per_task(elapsed, size)
+
+    elapsed, _ = timed(lambda: [x.get_subscribed_events() for x in models])
+    results['subscribed_events_us'] = per_task(elapsed, size)
+
+    if version == 1:
+        def accessors():
+            for task in models:
+                for name in V1_ACCESSORS:
+                    getattr(task, name)()
+    else:
+        def accessors():
+            for task in models:
+                v2_accessors(task)
+    elapsed, _ = timed(accessors)
+    results['accessors_us'] = per_task(elapsed, size)
+
+    elapsed, index = timed(lambda: TaskCatalog(models))
+    results['catalog_build_us'] = per_task(elapsed, size)
+    lookups = 10000
+    elapsed, _ = timed(lambda: [
+        index.route('pull_request', 'synchronize') for _ in range(lookups)])
+    results['route_lookup_us'] = round(elapsed / lookups * 1e6, 3)
+
+    # Released before measuring memory; del would confuse pyflakes about
+    # the lambdas above
+    models = index = None
+    gc.collect()
+    tracemalloc.start()
+    tasks = [parse_task(x) for x in configs]
+    results['memory_bytes'] = tracemalloc.get_traced_memory()[0] // size
+    tracemalloc.stop()
+
+    del tasks
+    report = memory_report(configs)
+    results['catalog_memory_bytes'] = report['bytes_per_task']
+    results['compact_catalog_memory_bytes'] = report['compact_bytes_per_task']
+    return results
+
+
+def run(sizes):
+    results = {}
+    for version in (1, 2):
+        for size in sizes:
+            key = f'v{version}/{size}'
+            results[key] = bench(version, size)
+            print(key, json.dumps(results[key]), file=sys.stderr)
+    return {
+        'python': platform.python_version(),
+        'pydantic': pydantic.VERSION,
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    regressions = []
+    for key, metrics in current['results'].items():
+        for name, value in metrics.items():
+            before = baseline['results'].get(key, {}).get(name)
+            if not before:
+                continue
+            ratio = value / before
+            flag = ''
+            if ratio > threshold:
+                flag = '  REGRESSION'
+                regressions.append(f'{key} {name}')
+            print(f'{key:<10} {name:<22} {before:>12} -> {value:>12} '
+                  f'({ratio:.2f}x){flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)))
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    args = parser.parse_args()
+
+    current = run([int(x) for x in args.sizes.split(',')])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(current, baseline, args.threshold):
+            sys.exit(1)
+    elif not args.output:
+        print(json.dumps(current, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
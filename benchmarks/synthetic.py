@@ -0,0 +1,80 @@
+"""Synthetic task catalogs with a realistic mix of capabilities."""
+import random
+
+EVENTS = ['issues.opened', 'pull_request.labeled', 'release.published']
+TAGS = ['python', 'node', 'security', 'lint', 'test', 'docs', 'aws']
+AUTHORS = ['dependabot[bot]', 'renovate[bot]', 'github-actions[bot]']
+
+
+def v1_task_config(i, rng):
+    capabilities = [{'type': 'checkout', 'depth': rng.choice([0, 1, 1, 50])}]
+    if rng.random() < 0.8:
+        capabilities.append({
+            'type': 'checkrun',
+            'ignored_authors': rng.sample(AUTHORS, rng.randint(0, 2)),
+            'allow_hotfix': rng.random() < 0.3,
+            'fix_errors': rng.random() < 0.2,
+            'actions': [],
+        })
+    if rng.random() < 0.2:
+        capabilities.append({'type': 'main-branch-analysis'})
+    if rng.random() < 0.1:
+        capabilities.append({
+            'type': 'aws-assume-iam-role',
+            'inject_ssm_parameters': rng.random() < 0.5})
+    if rng.random() < 0.1:
+        capabilities.append({'type': 'githaxs-worker'})
+    if rng.random() < 0.3:
+        capabilities.append({'type': 'inject-settings'})
+    return {
+        'name': f'Task {i}',
+        'summary': 'Synthetic task',
+        'description': 'Synthetic task used for benchmarking',
+        'capabilities': capabilities,
+        'subscription_level': rng.randint(0, 3),
+        'runtime': rng.choice(['bash', 'python']),
+        'tags': rng.sample(TAGS, 2),
+        'subscribed_events': rng.sample(EVENTS, rng.randint(0, 1)),
+        'packages': {'python': ['flake8'] if rng.random() < 0.5 else []},
+    }
+
+
+def v2_task_config(i, rng):
+    return {
+        'version': 2,
+        'name': f'Task {i}',
+        'summary': 'Synthetic task',
+        'description': 'Synthetic task used for benchmarking',
+        'capabilities': {
+            'check_run': {
+                'enabled': rng.random() < 0.8,
+                'ignored_authors': rng.sample(AUTHORS, rng.randint(0, 2)),
+                'allow_hotfix': rng.random() < 0.3,
+                'fix_errors': rng.random() < 0.2,
+            },
+            'checkout': {'enabled': True, 'depth': rng.choice([0, 1, 1, 50]),
+                         'include_files_changed': rng.random() < 0.3},
+            'main_branch_analysis': {'enabled': rng.random() < 0.2},
+            'assume_iam_role': {'enabled': rng.random() < 0.1},
+            'githaxs_worker': {'enabled': rng.random() < 0.1,
+                               'event_name': f'task-{i}.worker'},
+        },
+        'subscription_level': rng.randint(0, 3),
+        'installation': {
+            'org': rng.random() < 0.2,
+            'repo_languages': rng.sample(['python', 'go', 'javascript'],
+                                         rng.randint(0, 2))},
+        'commands': [
+            {'title': f'Step {j}', 'slug': f'step-{j}',
+             'command': f'make step-{j}', 'check': j == 0}
+            for j in range(rng.randint(1, 4))
+        ],
+        'tags': rng.sample(TAGS, 2),
+        'runner_id': rng.choice(['python_3_10', 'node_16']),
+    }
+
+
+def task_configs(count, version, seed=0):
+    rng = random.Random(seed)
+    make = v2_task_config if version == 2 else v1_task_config
+    return [make(i, rng) for i in range(count)]
@@ -0,0 +1,52 @@
+"""Trusted vs validated reload of a synthetic V2 catalog.
+
+Run from the repository root:
+
+    python -m benchmarks.trusted_load [--tasks 10000]
+"""
+import argparse
+import gc
+import json
+import time
+
+from src.task_interfaces import trusted
+from src.task_interfaces.loader import parse_task
+
+from .synthetic import task_configs
+
+
+def timed(fn, items):
+    # Results are kept alive like a registry would, so GC cost is included
+    gc.collect()
+    start = time.perf_counter()
+    loaded = [fn(item) for item in items]
+    elapsed = time.perf_counter() - start
+    del loaded
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=10000)
+    args = parser.parse_args()
+
+    tasks = [parse_task(x) for x in task_configs(args.tasks, version=2)]
+    stamped = [trusted.dumps(x) for x in tasks]
+    plain = [x.json().encode() for x in tasks]
+
+    validated = timed(lambda x: parse_task(json.loads(x)), plain)
+    fast = timed(trusted.loads, stamped)
+    gc.collect()
+    start = time.perf_counter()
+    trusted.loads_many(stamped)
+    bulk = time.perf_counter() - start
+
+    print(f'tasks:     {args.tasks}')
+    print(f'validated: {validated:.3f}s')
+    print(f'trusted:   {fast:.3f}s')
+    print(f'bulk:      {bulk:.3f}s')
+    print(f'speedup:   {validated / fast:.1f}x (bulk {validated / bulk:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
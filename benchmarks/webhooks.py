@@ -0,0 +1,121 @@
+"""Real-sized GitHub webhook payloads, shaped like the ones GitHub sends."""
+import json
+
+API = 'https://api.github.com'
+
+
+def user(login, i=1):
+    return {
+        'login': login, 'id': 1000 + i, 'node_id': f'MDQ6VXNlcj{i:08}',
+        'avatar_url': f'https://avatars.githubusercontent.com/u/{i}?v=4',
+        'gravatar_id': '', 'url': f'{API}/users/{login}',
+        'html_url': f'https://github.com/{login}',
+        'followers_url': f'{API}/users/{login}/followers',
+        'following_url': f'{API}/users/{login}/following{{/other_user}}',
+        'gists_url': f'{API}/users/{login}/gists{{/gist_id}}',
+        'starred_url': f'{API}/users/{login}/starred{{/owner}}{{/repo}}',
+        'subscriptions_url': f'{API}/users/{login}/subscriptions',
+        'organizations_url': f'{API}/users/{login}/orgs',
+        'repos_url': f'{API}/users/{login}/repos',
+        'events_url': f'{API}/users/{login}/events{{/privacy}}',
+        'received_events_url': f'{API}/users/{login}/received_events',
+        'type': 'User', 'site_admin': False,
+    }
+
+
+def repository(name='acme/api', i=42):
+    repo_url = f'{API}/repos/{name}'
+    repo = {
+        'id': i, 'node_id': f'MDEwOlJlcG9zaXRvcnk{i:08}',
+        'name': name.split('/')[1], 'full_name': name, 'private': True,
+        'owner': user(name.split('/')[0], i),
+        'html_url': f'https://github.com/{name}',
+        'description': 'Service API ' * 4, 'fork': False, 'url': repo_url,
+    }
+    for key in (
+            'forks', 'keys', 'collaborators', 'teams', 'hooks',
+            'issue_events', 'events', 'assignees', 'branches', 'tags',
+            'blobs', 'git_tags', 'git_refs', 'trees', 'statuses',
+            'languages', 'stargazers', 'contributors', 'subscribers',
+            'subscription', 'commits', 'git_commits', 'comments',
+            'issue_comment', 'contents', 'compare', 'merges', 'archive',
+            'downloads', 'issues', 'pulls', 'milestones', 'notifications',
+            'labels', 'releases', 'deployments'):
+        repo[f'{key}_url'] = f'{repo_url}/{key}{{/id}}'
+    repo.update({
+        'created_at': '2020-01-01T00:00:00Z',
+        'updated_at': '2022-06-01T00:00:00Z',
+        'pushed_at': '2022-06-01T00:00:00Z',
+        'git_url': f'git://github.com/{name}.git',
+        'ssh_url': f'git@github.com:{name}.git',
+        'clone_url': f'https://github.com/{name}.git',
+        'svn_url': f'https://github.com/{name}', 'homepage': None,
+        'size': 12345, 'stargazers_count': 12, 'watchers_count': 12,
+        'language': 'Python', 'has_issues': True, 'has_projects': True,
+        'has_downloads': True, 'has_wiki': False, 'has_pages': False,
+        'forks_count': 1, 'mirror_url': None, 'archived': False,
+        'disabled': False, 'open_issues_count': 7, 'license': None,
+        'allow_forking': False, 'is_template': False,
+        'topics': ['api', 'python'], 'visibility': 'private', 'forks': 1,
+        'open_issues': 7, 'watchers': 12, 'default_branch': 'main',
+        'allow_squash_merge': True, 'allow_merge_commit': False,
+        'allow_rebase_merge': False, 'delete_branch_on_merge': True,
+    })
+    return repo
+
+
+def pull_request_payload(body_size=2000, labels=5):
+    repo = repository()
+    pr_url = f"{API}/repos/{repo['full_name']}/pulls/1347"
+    pull_request = {
+        'url': pr_url, 'id': 987654321, 'node_id': 'PR_kwDOAbCdEf4',
+        'html_url': f"https://github.com/{repo['full_name']}/pull/1347",
+        'diff_url': f'{pr_url}.diff', 'patch_url': f'{pr_url}.patch',
+        'issue_url': f'{pr_url}/issue', 'number': 1347, 'state': 'open',
+        'locked': False, 'title': 'Add retry to the payment client',
+        'user': user('octocat', 7),
+        'body': ('Lorem ipsum dolor sit amet, "quoted" text {with} '
+                 '[brackets]\n' * (body_size // 60 + 1))[:body_size],
+        'created_at': '2022-06-01T00:00:00Z',
+        'updated_at': '2022-06-01T00:00:00Z', 'closed_at': None,
+        'merged_at': None,
+        'merge_commit_sha': 'e5bd3914e2e596debea16f433f57875b5b90bcd6',
+        'assignee': None, 'assignees': [user(f'dev{i}', i) for i in range(2)],
+        'requested_reviewers': [user(f'rev{i}', i) for i in range(2)],
+        'requested_teams': [],
+        'labels': [{'id': i, 'name': f'label-{i}', 'color': 'ededed',
+                    'default': False, 'description': 'A label'}
+                   for i in range(labels)],
+        'milestone': None, 'draft': False,
+        'commits_url': f'{pr_url}/commits',
+        'review_comments_url': f'{pr_url}/comments',
+        'statuses_url': f"{API}/repos/{repo['full_name']}/statuses/abc",
+        'head': {'label': 'octocat:feature/retry', 'ref': 'feature/retry',
+                 'sha': '6dcb09b5b57875f334f61aebed695e2e4193db5e',
+                 'user': user('octocat', 7), 'repo': repository()},
+        'base': {'label': 'acme:main', 'ref': 'main',
+                 'sha': '9049f1265b7d61be4a8904a9a27120d2064dab3b',
+                 'user': user('acme', 1), 'repo': repository()},
+        '_links': {x: {'href': f'{pr_url}/{x}'} for x in (
+            'self', 'html', 'issue', 'comments', 'review_comments',
+            'review_comment', 'commits', 'statuses')},
+        'author_association': 'MEMBER', 'auto_merge': None,
+        'active_lock_reason': None, 'merged': False, 'mergeable': None,
+        'rebaseable': None, 'mergeable_state': 'unknown', 'merged_by': None,
+        'comments': 0, 'review_comments': 0,
+        'maintainer_can_modify': False, 'commits': 3, 'additions': 120,
+        'deletions': 14, 'changed_files': 6,
+    }
+    return {
+        'action': 'synchronize', 'number': 1347,
+        'before': 'e5bd3914e2e596debea16f433f57875b5b90bcd6',
+        'after': '6dcb09b5b57875f334f61aebed695e2e4193db5e',
+        'pull_request': pull_request, 'repository': repo,
+        'organization': {'login': 'acme', 'id': 1, 'description': ''},
+        'sender': user('octocat', 7),
+        'installation': {'id': 2311213, 'node_id': 'MDIzOkludGVncmF0aW9u'},
+    }
+
+
+def pull_request_bytes(**kwargs):
+    return json.dumps(pull_request_payload(**kwargs)).encode()
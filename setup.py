@@ -15,9 +15,16 @@ VERSION = "0.0.0"
 # http://pypi.python.org/pypi/setuptools
 
 REQUIRES = ["pydantic"]
+EXTRAS_REQUIRE = {
+    # Bulk loading of task_config.yaml catalogs
+    "loader": ["pyyaml"],
+    # STS and SSM provider for the credential cache
+    "aws": ["boto3"],
+}
 
 setup(
     name=NAME,
     version=VERSION,
     install_requires=REQUIRES,
+    extras_require=EXTRAS_REQUIRE,
 )
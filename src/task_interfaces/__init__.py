@@ -1,4 +1,22 @@
 from .task import SubscriptionLevels
 from .task import Task
 from .task_v2 import Task as TaskV2
-from .task_v2 import Command
\ No newline at end of file
+from .task_v2 import Command
+from .catalog import TaskCatalog
+from .loader import load_tasks, LoadReport
+from . import trusted
+from .executor import CommandExecutor
+from .scheduler import DagScheduler
+from .eligibility import EligibilityQuery
+from .prefilter import ShortCircuitEvaluator
+from .routing import RoutingRecord, extract_routing
+from .fanout import FanOut, LocalQueue
+from .credentials import CredentialCache, LocalProvider
+from .checkout import CheckoutManager
+from .envcache import EnvironmentCache
+from .runner_pool import RunnerPool
+from .tracing import Tracer, HistogramSink, JsonLinesSink
+from .reporter import CheckRunReporter
+from .migrate import migrate_catalog, MigrationReport
+from .compact import CompactCatalog
+from .watch import CatalogWatcher
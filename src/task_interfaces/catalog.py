@@ -0,0 +1,183 @@
+from types import MappingProxyType
+
+from .eligibility import (
+    build_postings, eligibility_keys, evaluate, update_postings)
+
+# Eligibility results memoized per catalog (catalogs are immutable)
+QUERY_CACHE_SIZE = 4096
+
+
+def task_events(task):
+    """Events a task is routed for, derived from its capabilities."""
+    # dict.fromkeys keeps the order of get_subscribed_events while dropping
+    # duplicates (e.g. a check run event that is also listed explicitly).
+    return tuple(dict.fromkeys(task.get_subscribed_events()))
+
+
+class TaskCatalog:
+    """Immutable set of V1/V2 tasks indexed by the events they subscribe to.
+
+    add, remove and replace return a new catalog and leave the original
+    untouched, so a catalog can be shared freely and swapped atomically.
+    Only the routes of the events a changed task subscribes to are rebuilt.
+
+    It also answers eligibility queries (see eligibility.EligibilityQuery)
+    from per-attribute posting sets.
+    """
+
+    __slots__ = (
+        '_tasks', '_order', '_events', '_routes', '_next', '_keys',
+        '_postings', '_query_cache')
+
+    def __init__(self, tasks=()):
+        self._tasks = {}
+        self._order = {}
+        self._events = {}
+        self._keys = {}
+        self._next = 0
+        self._query_cache = {}
+        routes = {}
+        for task in tasks:
+            if task.slug in self._tasks:
+                raise ValueError(f"Duplicate task slug '{task.slug}'")
+            self._store(task)
+            for event in self._events[task.slug]:
+                routes.setdefault(event, []).append(task)
+        self._routes = MappingProxyType(
+            {event: tuple(routed) for event, routed in routes.items()})
+        self._postings = build_postings(self._keys)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __iter__(self):
+        return iter(self._tasks.values())
+
+    def __contains__(self, slug):
+        return slug in self._tasks
+
+    def get(self, slug, default=None):
+        return self._tasks.get(slug, default)
+
+    @property
+    def events(self):
+        return self._routes.keys()
+
+    def tasks_for_event(self, event):
+        """Tasks subscribed to an event name such as ``pull_request.opened``."""
+        return self._routes.get(event, ())
+
+    def route(self, event, action=None):
+        """Tasks to run for a webhook given its event header and action."""
+        if action is None:
+            return self._routes.get(event, ())
+
+        qualified = self._routes.get(f'{event}.{action}', ())
+        bare = self._routes.get(event, ())
+        if not bare:
+            return qualified
+        if not qualified:
+            return bare
+        merged = {task.slug: task for task in qualified}
+        for task in bare:
+            merged.setdefault(task.slug, task)
+        return self._sorted(merged.values())
+
+    def eligible(self, query):
+        """Tasks an installation described by query can use, in order."""
+        cached = self._query_cache.get(query)
+        if cached is None:
+            cached = self._sorted(
+                self._tasks[x] for x in evaluate(self._postings, query))
+            if len(self._query_cache) >= QUERY_CACHE_SIZE:
+                self._query_cache.clear()
+            self._query_cache[query] = cached
+        return cached
+
+    def eligible_many(self, queries):
+        """eligible() for many repos, evaluating each distinct query once."""
+        return [self.eligible(x) for x in queries]
+
+    def add(self, task):
+        if task.slug in self._tasks:
+            raise ValueError(f"Duplicate task slug '{task.slug}'")
+        return self.with_changes(upserts=(task,))
+
+    def remove(self, slug):
+        if slug not in self._tasks:
+            raise KeyError(slug)
+        return self.with_changes(removals=(slug,))
+
+    def replace(self, task):
+        if task.slug not in self._tasks:
+            raise KeyError(task.slug)
+        return self.with_changes(upserts=(task,))
+
+    def with_changes(self, upserts=(), removals=()):
+        """Return a new catalog with tasks added/replaced and slugs removed.
+
+        Upserted tasks that already exist keep their position, new ones are
+        appended. Only the changed tasks are indexed again, but the
+        per-task tables are copied and each route and posting set a changed
+        task is in is rebuilt whole, so the cost is linear in the size of
+        the catalog.
+        """
+        catalog = self._derive()
+        catalog._tasks = dict(self._tasks)
+        catalog._order = dict(self._order)
+        catalog._events = dict(self._events)
+        catalog._keys = dict(self._keys)
+        catalog._next = self._next
+        catalog._query_cache = {}
+
+        changed = set()
+        touched = set()
+        removed_keys = {}
+        for slug in removals:
+            if slug in catalog._tasks:
+                del catalog._tasks[slug]
+                del catalog._order[slug]
+                touched.update(catalog._events.pop(slug))
+                removed_keys[slug] = catalog._keys.pop(slug)
+                changed.add(slug)
+        for task in upserts:
+            touched.update(catalog._events.get(task.slug, ()))
+            if task.slug in catalog._keys:
+                removed_keys.setdefault(task.slug, catalog._keys[task.slug])
+            catalog._store(task)
+            touched.update(catalog._events[task.slug])
+            changed.add(task.slug)
+        catalog._postings = update_postings(
+            self._postings, removed_keys,
+            {x: catalog._keys[x] for x in changed if x in catalog._keys})
+
+        routes = dict(self._routes)
+        for event in touched:
+            kept = [
+                task for task in routes.get(event, ())
+                if task.slug not in changed]
+            kept.extend(
+                catalog._tasks[slug] for slug in changed
+                if event in catalog._events.get(slug, ()))
+            if kept:
+                routes[event] = catalog._sorted(kept)
+            else:
+                routes.pop(event, None)
+        catalog._routes = MappingProxyType(routes)
+        return catalog
+
+    def _derive(self):
+        # Uninitialized catalog of the same type for with_changes to fill
+        return object.__new__(type(self))
+
+    def _store(self, task):
+        if task.slug not in self._order:
+            self._order[task.slug] = self._next
+            self._next += 1
+        self._tasks[task.slug] = task
+        self._events[task.slug] = task_events(task)
+        self._keys[task.slug] = eligibility_keys(task)
+
+    def _sorted(self, tasks):
+        order = self._order
+        return tuple(sorted(tasks, key=lambda task: order[task.slug]))
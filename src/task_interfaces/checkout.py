@@ -0,0 +1,216 @@
+"""Shared local clone cache for tasks with the checkout capability.
+
+Instead of every task cloning the repository on its own, CheckoutManager
+keeps one bare mirror per repository URL under root and creates each
+task's working copy from it:
+
+- depth 0 (full history) makes a local clone, which hardlinks the
+  mirror's objects instead of copying them and keeps working after the
+  mirror is evicted
+- depth N fetches only the last N commits of the ref from the mirror over
+  file://, as ``git clone --depth`` would from the remote
+
+Either way the working copy's origin is the repository URL afterwards, so
+that pushing from it never writes into the shared mirror.
+
+A mirror is only fetched when the requested commit is missing from it, and
+git then transfers only the objects it does not have. Concurrent
+checkouts of a repository wait on a single clone or fetch. Mirrors not used
+recently are removed once the cache grows past max_bytes; mirrors still
+being cloned from are skipped.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+
+from .tracing import NULL_TRACER
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024 * 1024
+GIT_ENV = {'GIT_TERMINAL_PROMPT': '0', 'GIT_ASKPASS': 'true'}
+_SHA = re.compile('[0-9a-f]{40}')
+
+
+class CheckoutError(RuntimeError):
+    pass
+
+
+def checkout_depth(task):
+    """Clone depth a V1 or V2 task asks for, None without checkout."""
+    capabilities = task.capabilities
+    if hasattr(capabilities, 'checkout'):
+        if capabilities.checkout is None or not capabilities.checkout.enabled:
+            return None
+        depth = capabilities.checkout.depth
+    else:
+        if not task.has_checkout_capability():
+            return None
+        depth = task.get_checkout_depth()
+    return 1 if depth is None else depth
+
+
+class CheckoutManager:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, git='git',
+                 tracer=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.git = git
+        self.tracer = tracer or NULL_TRACER
+        self.fetches = 0
+        self.clones = 0
+        self._locks = {}
+        self._sizes = {}
+        self._in_use = {}
+        os.makedirs(self.mirrors_dir, exist_ok=True)
+
+    @property
+    def mirrors_dir(self):
+        return os.path.join(self.root, 'mirrors')
+
+    def mirror_path(self, url):
+        name = hashlib.sha256(url.encode()).hexdigest()[:24]
+        return os.path.join(self.mirrors_dir, f'{name}.git')
+
+    async def checkout(self, url, ref, dest, depth=1, task=None):
+        """Create a working copy of ref (a branch, tag or sha) at dest."""
+        path = self.mirror_path(url)
+        self._in_use[path] = self._in_use.get(path, 0) + 1
+        try:
+            with self.tracer.span('checkout', task, depth=depth) as span:
+                fetches = self.fetches + self.clones
+                async with self._lock(path):
+                    await self.mirror(url, ref)
+                span.set(fetched=self.fetches + self.clones > fetches)
+                if depth:
+                    await self._shallow_clone(path, ref, dest, depth, url)
+                else:
+                    await self._local_clone(path, ref, dest, url)
+        finally:
+            self._in_use[path] -= 1
+            if not self._in_use[path]:
+                del self._in_use[path]
+        self.evict()
+        return dest
+
+    async def checkout_task(self, task, url, ref, dest):
+        depth = checkout_depth(task)
+        if depth is None:
+            raise ValueError(f'{task.slug} does not have the checkout '
+                             'capability')
+        return await self.checkout(url, ref, dest, depth, task)
+
+    async def mirror(self, url, ref=None):
+        """Make sure the mirror of url exists and contains ref."""
+        path = self.mirror_path(url)
+        if not os.path.isdir(path):
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            await self._git('clone', '--mirror', '--quiet', url, tmp_path)
+            os.replace(tmp_path, path)
+            self.clones += 1
+        # Branches move, a commit that is already there never changes
+        elif ref is None or _SHA.fullmatch(ref) is None \
+                or not await self._has_commit(path, ref):
+            await self._git('fetch', '--prune', '--quiet', 'origin',
+                            cwd=path)
+            self.fetches += 1
+        if ref is not None and not await self._has_commit(path, ref):
+            raise CheckoutError(f'{ref} not found in {url}')
+        # mtime of the mirror doubles as its last-use time for eviction
+        os.utime(path)
+        self._sizes[path] = _tree_size(path)
+        return path
+
+    def evict(self):
+        """Remove least recently used mirrors until under max_bytes."""
+        mirrors = []
+        for name in os.listdir(self.mirrors_dir):
+            path = os.path.join(self.mirrors_dir, name)
+            if not name.endswith('.git') or not os.path.isdir(path):
+                continue
+            if path not in self._sizes:
+                self._sizes[path] = _tree_size(path)
+            mirrors.append((os.stat(path).st_mtime_ns, path))
+
+        size = sum(self._sizes[x] for _, x in mirrors)
+        for _, path in sorted(mirrors):
+            if size <= self.max_bytes:
+                break
+            # Checkouts still being made from a mirror need it
+            if path in self._in_use:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            size -= self._sizes.pop(path)
+        return size
+
+    async def _has_commit(self, path, ref):
+        process = await asyncio.create_subprocess_exec(
+            self.git, 'rev-parse', '--verify', '--quiet', f'{ref}^{{commit}}',
+            cwd=path, env=_git_env(),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL)
+        return await process.wait() == 0
+
+    async def _resolve(self, path, ref):
+        output = await self._git(
+            'rev-parse', '--verify', '--quiet', f'{ref}^{{commit}}', cwd=path)
+        return output.decode().strip()
+
+    async def _local_clone(self, mirror, ref, dest, url):
+        # Branches of the mirror are remote-tracking branches in the clone,
+        # so the commit is looked up in the mirror
+        commit = await self._resolve(mirror, ref)
+        # Objects are hardlinked (copied across filesystems), never borrowed
+        # through alternates, so the checkout does not depend on the mirror
+        await self._git('clone', '--local', '--no-checkout', '--quiet',
+                        mirror, dest)
+        await self._git('checkout', '--quiet', '--detach', commit, cwd=dest)
+        await self._git('remote', 'set-url', 'origin', url, cwd=dest)
+
+    async def _shallow_clone(self, mirror, ref, dest, depth, url):
+        os.makedirs(dest, exist_ok=True)
+        await self._git('init', '--quiet', cwd=dest)
+        await self._git('remote', 'add', 'origin', f'file://{mirror}',
+                        cwd=dest)
+        await self._git('fetch', '--quiet', f'--depth={depth}', 'origin', ref,
+                        cwd=dest)
+        await self._git('checkout', '--quiet', '--detach', 'FETCH_HEAD',
+                        cwd=dest)
+        await self._git('remote', 'set-url', 'origin', url, cwd=dest)
+
+    async def _git(self, *args, cwd=None):
+        process = await asyncio.create_subprocess_exec(
+            self.git, *args, cwd=cwd, env=_git_env(),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT)
+        output, _ = await process.communicate()
+        if process.returncode != 0:
+            raise CheckoutError(
+                f"git {' '.join(args)} failed:\n"
+                f"{output.decode(errors='replace')}")
+        return output
+
+    def _lock(self, path):
+        lock = self._locks.get(path)
+        if lock is None:
+            lock = self._locks[path] = asyncio.Lock()
+        return lock
+
+
+def _git_env():
+    env = dict(os.environ)
+    env.update(GIT_ENV)
+    return env
+
+
+def _tree_size(path):
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                continue
+    return size
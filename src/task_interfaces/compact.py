@@ -0,0 +1,461 @@
+"""Compact read-only representation of large task catalogs.
+
+A validated pydantic task keeps a __dict__ and __fields_set__ per model
+and submodel, and its own copy of every string, list and default
+submodel, although most tasks of a catalog repeat the same event names,
+tags, parameter descriptions and capability settings. CompactTask keeps
+only its name, slug, summary and description, plus a shared _Profile
+holding:
+
+- the rest of its field values, interned by an Interner so that equal
+  strings, lists, dicts and submodels (including the default capability
+  submodels) are one object across the catalog
+- beta, has_public_repo and every capability check packed into one int
+- its subscribed events, check run actions and checkout depth, computed
+  once
+
+Tasks with the same configuration apart from their names share one
+profile. A CompactTask answers the V1 capability accessors for both
+versions, exposes every model field as a read-only attribute and builds
+its manifest on demand. Its values are shared, so nothing in it may be
+mutated; to_model() returns a full Task, e.g. to hand to the executor.
+
+CompactCatalog is a TaskCatalog that compacts the tasks it is given and
+interns its index entries too. Values of replaced and removed tasks stay
+in its Interner, so once with_changes() has doubled the interner, the
+new catalog is rebuilt on a fresh one holding only the live values.
+memory_report() measures both:
+
+    python -m src.task_interfaces.compact CATALOG
+"""
+import argparse
+import copy
+import gc
+import json
+import tracemalloc
+from enum import Enum
+
+from pydantic import BaseModel
+
+from .catalog import TaskCatalog
+
+# Fields every task keeps itself, the rest live in its profile
+_OWN_FIELDS = ('name', 'slug', 'summary', 'description')
+# Boolean fields packed into the profile's flags
+_PACKED_FIELDS = ('beta', 'has_public_repo')
+
+_BETA = 1 << 0
+_PUBLIC_REPO = 1 << 1
+_CHECK_RUN = 1 << 2
+_CUSTOM_CHECK_RUN = 1 << 3
+_ALLOWS_HOTFIX = 1 << 4
+_MAIN_BRANCH = 1 << 5
+_GITHAXS_WORKER = 1 << 6
+_TASK_ORCHESTRATOR = 1 << 7
+_ASSUME_ROLE = 1 << 8
+_INJECT_SSM = 1 << 9
+_DOCKER_BUILD = 1 << 10
+_INJECT_SETTINGS = 1 << 11
+_CHECKOUT = 1 << 12
+
+_FIELD_INDEX = {}
+
+
+def _field_index(model):
+    index = _FIELD_INDEX.get(model)
+    if index is None:
+        names = [x for x in model.__fields__
+                 if x not in _OWN_FIELDS and x not in _PACKED_FIELDS]
+        index = _FIELD_INDEX[model] = {x: i for i, x in enumerate(names)}
+    return index
+
+
+def task_flags(task):
+    """beta, has_public_repo and the capabilities of a V1 or V2 task."""
+    flags = (_BETA if task.beta else 0) | \
+        (_PUBLIC_REPO if task.has_public_repo else 0)
+    capabilities = task.capabilities
+    if hasattr(capabilities, 'check_run'):
+        checkout = capabilities.checkout
+        enabled = (
+            (_CHECK_RUN, capabilities.check_run.enabled),
+            (_CUSTOM_CHECK_RUN, capabilities.check_run.enabled
+             and capabilities.check_run.custom),
+            (_ALLOWS_HOTFIX, capabilities.check_run.enabled
+             and capabilities.check_run.allow_hotfix),
+            (_MAIN_BRANCH, capabilities.main_branch_analysis.enabled),
+            (_GITHAXS_WORKER, capabilities.githaxs_worker.enabled),
+            (_TASK_ORCHESTRATOR, capabilities.task_orchestrator.enabled),
+            (_ASSUME_ROLE, capabilities.assume_iam_role.enabled),
+            (_INJECT_SSM, capabilities.assume_iam_role.enabled
+             and capabilities.assume_iam_role.inject_ssm_parameters),
+            (_DOCKER_BUILD, capabilities.docker_build.enabled),
+            (_INJECT_SETTINGS, capabilities.task_settings.enabled),
+            (_CHECKOUT, checkout is not None and checkout.enabled),
+        )
+    else:
+        enabled = (
+            (_CHECK_RUN, task.has_check_run_capability()),
+            (_CUSTOM_CHECK_RUN, task.has_custom_check_run_capability()),
+            (_ALLOWS_HOTFIX, task.allows_for_hotfixes()),
+            (_MAIN_BRANCH, task.has_main_branch_capability()),
+            (_GITHAXS_WORKER, task.has_githaxs_worker_capability()),
+            (_TASK_ORCHESTRATOR, task.has_task_orchestrator_capability()),
+            (_ASSUME_ROLE, task.has_aws_iam_assume_role_capability()),
+            (_INJECT_SSM, task.has_inject_ssm_parameters_capability()),
+            (_DOCKER_BUILD, task.has_docker_build_capability()),
+            (_INJECT_SETTINGS, task.has_inject_settings_capability()),
+            (_CHECKOUT, task.has_checkout_capability()),
+        )
+    for bit, value in enabled:
+        if value:
+            flags |= bit
+    return flags
+
+
+def _capability_values(task):
+    """(check run actions, ignored authors, checkout depth) of a task."""
+    capabilities = task.capabilities
+    if not hasattr(capabilities, 'check_run'):
+        return (task.get_check_run_actions(), task.ignored_authors(),
+                task.get_checkout_depth())
+    check_run = capabilities.check_run
+    checkout = capabilities.checkout
+    actions = None
+    if check_run.enabled and check_run.actions:
+        actions = [x.dict() for x in check_run.actions]
+    return (
+        actions,
+        check_run.ignored_authors or [] if check_run.enabled else [],
+        checkout.depth if checkout is not None and checkout.enabled
+        else None)
+
+
+class _Profile:
+    __slots__ = ('model', 'flags', 'values', 'index', 'events', 'actions',
+                 'ignored_authors', 'checkout_depth')
+
+    def __init__(self, model, flags, values, events, actions,
+                 ignored_authors, checkout_depth):
+        self.model = model
+        self.flags = flags
+        self.values = values
+        self.index = _field_index(model)
+        self.events = events
+        self.actions = actions
+        self.ignored_authors = ignored_authors
+        self.checkout_depth = checkout_depth
+
+
+class Interner:
+    """Hands out one shared object per distinct value.
+
+    Strings, numbers, enums, lists, tuples, dicts and pydantic models are
+    compared by value, recursively; anything else is kept as it is. Shared
+    values must never be mutated.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._profiles = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def share(self, value):
+        return self._intern(value)
+
+    def task(self, task):
+        """CompactTask for a V1 or V2 task."""
+        if isinstance(task, CompactTask):
+            return self._adopt(task)
+        model = type(task)
+        values = self._intern(
+            tuple(getattr(task, x) for x in _field_index(model)))
+        flags = task_flags(task)
+        profile = self._profiles.get((id(values), flags))
+        if profile is None:
+            actions, ignored_authors, checkout_depth = \
+                _capability_values(task)
+            profile = self._profiles[id(values), flags] = _Profile(
+                model, flags, values,
+                self.share(tuple(task.get_subscribed_events())),
+                self.share(tuple(actions)) if actions is not None else None,
+                self.share(ignored_authors), checkout_depth)
+        return CompactTask(
+            *(self.share(getattr(task, x)) for x in _OWN_FIELDS), profile)
+
+    def _adopt(self, task):
+        # A task compacted by another interner shares its values instead
+        profile = task._profile
+        if self._profiles.get((id(profile.values), profile.flags)) \
+                is profile:
+            return task
+        values = self._intern(profile.values)
+        shared = self._profiles.get((id(values), profile.flags))
+        if shared is None:
+            shared = self._profiles[id(values), profile.flags] = _Profile(
+                profile.model, profile.flags, values,
+                self.share(profile.events), self.share(profile.actions),
+                self.share(profile.ignored_authors), profile.checkout_depth)
+        return CompactTask(
+            *(self.share(getattr(task, x)) for x in _OWN_FIELDS), shared)
+
+    def _intern(self, value):
+        if isinstance(value, Enum) or value is None \
+                or isinstance(value, (bool, int, float)):
+            # The type is part of the key so True and 1, or a str enum and
+            # its value, stay apart
+            return self._values.setdefault((type(value), value), value)
+        if isinstance(value, str):
+            return self._values.setdefault(value, value)
+        if isinstance(value, BaseModel):
+            children = tuple(self._intern(x) for x in value.__dict__.values())
+            key = _Key(type(value), children)
+            shared = self._values.get(key)
+            if shared is None:
+                shared = self._values[key] = value.copy(update=dict(
+                    zip(value.__dict__, children)))
+            return shared
+        if isinstance(value, (list, tuple)):
+            shared = type(value)(self._intern(x) for x in value)
+            return self._values.setdefault(_Key(type(value), shared), shared)
+        if isinstance(value, dict):
+            children = tuple(
+                self._intern(x) for item in value.items() for x in item)
+            key = _Key(dict, children)
+            shared = self._values.get(key)
+            if shared is None:
+                shared = self._values[key] = dict(
+                    zip(children[::2], children[1::2]))
+            return shared
+        return value
+
+
+class _Key:
+    """Dict key of a container whose children are already shared.
+
+    Equal containers have identical children, so keys compare children by
+    identity and hold no copies of them.
+    """
+
+    __slots__ = ('type', 'children', 'hash')
+
+    def __init__(self, type_, children):
+        self.type = type_
+        self.children = children
+        self.hash = hash((type_, *map(id, children)))
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        return isinstance(other, _Key) and self.type is other.type \
+            and len(self.children) == len(other.children) \
+            and all(x is y for x, y in zip(self.children, other.children))
+
+
+class CompactTask:
+    __slots__ = _OWN_FIELDS + ('_profile',)
+
+    def __init__(self, name, slug, summary, description, profile):
+        set_ = object.__setattr__
+        set_(self, 'name', name)
+        set_(self, 'slug', slug)
+        set_(self, 'summary', summary)
+        set_(self, 'description', description)
+        set_(self, '_profile', profile)
+
+    def __getattr__(self, name):
+        # Only called for names that are not slots or class attributes
+        profile = self._profile
+        index = profile.index.get(name)
+        if index is None:
+            raise AttributeError(
+                f"'CompactTask' object has no attribute '{name}'")
+        return profile.values[index]
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompactTask is read-only')
+
+    def __repr__(self):
+        return f'CompactTask({self.slug!r})'
+
+    @property
+    def model(self):
+        """The Task class this task was compacted from."""
+        return self._profile.model
+
+    @property
+    def beta(self):
+        return bool(self._profile.flags & _BETA)
+
+    @property
+    def has_public_repo(self):
+        return bool(self._profile.flags & _PUBLIC_REPO)
+
+    def has_check_run_capability(self):
+        return bool(self._profile.flags & _CHECK_RUN)
+
+    def has_custom_check_run_capability(self):
+        return bool(self._profile.flags & _CUSTOM_CHECK_RUN)
+
+    def allows_for_hotfixes(self):
+        return bool(self._profile.flags & _ALLOWS_HOTFIX)
+
+    def has_main_branch_capability(self):
+        return bool(self._profile.flags & _MAIN_BRANCH)
+
+    def has_githaxs_worker_capability(self):
+        return bool(self._profile.flags & _GITHAXS_WORKER)
+
+    def has_task_orchestrator_capability(self):
+        return bool(self._profile.flags & _TASK_ORCHESTRATOR)
+
+    def has_aws_iam_assume_role_capability(self):
+        return bool(self._profile.flags & _ASSUME_ROLE)
+
+    def has_inject_ssm_parameters_capability(self):
+        return bool(self._profile.flags & _INJECT_SSM)
+
+    def has_docker_build_capability(self):
+        return bool(self._profile.flags & _DOCKER_BUILD)
+
+    def has_inject_settings_capability(self):
+        return bool(self._profile.flags & _INJECT_SETTINGS)
+
+    def has_checkout_capability(self):
+        return bool(self._profile.flags & _CHECKOUT)
+
+    def get_checkout_depth(self):
+        return self._profile.checkout_depth
+
+    def ignored_authors(self):
+        return self._profile.ignored_authors
+
+    def get_check_run_actions(self):
+        actions = self._profile.actions
+        if actions is None:
+            return None
+        return [dict(x) for x in actions]
+
+    def get_subscribed_events(self):
+        return list(self._profile.events)
+
+    def get_parameters(self):
+        # The model's implementation only reads fields and accessors
+        return self._profile.model.get_parameters(self)
+
+    def to_json(self):
+        # Built on every call, caching manifests would undo the savings
+        return self._profile.model._build_manifest(self)
+
+    def to_json_bytes(self):
+        return json.dumps(self.to_json(), separators=(',', ':')).encode()
+
+    def to_model(self):
+        """A new, mutable and validated Task with this task's values."""
+        profile = self._profile
+        fields = {x: getattr(self, x) for x in _OWN_FIELDS + _PACKED_FIELDS}
+        fields.update(zip(profile.index, profile.values))
+        return profile.model(**copy.deepcopy(fields))
+
+
+def compact(task, interner=None):
+    return (interner if interner is not None else Interner()).task(task)
+
+
+class CompactCatalog(TaskCatalog):
+    """TaskCatalog of CompactTasks sharing one Interner.
+
+    Tasks given to it, including those added later with with_changes(),
+    are compacted, and its per-task index entries are interned as well.
+    """
+
+    __slots__ = ('_interner', '_interned')
+
+    def __init__(self, tasks=(), interner=None):
+        self._interner = interner if interner is not None else Interner()
+        super().__init__(self._interner.task(x) for x in tasks)
+        # Size of the interner when it only held live values
+        self._interned = len(self._interner)
+
+    def with_changes(self, upserts=(), removals=()):
+        catalog = super().with_changes(upserts, removals)
+        if len(catalog._interner) > 2 * catalog._interned:
+            # Rebuilding costs as much as the changes since the last one,
+            # and lets the previous snapshots keep the old interner
+            catalog = type(self)(catalog)
+        return catalog
+
+    def _derive(self):
+        catalog = super()._derive()
+        catalog._interner = self._interner
+        catalog._interned = self._interned
+        return catalog
+
+    def _store(self, task):
+        task = self._interner.task(task)
+        super()._store(task)
+        self._events[task.slug] = self._interner.share(
+            self._events[task.slug])
+        self._keys[task.slug] = self._interner.share(self._keys[task.slug])
+
+
+def _traced_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def memory_report(configs):
+    """Bytes per task of a TaskCatalog and a CompactCatalog of configs.
+
+    configs are task config dicts. Each catalog is measured on its own with
+    tracemalloc, including its tasks and indexes.
+    """
+    from .loader import parse_task
+
+    configs = list(configs)
+    before, catalog = _traced_bytes(
+        lambda: TaskCatalog([parse_task(x) for x in configs]))
+    del catalog
+    # Tasks are compacted one at a time, only the compact ones stay alive
+    after, catalog = _traced_bytes(
+        lambda: CompactCatalog(parse_task(x) for x in configs))
+    count = max(len(catalog), 1)
+    return {
+        'tasks': len(catalog),
+        'bytes_per_task': before // count,
+        'compact_bytes_per_task': after // count,
+    }
+
+
+def main(argv=None):
+    import yaml
+
+    from .loader import discover
+
+    parser = argparse.ArgumentParser(
+        description='Report bytes per task of a catalog before and after '
+                    'compaction')
+    parser.add_argument('catalog', help='directory of task configs')
+    args = parser.parse_args(argv)
+
+    configs = []
+    for path in discover(args.catalog):
+        with open(path, 'rb') as f:
+            configs.append(yaml.safe_load(f))
+    report = memory_report(configs)
+    print(f"{report['tasks']} tasks: {report['bytes_per_task']} bytes per "
+          f"task, {report['compact_bytes_per_task']} compacted")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,309 @@
+"""Shared cache of assumed role credentials and SSM parameters.
+
+Tasks with the assume IAM role capability run with credentials for a role
+and, with inject_ssm_parameters, the SSM parameters under ``ssm_prefix`` in
+their environment. CredentialCache keeps both per role ARN (and prefix) so
+runs of the same role share them:
+
+- credentials are refreshed in the background once they are within
+  refresh_margin of expiring, and only waited for once they have expired
+- parameters are fetched with paginated bulk calls and kept for
+  parameters_ttl seconds
+- concurrent requests for the same entry wait on a single fetch
+- expired entries are evicted as the cache is used
+
+Providers implement the two calls the cache needs. LocalProvider serves
+roles and parameters from memory for tests; Boto3Provider talks to STS and
+SSM and needs the ``aws`` extra.
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict
+
+from .tracing import NULL_TRACER
+
+DEFAULT_REFRESH_MARGIN = 5 * 60
+DEFAULT_PARAMETERS_TTL = 5 * 60
+# SSM returns at most 10 parameters per GetParametersByPath call
+SSM_PAGE_SIZE = 10
+# SSM clients Boto3Provider keeps for the most recently used credentials
+DEFAULT_MAX_CLIENTS = 32
+
+
+@dataclass(frozen=True)
+class Credentials:
+    access_key_id: str
+    secret_access_key: str
+    session_token: str
+    # Unix time the credentials stop working
+    expiration: float
+
+    def env(self):
+        return {
+            'AWS_ACCESS_KEY_ID': self.access_key_id,
+            'AWS_SECRET_ACCESS_KEY': self.secret_access_key,
+            'AWS_SESSION_TOKEN': self.session_token,
+        }
+
+
+def parameter_env_name(name, prefix):
+    """Environment variable for a parameter, e.g. /prod/db/url -> DB_URL."""
+    if name.startswith(prefix):
+        name = name[len(prefix):]
+    return name.strip('/').replace('/', '_').replace('-', '_') \
+        .replace('.', '_').upper()
+
+
+def task_role(task, parameters=None):
+    """(role_arn, ssm_prefix) a task run needs, (None, None) for none.
+
+    A role set on a V2 task wins over the iam_role_arn task parameter.
+    """
+    parameters = parameters or {}
+    capabilities = task.capabilities
+    if hasattr(capabilities, 'assume_iam_role'):
+        assume_iam_role = capabilities.assume_iam_role
+        if not assume_iam_role.enabled:
+            return None, None
+        role_arn = assume_iam_role.role_arn or parameters.get('iam_role_arn')
+        inject = assume_iam_role.inject_ssm_parameters
+    else:
+        if not task.has_aws_iam_assume_role_capability():
+            return None, None
+        role_arn = parameters.get('iam_role_arn')
+        inject = task.has_inject_ssm_parameters_capability()
+    return role_arn, parameters.get('ssm_prefix') if inject else None
+
+
+@dataclass
+class _Entry:
+    value: object
+    # Unix time the value must not be served after
+    expires: float
+    # Unix time after which a background refresh is started
+    refresh_at: float
+
+
+class CredentialCache:
+    def __init__(self, provider, refresh_margin=DEFAULT_REFRESH_MARGIN,
+                 parameters_ttl=DEFAULT_PARAMETERS_TTL, clock=time.time,
+                 tracer=None):
+        self.provider = provider
+        self.tracer = tracer or NULL_TRACER
+        self.refresh_margin = refresh_margin
+        self.parameters_ttl = parameters_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._inflight = {}
+
+    async def credentials(self, role_arn):
+        return await self._get(('role', role_arn), self._fetch_credentials)
+
+    async def parameters(self, role_arn, prefix):
+        """SSM parameters under prefix, read with the role's credentials."""
+        return await self._get(('ssm', role_arn, prefix),
+                               self._fetch_parameters)
+
+    async def environment(self, role_arn, ssm_prefix=None):
+        """Environment variables for a run assuming role_arn."""
+        credentials = await self.credentials(role_arn)
+        env = {}
+        if ssm_prefix is not None:
+            parameters = await self.parameters(role_arn, ssm_prefix)
+            env.update(
+                (parameter_env_name(name, ssm_prefix), value)
+                for name, value in parameters.items())
+        env.update(credentials.env())
+        return env
+
+    async def task_environment(self, task, parameters=None):
+        role_arn, ssm_prefix = task_role(task, parameters)
+        if role_arn is None:
+            return {}
+        with self.tracer.span('credentials', task) as span:
+            misses = self.misses
+            env = await self.environment(role_arn, ssm_prefix)
+            span.set(cached=self.misses == misses)
+        return env
+
+    def evict(self):
+        """Drop every entry that can no longer be served."""
+        now = self.clock()
+        for key in [k for k, v in self._entries.items() if v.expires <= now]:
+            del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def _get(self, key, fetch):
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires > now:
+            self.hits += 1
+            if entry.refresh_at <= now:
+                # Still valid: serve it and refresh for the next caller
+                self._refresh(key, fetch)
+            return entry.value
+
+        self.misses += 1
+        self.evict()
+        return await asyncio.shield(self._refresh(key, fetch))
+
+    def _refresh(self, key, fetch):
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._store(key, fetch))
+            self._inflight[key] = future
+            future.add_done_callback(lambda x: self._done(key, x))
+        return future
+
+    def _done(self, key, future):
+        self._inflight.pop(key, None)
+        # A failed background refresh is retried by the next caller, mark
+        # its error as retrieved so asyncio does not log it
+        if not future.cancelled():
+            future.exception()
+
+    async def _store(self, key, fetch):
+        value, expires, refresh_at = await fetch(*key[1:])
+        self._entries[key] = _Entry(value, expires, refresh_at)
+        return value
+
+    async def _fetch_credentials(self, role_arn):
+        credentials = await self.provider.assume_role(role_arn)
+        return (credentials, credentials.expiration,
+                credentials.expiration - self.refresh_margin)
+
+    async def _fetch_parameters(self, role_arn, prefix):
+        credentials = await self.credentials(role_arn)
+        parameters = {}
+        token = None
+        while True:
+            page, token = await self.provider.get_parameters_page(
+                credentials, prefix, token)
+            parameters.update(page)
+            if not token:
+                break
+        # Parameters read with a role are not served past its credentials
+        expires = min(self.clock() + self.parameters_ttl,
+                      credentials.expiration)
+        return parameters, expires, expires
+
+
+class LocalProvider:
+    """In-memory provider for tests.
+
+    roles maps role ARNs to credential lifetimes in seconds, parameters maps
+    full SSM parameter names to values. Every call is counted.
+    """
+
+    def __init__(self, roles=None, parameters=None, page_size=SSM_PAGE_SIZE,
+                 delay=0.0, clock=time.time):
+        self.roles: Dict[str, float] = dict(roles or {})
+        self.parameters: Dict[str, str] = dict(parameters or {})
+        self.page_size = page_size
+        self.delay = delay
+        self.clock = clock
+        self.assume_role_calls = 0
+        self.parameter_calls = 0
+
+    async def assume_role(self, role_arn):
+        self.assume_role_calls += 1
+        await asyncio.sleep(self.delay)
+        if role_arn not in self.roles:
+            raise PermissionError(f'Not authorized to assume {role_arn}')
+        return Credentials(
+            access_key_id=f'ASIA{uuid.uuid4().hex[:16].upper()}',
+            secret_access_key=uuid.uuid4().hex,
+            session_token=uuid.uuid4().hex,
+            expiration=self.clock() + self.roles[role_arn])
+
+    async def get_parameters_page(self, credentials, prefix, token=None):
+        self.parameter_calls += 1
+        await asyncio.sleep(self.delay)
+        names = sorted(x for x in self.parameters if x.startswith(prefix))
+        start = int(token or 0)
+        end = start + self.page_size
+        page = {x: self.parameters[x] for x in names[start:end]}
+        return page, str(end) if end < len(names) else None
+
+
+class Boto3Provider:
+    """STS and SSM through boto3, run in the default thread pool.
+
+    Clients come from a boto3 Session of the provider's own, and since
+    sessions are not thread-safe they are created under a lock. An SSM
+    client is kept per set of credentials for the max_clients most
+    recently used.
+    """
+
+    def __init__(self, region_name=None, session_name='githaxs-task',
+                 duration_seconds=3600, max_clients=DEFAULT_MAX_CLIENTS):
+        self.region_name = region_name
+        self.session_name = session_name
+        self.duration_seconds = duration_seconds
+        self.max_clients = max_clients
+        self._session = None
+        self._sts = None
+        self._ssm = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def assume_role(self, role_arn):
+        response = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self._sts_client().assume_role(
+                RoleArn=role_arn, RoleSessionName=self.session_name,
+                DurationSeconds=self.duration_seconds))
+        credentials = response['Credentials']
+        return Credentials(
+            access_key_id=credentials['AccessKeyId'],
+            secret_access_key=credentials['SecretAccessKey'],
+            session_token=credentials['SessionToken'],
+            expiration=credentials['Expiration'].timestamp())
+
+    async def get_parameters_page(self, credentials, prefix, token=None):
+        kwargs = {'Path': prefix, 'Recursive': True, 'WithDecryption': True,
+                  'MaxResults': SSM_PAGE_SIZE}
+        if token:
+            kwargs['NextToken'] = token
+        response = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self._ssm_client(credentials)
+            .get_parameters_by_path(**kwargs))
+        page = {x['Name']: x['Value'] for x in response['Parameters']}
+        return page, response.get('NextToken')
+
+    def _sts_client(self):
+        with self._lock:
+            if self._sts is None:
+                self._sts = self._boto3_session().client('sts')
+            return self._sts
+
+    def _ssm_client(self, credentials):
+        with self._lock:
+            client = self._ssm.get(credentials)
+            if client is not None:
+                self._ssm.move_to_end(credentials)
+                return client
+
+            client = self._ssm[credentials] = self._boto3_session().client(
+                'ssm',
+                aws_access_key_id=credentials.access_key_id,
+                aws_secret_access_key=credentials.secret_access_key,
+                aws_session_token=credentials.session_token)
+            while len(self._ssm) > self.max_clients:
+                self._ssm.popitem(last=False)
+            return client
+
+    def _boto3_session(self):
+        # Only called with _lock held
+        if self._session is None:
+            import boto3
+
+            self._session = boto3.session.Session(
+                region_name=self.region_name)
+        return self._session
@@ -0,0 +1,135 @@
+"""Which tasks a repository is eligible for.
+
+Every task is indexed under one posting set per attribute value (its
+subscription level, show, public repo support, org installation, beta flag
+and each repo language it is limited to). A query unions the postings that
+satisfy each attribute and intersects the results, smallest first.
+"""
+from dataclasses import dataclass
+from typing import FrozenSet, Optional
+
+# Roles that can see a task with a given `show` value
+VISIBILITY = {
+    'all': frozenset(['member', 'admin', 'owner']),
+    'admin': frozenset(['admin', 'owner']),
+    'owner': frozenset(['owner']),
+    'none': frozenset(),
+}
+
+# Posting key for tasks that do not restrict repo languages
+ANY_LANGUAGE = None
+
+
+@dataclass(frozen=True)
+class EligibilityQuery:
+    # Highest SubscriptionLevels value the installation is subscribed to
+    subscription_level: int
+    public: bool = False
+    languages: FrozenSet[str] = frozenset()
+    # member | admin | owner
+    role: str = 'member'
+    # Only org level (True) or repo level (False) tasks, None for both
+    org: Optional[bool] = None
+    include_beta: bool = True
+
+    def __post_init__(self):
+        # Accept any iterable of languages and match them case-insensitively
+        object.__setattr__(self, 'languages', frozenset(
+            x.lower() for x in self.languages))
+
+
+def task_installation(task):
+    # V2 tasks carry installation directly, V1 tasks in default_configuration
+    installation = getattr(task, 'installation', None)
+    if installation is None and task.default_configuration is not None:
+        installation = task.default_configuration.installation
+    return installation
+
+
+def eligibility_keys(task):
+    """(attribute, value) pairs a task is indexed under."""
+    installation = task_installation(task)
+    languages = installation.repo_languages if installation else None
+    keys = [
+        ('level', task.subscription_level),
+        ('show', task.show),
+        ('public', bool(task.has_public_repo)),
+        ('org', bool(installation.org) if installation else False),
+        ('beta', bool(task.beta)),
+    ]
+    if languages:
+        keys.extend(('language', x.lower()) for x in languages)
+    else:
+        keys.append(('language', ANY_LANGUAGE))
+    return tuple(dict.fromkeys(keys))
+
+
+def build_postings(keys_by_slug):
+    postings = {}
+    for slug, keys in keys_by_slug.items():
+        for attribute, value in keys:
+            postings.setdefault(attribute, {}).setdefault(
+                value, set()).add(slug)
+    return {
+        attribute: {value: frozenset(x) for value, x in values.items()}
+        for attribute, values in postings.items()}
+
+
+def update_postings(postings, removed, added):
+    """Copy-on-write update of only the posting sets that changed.
+
+    removed and added map slugs to the keys they were/are indexed under.
+    A changed posting set is copied whole, untouched ones are shared.
+    """
+    changes = {}
+    for slug, keys in removed.items():
+        for key in keys:
+            changes.setdefault(key, (set(), set()))[0].add(slug)
+    for slug, keys in added.items():
+        for key in keys:
+            changes.setdefault(key, (set(), set()))[1].add(slug)
+
+    postings = dict(postings)
+    copied = set()
+    for (attribute, value), (drop, add) in changes.items():
+        if attribute not in copied:
+            postings[attribute] = dict(postings.get(attribute, {}))
+            copied.add(attribute)
+        values = postings[attribute]
+        updated = (values.get(value, frozenset()) - drop) | add
+        if updated:
+            values[value] = frozenset(updated)
+        else:
+            values.pop(value, None)
+    return postings
+
+
+def evaluate(postings, query):
+    """Slugs of the tasks matching query (unordered)."""
+    def union(attribute, accept):
+        values = postings.get(attribute, {})
+        matched = [x for value, x in values.items() if accept(value)]
+        if len(matched) == 1:
+            return matched[0]
+        return frozenset().union(*matched)
+
+    languages = query.languages
+    candidates = [
+        union('level', lambda x: x <= query.subscription_level),
+        union('show', lambda x: query.role in VISIBILITY.get(x, ())),
+        union('language', lambda x: x is ANY_LANGUAGE or x in languages),
+    ]
+    if query.public:
+        candidates.append(postings.get('public', {}).get(True, frozenset()))
+    if query.org is not None:
+        candidates.append(postings.get('org', {}).get(query.org, frozenset()))
+    if not query.include_beta:
+        candidates.append(postings.get('beta', {}).get(False, frozenset()))
+
+    candidates.sort(key=len)
+    result = candidates[0]
+    for candidate in candidates[1:]:
+        if not result:
+            break
+        result = result & candidate
+    return result
@@ -0,0 +1,295 @@
+"""Content-addressed cache of task dependency environments.
+
+A task's toolchain is its V1 runtime, platform and packages, or its V2
+runner_id. environment_spec() normalizes it (package lists are sorted and
+deduplicated, custom install commands keep their order) and the sha256 of
+the spec names a directory under root holding the built environment, so
+tasks with the same spec share one environment and it is only built once.
+
+An environment is built into a temporary directory and renamed into place
+once complete. An flock per spec makes concurrent processes and threads
+wait for a single build, and entries in use hold a shared lock so eviction
+of the least recently used environments (once the store grows past
+max_bytes) skips them. Paths are only handed out by use(), for as long as
+that lock is held; the environment just used is never evicted, even when
+it is larger than max_bytes on its own.
+
+warm_up() builds the most used specs of a catalog ahead of time:
+
+    python -m src.task_interfaces.envcache ROOT CATALOG [--top N]
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+from collections import Counter
+from contextlib import contextmanager
+
+from .tracing import NULL_TRACER
+
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024 * 1024
+SPEC_FILENAME = 'spec.json'
+SIZE_FILENAME = 'size'
+# Package managers whose order of installation does not matter
+_UNORDERED = ('python', 'system', 'node', 'ruby')
+
+
+def environment_spec(task):
+    """Normalized description of the environment a V1 or V2 task needs."""
+    runner_id = getattr(task, 'runner_id', None)
+    if runner_id is not None:
+        return {'runner_id': getattr(runner_id, 'value', runner_id)}
+
+    spec = {'runtime': task.runtime, 'platform': task.platform}
+    packages = task.packages
+    if packages is not None:
+        normalized = {
+            name: sorted(set(getattr(packages, name)))
+            for name in _UNORDERED if getattr(packages, name)}
+        if packages.asdf:
+            normalized['asdf'] = [json.loads(x) for x in sorted(
+                {json.dumps(x, sort_keys=True) for x in packages.asdf})]
+        if packages.custom:
+            normalized['custom'] = list(packages.custom)
+        if normalized:
+            spec['packages'] = normalized
+    return spec
+
+
+def spec_key(spec):
+    return hashlib.sha256(
+        json.dumps(spec, sort_keys=True, separators=(',', ':')).encode()
+    ).hexdigest()
+
+
+def install_script(spec):
+    """Shell script installing a spec's packages under $ENV_DIR."""
+    q = shlex.quote
+    lines = ['set -eu']
+    packages = spec.get('packages', {})
+    if packages.get('python'):
+        lines += [
+            'python3 -m venv "$ENV_DIR/venv"',
+            '"$ENV_DIR/venv/bin/pip" install --quiet '
+            + ' '.join(q(x) for x in packages['python'])]
+    if packages.get('node'):
+        lines.append('npm install --silent --prefix "$ENV_DIR/node" '
+                     + ' '.join(q(x) for x in packages['node']))
+    if packages.get('ruby'):
+        lines.append('gem install --no-document --install-dir '
+                     '"$ENV_DIR/ruby" '
+                     + ' '.join(q(x) for x in packages['ruby']))
+    if packages.get('system'):
+        # Unpacked rather than installed so they live in the environment
+        lines += [
+            'mkdir -p "$ENV_DIR/debs" "$ENV_DIR/system"',
+            '(cd "$ENV_DIR/debs" && apt-get download '
+            + ' '.join(q(x) for x in packages['system']) + ')',
+            'for deb in "$ENV_DIR"/debs/*.deb; do '
+            'dpkg -x "$deb" "$ENV_DIR/system"; done',
+            'rm -rf "$ENV_DIR/debs"']
+    for plugin in packages.get('asdf', ()):
+        name, version = plugin.get('name'), plugin.get('version')
+        lines += [
+            f'ASDF_DATA_DIR="$ENV_DIR/asdf" asdf plugin add {q(name)} || true',
+            f'ASDF_DATA_DIR="$ENV_DIR/asdf" asdf install {q(name)} '
+            f'{q(str(version))}']
+    lines += packages.get('custom', [])
+    return '\n'.join(lines) + '\n'
+
+
+def build_with_shell(spec, path, shell='bash'):
+    """Default builder: run install_script(spec) with ENV_DIR=path."""
+    env = dict(os.environ, ENV_DIR=path)
+    result = subprocess.run(
+        [shell, '-c', install_script(spec)], env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f'Building environment failed:\n'
+            f"{result.stdout.decode(errors='replace')}")
+
+
+class EnvironmentCache:
+    def __init__(self, root, builder=build_with_shell,
+                 max_bytes=DEFAULT_MAX_BYTES, tracer=None):
+        self.root = root
+        self.builder = builder
+        self.max_bytes = max_bytes
+        self.tracer = tracer or NULL_TRACER
+        self.hits = 0
+        self.builds = 0
+        os.makedirs(self._envs_dir, exist_ok=True)
+        os.makedirs(self._locks_dir, exist_ok=True)
+
+    @property
+    def _envs_dir(self):
+        return os.path.join(self.root, 'envs')
+
+    @property
+    def _locks_dir(self):
+        return os.path.join(self.root, 'locks')
+
+    def path(self, spec):
+        return os.path.join(self._envs_dir, spec_key(spec))
+
+    def ensure(self, spec, task=None):
+        """Build the environment for spec if needed.
+
+        Returns whether it was built. Its path may be evicted as soon as
+        this returns, use() to work in it.
+        """
+        with self._hold(spec, task) as (_, built):
+            return built
+
+    @contextmanager
+    def use(self, spec, task=None):
+        """Hold the environment for spec, protected from eviction."""
+        with self._hold(spec, task) as (path, _):
+            yield path
+
+    def ensure_task(self, task):
+        return self.ensure(environment_spec(task), task)
+
+    def use_task(self, task):
+        return self.use(environment_spec(task), task)
+
+    @contextmanager
+    def _hold(self, spec, task=None):
+        key = spec_key(spec)
+        path = os.path.join(self._envs_dir, key)
+        with open(os.path.join(self._locks_dir, f'{key}.lock'), 'a') as lock:
+            with self.tracer.span('env_prep', task) as span:
+                fcntl.flock(lock, fcntl.LOCK_SH)
+                built = False
+                if not os.path.isdir(path):
+                    # Whoever gets the exclusive lock first builds, the
+                    # others find the environment in place once released
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    if os.path.isdir(path):
+                        self.hits += 1
+                    else:
+                        self._build(spec, path)
+                        built = True
+                    fcntl.flock(lock, fcntl.LOCK_SH)
+                else:
+                    self.hits += 1
+                span.set(built=built)
+            # mtime of the directory doubles as its last-use time
+            os.utime(path)
+            yield path, built
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        """Remove least recently used environments until under max_bytes.
+
+        The environment with spec key keep is left in place.
+        """
+        entries = []
+        for key in os.listdir(self._envs_dir):
+            path = os.path.join(self._envs_dir, key)
+            if key.endswith('.tmp') or not os.path.isdir(path):
+                continue
+            entries.append((os.stat(path).st_mtime_ns, key, path))
+
+        size = sum(_env_size(x) for _, _, x in entries)
+        for _, key, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            lock_path = os.path.join(self._locks_dir, f'{key}.lock')
+            with open(lock_path, 'a') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                entry_size = _env_size(path)
+                shutil.rmtree(path, ignore_errors=True)
+            size -= entry_size
+        return size
+
+    def _build(self, spec, path):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            self.builder(spec, tmp_path)
+            with open(os.path.join(tmp_path, SPEC_FILENAME), 'w') as f:
+                json.dump(spec, f, sort_keys=True)
+            with open(os.path.join(tmp_path, SIZE_FILENAME), 'w') as f:
+                f.write(str(_tree_size(tmp_path)))
+            os.rename(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        self.builds += 1
+
+
+def most_used_specs(tasks, top=None):
+    """Specs of tasks by how many tasks share them, most used first."""
+    counts = Counter()
+    specs = {}
+    for task in tasks:
+        spec = environment_spec(task)
+        key = spec_key(spec)
+        counts[key] += 1
+        specs[key] = spec
+    return [(specs[key], count) for key, count in counts.most_common(top)]
+
+
+def warm_up(cache, tasks, top=None):
+    """Build the environments of the top most used specs of tasks.
+
+    Returns how many of them had to be built.
+    """
+    return sum(cache.ensure(spec) for spec, _ in most_used_specs(tasks, top))
+
+
+def _env_size(path):
+    try:
+        with open(os.path.join(path, SIZE_FILENAME)) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return _tree_size(path)
+
+
+def _tree_size(path):
+    size = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                continue
+    return size
+
+
+def main(argv=None):
+    from .loader import load_tasks
+
+    parser = argparse.ArgumentParser(
+        description='Build the environments of the most used task specs')
+    parser.add_argument('root', help='environment store directory')
+    parser.add_argument('catalog', help='directory of task configs')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    args = parser.parse_args(argv)
+
+    report = load_tasks(args.catalog)
+    if not report.ok:
+        print(report.format_errors())
+    cache = EnvironmentCache(args.root, max_bytes=args.max_bytes)
+    tasks = [x for x in report.tasks.values() if x is not None]
+    for spec, count in most_used_specs(tasks, args.top):
+        cache.ensure(spec)
+        print(f'{cache.path(spec)}  {count} tasks  {json.dumps(spec)}')
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
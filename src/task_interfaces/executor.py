@@ -0,0 +1,367 @@
+"""asyncio execution of task_v2 Command lists.
+
+Commands run in order and their completed, duration, exit_code and output
+fields are filled in on the task's own Command objects. A failing ``check``
+command fails the task and the remaining commands are skipped unless they
+set ``run_on_fail``. The stripped output of a successful command with
+``include_in_env`` is exported to the commands after it under that name;
+output too big for an environment variable raises ValueError.
+
+Output is streamed into a bounded OutputBuffer per command. For commands
+with include_output, Command.output holds at most max_output bytes of it
+(head and tail), and at most max_task_output bytes across all the commands
+of a task; the others leave it unset and their buffer is closed once the
+command finished. Close a TaskRun when done with its outputs.
+
+With a ResultCache, cacheable commands whose key (command, runner, shell,
+cache_env values and checked out files) was seen before are restored
+without running.
+
+Tasks with checkout.include_files_changed can be given the list of changed
+files; commands that declare file_patterns then only run on the matching
+files, in parallel argv-safe batches, and are skipped when nothing matches.
+
+With persistent_shell, the commands of a task run in one long-lived shell
+(see shell_session.ShellSession) instead of a new shell each, and
+include_in_env values are exported in it; batches then run one after
+another.
+"""
+import asyncio
+import os
+import shlex
+import signal
+import time
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Optional
+
+from .output import (
+    DEFAULT_COMMAND_OUTPUT, DEFAULT_TASK_OUTPUT, OutputBudget, OutputBuffer,
+    OutputView)
+from .tracing import NULL_TRACER
+
+READ_SIZE = 64 * 1024
+# Linux limits a single argument, and the shell gets the whole command line
+# as one (MAX_ARG_STRLEN is 128 KiB), so batches leave room for the command.
+MAX_COMMAND_LINE = 96 * 1024
+# The same limit applies to each NAME=value string of the environment
+MAX_ENV_STRING = 128 * 1024 - 1
+
+
+@dataclass
+class TaskRun:
+    task: Any
+    passed: bool
+    # Slug of the first check command that failed
+    failed_command: Optional[str] = None
+    # Full captured output of each command with include_output that ran,
+    # keyed by slug
+    outputs: Dict[str, OutputView] = field(default_factory=dict)
+
+    def close(self):
+        for output in self.outputs.values():
+            output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CommandExecutor:
+    """Runs the commands of V2 tasks as subprocesses on the event loop.
+
+    A single executor can run many tasks concurrently with run_tasks(); at
+    most max_concurrent_tasks of them are running at any time. Each run
+    mutates the Command objects of the task it is given, so concurrent runs
+    of the same definition need their own copy (task.copy(deep=True)).
+    """
+
+    def __init__(self, max_concurrent_tasks=None, shell=None,
+                 max_output=DEFAULT_COMMAND_OUTPUT,
+                 max_task_output=DEFAULT_TASK_OUTPUT, spill_dir=None,
+                 cache=None, max_batches=None, persistent_shell=False,
+                 tracer=None):
+        self.max_concurrent_tasks = max_concurrent_tasks
+        self.shell = shell
+        self.max_output = max_output
+        self.max_task_output = max_task_output
+        self.spill_dir = spill_dir
+        self.cache = cache
+        # How many batches of one file-scoped command run at the same time
+        self.max_batches = max_batches or os.cpu_count() or 1
+        self.persistent_shell = persistent_shell
+        # Emits a 'task' span per run and a 'command' span per command
+        self.tracer = tracer or NULL_TRACER
+
+    def output_budget(self):
+        return OutputBudget(self.max_output, self.max_task_output)
+
+    async def run_tasks(self, tasks, env=None, cwd=None, files_changed=None):
+        if self.max_concurrent_tasks is None:
+            return await asyncio.gather(
+                *(self.run_task(x, env, cwd, files_changed) for x in tasks))
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_tasks)
+
+        async def run(task):
+            async with semaphore:
+                return await self.run_task(task, env, cwd, files_changed)
+
+        return await asyncio.gather(*(run(x) for x in tasks))
+
+    async def run_task(self, task, env=None, cwd=None, files_changed=None):
+        env = base_env(env)
+        with self.tracer.span('task', task) as span:
+            if not self.persistent_shell:
+                run = await self._run_task(task, env, cwd, files_changed)
+            else:
+                from .shell_session import ShellSession
+
+                async with ShellSession(env, cwd, self.shell) as session:
+                    run = await self._run_task(
+                        task, env, cwd, files_changed, session)
+            span.set(passed=run.passed, failed_command=run.failed_command)
+        return run
+
+    async def _run_task(self, task, env, cwd, files_changed, session=None):
+        budget = self.output_budget()
+        files_changed = task_files_changed(task, files_changed)
+        run = TaskRun(task, True)
+        try:
+            for command in task.commands:
+                if run.failed_command is not None \
+                        and not command.run_on_fail:
+                    continue
+
+                with self.tracer.span('command', task,
+                                      command=command.slug) as span:
+                    output = await self.run_command(
+                        command, env, cwd, budget, task.runner_id,
+                        files_changed, session)
+                    # A repeated slug keeps the output of its last command
+                    replaced = run.outputs.pop(command.slug, None)
+                    if replaced is not None:
+                        replaced.close()
+                    run.outputs[command.slug] = output
+                    span.set(exit_code=command.exit_code,
+                             skipped=command.skipped)
+                if command.check and command.exit_code != 0 \
+                        and run.failed_command is None:
+                    run.failed_command = command.slug
+                    run.passed = False
+                if export_output(command, env, output) \
+                        and session is not None:
+                    await session.export(
+                        command.include_in_env, env[command.include_in_env])
+                if not command.include_output:
+                    run.outputs.pop(command.slug).close()
+        except BaseException:
+            run.close()
+            raise
+
+        return run
+
+    async def run_command(self, command, env, cwd=None, budget=None,
+                          runner_id=None, files_changed=None, session=None):
+        """Run a single command and return an OutputView of its output.
+
+        With a ShellSession the command runs in it rather than in a shell of
+        its own. The caller closes the view.
+        """
+        budget = budget or self.output_budget()
+        buffer = self._buffer()
+        try:
+            return await self._run_command(
+                command, env, cwd, budget, runner_id, files_changed, session,
+                buffer)
+        except BaseException:
+            buffer.close()
+            raise
+
+    async def _run_command(self, command, env, cwd, budget, runner_id,
+                           files_changed, session, buffer):
+        start = time.monotonic()
+
+        files = None
+        if files_changed is not None and command.file_patterns is not None:
+            files = match_files(files_changed, command.file_patterns)
+            if not files:
+                command.skipped = True
+                command.exit_code = 0
+                command.output = '' if command.include_output else None
+                command.duration = 0.0
+                command.completed = True
+                return buffer.view()
+
+        key = result = None
+        if self.cache is not None and command.cacheable:
+            key = self.cache.key(
+                command, runner_id, env, cwd, files, self.shell)
+            result = self.cache.get(key)
+
+        if result is not None:
+            buffer.write((result['output'] or '').encode())
+            command.exit_code = result['exit_code']
+        elif files is not None:
+            command.exit_code = await self._execute_batches(
+                command.command, files, env, cwd, buffer, session)
+        elif session is not None:
+            command.exit_code = await session.run(command.command, buffer)
+        else:
+            command.exit_code = await self._execute(
+                command.command, env, cwd, buffer)
+        command.duration = time.monotonic() - start
+        output = buffer.view(budget.limit())
+        if command.include_output:
+            command.output = str(output)
+            budget.charge(buffer.size if output.limit is None else min(
+                buffer.size, output.limit))
+        else:
+            command.output = None
+        command.completed = True
+        if key is not None and result is None:
+            if not command.include_in_env:
+                self.cache.put(
+                    key, command.exit_code, buffer.text(self.max_output))
+            elif buffer.size <= MAX_ENV_STRING:
+                # A restored output is exported again, so it is kept whole.
+                # Bigger output cannot be exported and is not cached.
+                self.cache.put(key, command.exit_code, buffer.text())
+        return output
+
+    async def _execute_batches(self, command, files, env, cwd, buffer,
+                               session=None):
+        batches = argv_batches(files, MAX_COMMAND_LINE - len(command))
+        if session is not None:
+            # A session runs one command at a time
+            exit_code = 0
+            for batch in batches:
+                batch_exit_code = await session.run(
+                    f'{command} {batch}', buffer)
+                if exit_code == 0:
+                    exit_code = batch_exit_code
+            return exit_code
+        if len(batches) == 1:
+            return await self._execute(
+                f'{command} {batches[0]}', env, cwd, buffer)
+
+        semaphore = asyncio.Semaphore(self.max_batches)
+
+        async def run(batch):
+            async with semaphore:
+                batch_buffer = self._buffer()
+                exit_code = await self._execute(
+                    f'{command} {batch}', env, cwd, batch_buffer)
+                return exit_code, batch_buffer
+
+        results = await asyncio.gather(*(run(x) for x in batches))
+        # Outputs are concatenated in batch order, the first failing batch
+        # decides the exit code
+        exit_code = 0
+        for batch_exit_code, batch_buffer in results:
+            with batch_buffer:
+                for start in range(0, batch_buffer.size, READ_SIZE):
+                    buffer.write(batch_buffer.read(start, start + READ_SIZE))
+            if exit_code == 0:
+                exit_code = batch_exit_code
+        return exit_code
+
+    def _buffer(self):
+        per_command = self.max_output or DEFAULT_COMMAND_OUTPUT
+        return OutputBuffer(
+            per_command // 2, per_command - per_command // 2, self.spill_dir)
+
+    async def _execute(self, command, env, cwd, buffer):
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=env,
+            cwd=cwd,
+            executable=self.shell,
+            # Own process group so a cancelled command can be killed along
+            # with everything its shell started
+            start_new_session=True,
+        )
+        try:
+            while True:
+                chunk = await process.stdout.read(READ_SIZE)
+                if not chunk:
+                    break
+                buffer.write(chunk)
+            return await process.wait()
+        except BaseException:
+            kill_process_group(process)
+            await process.wait()
+            raise
+
+
+def kill_process_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def task_files_changed(task, files_changed):
+    """The changed files to scope commands to, if the task asked for them."""
+    checkout = task.capabilities.checkout
+    if checkout is None or not checkout.include_files_changed:
+        return None
+    return files_changed
+
+
+def match_files(files, patterns):
+    return [
+        x for x in files if any(fnmatchcase(x, pattern) for pattern in patterns)]
+
+
+def argv_batches(files, max_length):
+    """Shell-quoted argument strings of at most max_length characters."""
+    batches = []
+    batch = []
+    length = 0
+    for path in files:
+        quoted = shlex.quote(path)
+        if batch and length + len(quoted) + 1 > max_length:
+            batches.append(' '.join(batch))
+            batch = []
+            length = 0
+        batch.append(quoted)
+        length += len(quoted) + 1
+    if batch:
+        batches.append(' '.join(batch))
+    return batches
+
+
+def base_env(env=None):
+    base = dict(os.environ)
+    if env:
+        base.update(env)
+    return base
+
+
+def export_output(command, env, output):
+    """Expose a finished command's output to later commands if it asks to.
+
+    The whole output is exported, not the capped Command.output. Returns
+    whether env was updated, and raises ValueError if the output is too big
+    for an environment variable.
+    """
+    if not command.include_in_env or not command.completed \
+            or command.exit_code != 0:
+        return False
+
+    name = command.include_in_env
+    value = None
+    if output.size <= MAX_ENV_STRING:
+        value = output.read().decode(errors='replace').strip()
+    if value is None or len(name) + len(value.encode()) + 1 > MAX_ENV_STRING:
+        raise ValueError(
+            f"Output of command '{command.slug}' ({output.size} bytes) is "
+            f"too big to export as {name}")
+    env[name] = value
+    return True
@@ -0,0 +1,239 @@
+"""Sharded fan-out of work from an orchestrator task to its worker task.
+
+An orchestrator (the task_orchestrator capability) hands work to a worker
+(the githaxs_worker capability) by sending events to a queue. Instead of one
+event per file or package, FanOut batches work items into shards of
+shard_size and keeps at most max_in_flight shards outstanding; shards are
+only built as earlier ones complete, so a large or lazy iterable of items
+never floods the queue.
+
+A queue is any object with ``async send(event_name, message)`` returning
+the worker's response. The message is::
+
+    {'task': <orchestrator slug>, 'shard': <index>, 'items': [...],
+     'payload': <shared payload>}
+
+and the response ``{'results': [...], 'errors': {<item index>: <error>}}``
+with one result per item. Items listed in ``errors`` failed individually;
+a shard whose send raises fails every item in it. Results are merged back
+in item order into a FanOutReport. LocalQueue runs handlers in-process and
+stands in for the real queue in tests.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_SHARD_SIZE = 50
+DEFAULT_MAX_IN_FLIGHT = 8
+# V1 workers all subscribe to the same event
+V1_WORKER_EVENT = 'githaxs.invoke_task'
+
+
+@dataclass(frozen=True)
+class Shard:
+    index: int
+    # Position of the shard's first item in the fanned out items
+    start: int
+    items: List[Any]
+
+
+@dataclass(frozen=True)
+class ItemFailure:
+    index: int
+    item: Any
+    error: str
+
+
+@dataclass
+class FanOutReport:
+    # One entry per item in the original order, None for failed items
+    results: List[Any] = field(default_factory=list)
+    failures: List[ItemFailure] = field(default_factory=list)
+    shards: int = 0
+    # Shards sent again after their send raised
+    retried: int = 0
+
+    @property
+    def ok(self):
+        return not self.failures
+
+
+def worker_event(task):
+    """Event name a worker task subscribes to, for V1 and V2 tasks."""
+    capabilities = task.capabilities
+    if hasattr(capabilities, 'githaxs_worker'):
+        if not capabilities.githaxs_worker.enabled:
+            raise ValueError(f'{task.slug} does not have the githaxs_worker '
+                             'capability')
+        return capabilities.githaxs_worker.event_name
+    if not task.has_githaxs_worker_capability():
+        raise ValueError(f'{task.slug} does not have the githaxs-worker '
+                         'capability')
+    return V1_WORKER_EVENT
+
+
+class FanOut:
+    def __init__(self, queue, event_name, shard_size=DEFAULT_SHARD_SIZE,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT, retries=0, task=None):
+        if shard_size < 1 or max_in_flight < 1:
+            raise ValueError('shard_size and max_in_flight must be positive')
+        self.queue = queue
+        self.event_name = event_name
+        self.shard_size = shard_size
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        # Slug of the orchestrator, sent along so workers can tell callers
+        # apart
+        self.task = task
+
+    @classmethod
+    def for_worker(cls, queue, worker, orchestrator=None, **kwargs):
+        """FanOut to the event a worker task subscribes to."""
+        return cls(queue, worker_event(worker),
+                   task=orchestrator.slug if orchestrator else None, **kwargs)
+
+    def shards(self, items):
+        """Lazily split items into Shards of shard_size."""
+        items = iter(items)
+        index = start = 0
+        while True:
+            batch = list(islice(items, self.shard_size))
+            if not batch:
+                return
+            yield Shard(index, start, batch)
+            index += 1
+            start += len(batch)
+
+    async def run(self, items, payload=None):
+        report = FanOutReport()
+        shards = self.shards(items)
+        merged = {}
+
+        async def send_all():
+            # A fixed pool pulling from the shard generator is the
+            # backpressure: nothing is read from items ahead of a free slot
+            for shard in shards:
+                merged[shard.index] = (
+                    shard, await self._send(shard, payload, report))
+
+        await asyncio.gather(*(send_all() for _ in range(self.max_in_flight)))
+
+        report.shards = len(merged)
+        for index in range(len(merged)):
+            shard, (results, errors) = merged[index]
+            for offset, item in enumerate(shard.items):
+                error = errors.get(offset)
+                if error is not None:
+                    report.failures.append(
+                        ItemFailure(shard.start + offset, item, error))
+                    report.results.append(None)
+                else:
+                    report.results.append(results[offset])
+        return report
+
+    async def _send(self, shard, payload, report):
+        message = {'task': self.task, 'shard': shard.index,
+                   'items': shard.items, 'payload': payload}
+        attempts = 0
+        while True:
+            try:
+                response = await self.queue.send(self.event_name, message)
+            except Exception as e:
+                if attempts < self.retries:
+                    attempts += 1
+                    report.retried += 1
+                    continue
+                error = f'{type(e).__name__}: {e}'
+                return [None] * len(shard.items), dict.fromkeys(
+                    range(len(shard.items)), error)
+            return parse_response(response, len(shard.items))
+
+
+def parse_response(response, size):
+    """(results, errors by item offset) from a worker response."""
+    results = list((response or {}).get('results') or ())
+    errors = {
+        int(k): str(v)
+        for k, v in ((response or {}).get('errors') or {}).items()}
+    if len(results) < size:
+        missing = 'Worker returned no result for this item'
+        for offset in range(len(results), size):
+            errors.setdefault(offset, missing)
+        results += [None] * (size - len(results))
+    return results, errors
+
+
+class LocalQueue:
+    """In-process stand-in for the worker queue.
+
+    Handlers are registered per event name and called with the items of a
+    shard and the shared payload; they return one result per item, or a full
+    response dict to report per-item errors. Messages are consumed by
+    ``workers`` consumer coroutines in the order they were sent.
+    """
+
+    def __init__(self, handlers: Optional[Dict[str, Callable]] = None,
+                 workers=1):
+        self.handlers = dict(handlers or {})
+        self.workers = workers
+        self.sent = 0
+        # Highest number of messages waiting or being handled at once
+        self.max_depth = 0
+        self._depth = 0
+        self._queue = None
+        self._consumers = []
+
+    def register(self, event_name, handler):
+        self.handlers[event_name] = handler
+
+    async def send(self, event_name, message):
+        if event_name not in self.handlers:
+            raise LookupError(f'No worker subscribed to {event_name}')
+        self._start()
+        self.sent += 1
+        self._depth += 1
+        self.max_depth = max(self.max_depth, self._depth)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((event_name, message, future))
+        try:
+            return await future
+        finally:
+            self._depth -= 1
+
+    async def close(self):
+        for consumer in self._consumers:
+            consumer.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+        self._queue = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._consumers = [
+                asyncio.ensure_future(self._consume())
+                for _ in range(self.workers)]
+
+    async def _consume(self):
+        while True:
+            event_name, message, future = await self._queue.get()
+            try:
+                response = self.handlers[event_name](
+                    message['items'], message.get('payload'))
+                if asyncio.iscoroutine(response):
+                    response = await response
+                if not isinstance(response, dict):
+                    response = {'results': list(response)}
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(response)
@@ -0,0 +1,172 @@
+"""Bulk loading of task_config.yaml catalogs.
+
+Configs are parsed and validated in a process pool and the validated tasks
+are written to a pickle cache keyed by the sha256 of each file's content.
+On the next load only files whose content changed are parsed again. The
+cache is also keyed by the source of the task modules so a model change
+invalidates it. Only point cache_path at files this process wrote.
+"""
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from pydantic import ValidationError
+
+from . import task, task_v2
+
+CONFIG_FILENAME = 'task_config.yaml'
+
+
+@dataclass
+class LoadError:
+    path: str
+    error: str
+
+
+@dataclass
+class LoadReport:
+    # Validated tasks keyed by config path, in discovery order
+    tasks: Dict[str, Any] = field(default_factory=dict)
+    errors: List[LoadError] = field(default_factory=list)
+    cached: int = 0
+    validated: int = 0
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def format_errors(self):
+        return '\n\n'.join(f'{x.path}:\n{x.error}' for x in self.errors)
+
+
+def parse_task(data):
+    """Validate a task config dict as a V1 or V2 Task."""
+    if not isinstance(data, dict):
+        raise ValueError('Task config must be a mapping')
+    if data.get('version') == 2:
+        return task_v2.Task.parse_obj(data)
+    return task.Task.parse_obj(data)
+
+
+def discover(root, filename=CONFIG_FILENAME):
+    """Return the paths of every task config under root, sorted."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(x for x in dirnames if not x.startswith('.'))
+        if filename in filenames:
+            paths.append(os.path.join(dirpath, filename))
+    return paths
+
+
+def load_tasks(root, cache_path=None, max_workers=None,
+               filename=CONFIG_FILENAME):
+    """Load every task config under root into a LoadReport.
+
+    A config that fails to parse or validate is recorded in report.errors
+    and does not stop the rest of the catalog from loading.
+    """
+    return load_files(discover(root, filename), cache_path, max_workers)
+
+
+def load_files(paths, cache_path=None, max_workers=None):
+    report = LoadReport()
+    cache = _read_cache(cache_path) if cache_path else {}
+    digests = {}
+    pending = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            report.errors.append(LoadError(path, str(e)))
+            continue
+
+        digest = hashlib.sha256(content).hexdigest()
+        digests[path] = digest
+        if digest in cache:
+            report.tasks[path] = cache[digest]
+            report.cached += 1
+        else:
+            report.tasks[path] = None
+            pending.append((path, content))
+
+    for path, loaded, error in _validate_all(pending, max_workers):
+        if error is not None:
+            del report.tasks[path]
+            report.errors.append(LoadError(path, error))
+        else:
+            report.tasks[path] = loaded
+            cache[digests[path]] = loaded
+            report.validated += 1
+
+    if cache_path and (report.validated or len(cache) != report.cached):
+        _write_cache(cache_path, {
+            digests[path]: loaded for path, loaded in report.tasks.items()})
+    return report
+
+
+def load_file(path):
+    """Parse and validate a single config, raising on failure."""
+    with open(path, 'rb') as f:
+        path, loaded, error = _validate((path, f.read()))
+    if error is not None:
+        raise ValueError(f'{path}:\n{error}')
+    return loaded
+
+
+def _validate_all(pending, max_workers):
+    # Spawning a pool costs more than validating a handful of files
+    if len(pending) < 8 or max_workers == 1:
+        return [_validate(x) for x in pending]
+
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(pending) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_validate, pending, chunksize=chunksize))
+
+
+def _validate(item):
+    import yaml
+
+    path, content = item
+    try:
+        return path, parse_task(yaml.safe_load(content)), None
+    except (yaml.YAMLError, ValidationError, ValueError) as e:
+        return path, None, str(e)
+    except Exception as e:
+        # One config must not abort the load of the rest of the catalog
+        return path, None, f'{type(e).__name__}: {e}'
+
+
+@lru_cache(maxsize=None)
+def schema_fingerprint():
+    """Hash of the task model sources, changes whenever the schema may."""
+    digest = hashlib.sha256()
+    for module in (task, task_v2):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, 'rb') as f:
+            fingerprint, entries = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError,
+            AttributeError, ImportError):
+        return {}
+    if fingerprint != schema_fingerprint():
+        return {}
+    return entries
+
+
+def _write_cache(cache_path, entries):
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump((schema_fingerprint(), entries), f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
@@ -0,0 +1,309 @@
+"""Conversion of V1 task configs to V2.
+
+convert() maps a V1 config onto the V2 schema:
+
+- each entry of the capability list enables the matching Capabilities
+  field, keeping its options (checkout depth, check run settings, SSM
+  parameter injection); workers keep the event V1 workers subscribe to
+- runtime picks the runner_id, and the V1 entrypoint (task.sh's or
+  task.py's run function) becomes the task's single command, a check
+  command so that a failing entrypoint still fails the task
+- default_configuration also fills the V2 installation and settings
+
+V1 fields with no V2 equivalent (memory, timeout, storage, platform,
+packages, extra_sam_resources, and owner or hosting_option other than the
+V2 constants) are dropped and reported when they differ from their
+defaults. Events the converted task would stop or start being routed
+are reported too, as ``routing``. Every converted config is validated as
+a V2 Task before it is written, so the output only ever loads through
+the V2 path.
+
+migrate_catalog() converts a whole catalog in a process pool and yields
+one Migration per config as they finish:
+
+    python -m src.task_interfaces.migrate ROOT OUT_DIR [--workers N]
+"""
+import argparse
+import copy
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ValidationError
+
+from . import task, task_v2
+from .fanout import V1_WORKER_EVENT
+from .loader import CONFIG_FILENAME, discover
+
+# Entrypoint file and command running its run function, per V1 runtime
+ENTRYPOINTS = {
+    'bash': ('task.sh', '. ./task.sh && run'),
+    'python': ('task.py', "python -c 'import task; task.run()'"),
+}
+# Runner hosting each V1 runtime; the Python runner also provides bash
+RUNNERS = {
+    'bash': task_v2.RunnerId.PYTHON_3_10,
+    'python': task_v2.RunnerId.PYTHON_3_10,
+}
+# V1 fields without a V2 equivalent
+UNMAPPED_FIELDS = ('memory', 'timeout', 'storage', 'platform', 'packages',
+                   'extra_sam_resources', 'owner', 'hosting_option')
+_COPIED_FIELDS = ('name', 'summary', 'description', 'beta',
+                  'subscription_level', 'has_public_repo', 'show', 'tags',
+                  'subscribed_events')
+# Actions V1 generated on the fly, V2 adds them from the same flags
+_GENERATED_ACTIONS = ('fix', 'hotfix')
+
+
+@dataclass
+class Migration:
+    path: str
+    # converted | unchanged (already V2) | failed
+    status: str
+    output: Optional[str] = None
+    # V1 fields dropped by the conversion with their values
+    unmapped: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+@dataclass
+class MigrationReport:
+    migrations: List[Migration] = field(default_factory=list)
+
+    def count(self, status):
+        return sum(1 for x in self.migrations if x.status == status)
+
+    @property
+    def ok(self):
+        return not self.count('failed')
+
+    def format_unmapped(self):
+        return '\n'.join(
+            f'{x.path}: {name}={value!r}' for x in self.migrations
+            for name, value in x.unmapped.items())
+
+    def format_errors(self):
+        return '\n\n'.join(f'{x.path}:\n{x.error}' for x in self.migrations
+                           if x.status == 'failed')
+
+
+def convert_capabilities(capabilities):
+    """V2 Capabilities dict for a V1 capability list."""
+    converted = {}
+    for capability in capabilities or ():
+        # V1 accessors use the first capability of a type
+        name = capability.type
+        if name == 'githaxs-worker':
+            converted.setdefault('githaxs_worker', {
+                'enabled': True, 'event_name': V1_WORKER_EVENT})
+        elif name == 'inject-settings':
+            converted.setdefault('task_settings', {'enabled': True})
+        elif name == 'task-orchestrator':
+            converted.setdefault('task_orchestrator', {'enabled': True})
+        elif name == 'aws-assume-iam-role':
+            converted.setdefault('assume_iam_role', {
+                'enabled': True,
+                'inject_ssm_parameters': bool(
+                    capability.inject_ssm_parameters)})
+        elif name == 'main-branch-analysis':
+            converted.setdefault('main_branch_analysis', {'enabled': True})
+        elif name == 'docker-build':
+            converted.setdefault('docker_build', {'enabled': True})
+        elif name == 'checkout':
+            converted.setdefault('checkout', {
+                'enabled': True, 'depth': capability.depth})
+        elif name == 'checkrun':
+            converted.setdefault('check_run', {
+                'enabled': True,
+                'ignored_authors': list(capability.ignored_authors or ()),
+                'allow_hotfix': bool(capability.allow_hotfix),
+                'fix_errors': bool(capability.fix_errors),
+                'custom': bool(capability.custom),
+                'actions': [
+                    x.dict() for x in capability.actions or ()
+                    if x.identifier not in _GENERATED_ACTIONS],
+            })
+    return converted
+
+
+def unmapped_fields(v1_task):
+    """V1 fields of v1_task that V2 cannot hold, when not at their default."""
+    unmapped = {}
+    for name in UNMAPPED_FIELDS:
+        value = getattr(v1_task, name)
+        if isinstance(value, BaseModel):
+            # An empty packages section is the same as none
+            if value == type(value)():
+                continue
+            value = value.dict()
+        if value is None or value == [] or \
+                value == task.Task.__fields__[name].default:
+            continue
+        unmapped[name] = value
+    return unmapped
+
+
+def convert(data):
+    """(V2 config dict, unmapped V1 fields) for a V1 config dict.
+
+    Raises ValueError or ValidationError when data is not a valid V1 config
+    or its conversion does not validate as V2.
+    """
+    v1_task = task.Task.parse_obj(data)
+    runtime = v1_task.runtime or 'bash'
+    if runtime not in ENTRYPOINTS:
+        raise ValueError(f'No V2 runner for runtime {runtime!r}')
+    command = ENTRYPOINTS[runtime][1]
+
+    converted = {'version': 2}
+    for name in _COPIED_FIELDS:
+        value = getattr(v1_task, name)
+        if value is not None and \
+                value != task_v2.Task.__fields__[name].default:
+            converted[name] = value
+    capabilities = convert_capabilities(v1_task.capabilities)
+    if capabilities:
+        converted['capabilities'] = capabilities
+    converted['runner_id'] = RUNNERS[runtime].value
+    converted['commands'] = [{
+        'title': v1_task.name,
+        'slug': 'run',
+        'command': command,
+        # A failing V1 entrypoint failed the task, with or without checkrun
+        'check': True,
+    }]
+    if v1_task.parameters:
+        converted['parameters'] = [
+            x.dict(exclude_none=True) for x in v1_task.parameters]
+        for parameter in converted['parameters']:
+            if 'type' in parameter:
+                parameter['type'] = parameter['type'].value
+
+    default_configuration = v1_task.default_configuration
+    if default_configuration is not None:
+        installation = (default_configuration.installation
+                        or task.Installation()).dict()
+        converted['installation'] = installation
+        if default_configuration.settings:
+            converted['settings'] = default_configuration.settings
+        # Copies, so the YAML output has no anchors
+        converted['default_configuration'] = copy.deepcopy({
+            'installation': installation,
+            'settings': default_configuration.settings,
+        })
+
+    # Only emit configs the V2 path accepts
+    v2_task = task_v2.Task.parse_obj(converted)
+    unmapped = unmapped_fields(v1_task)
+    routing = routing_changes(v1_task, v2_task)
+    if routing:
+        unmapped['routing'] = routing
+    return converted, unmapped
+
+
+def routing_changes(v1_task, v2_task):
+    """Events only one of the two versions of a task subscribes to."""
+    v1_events = v1_task.get_subscribed_events()
+    v2_events = v2_task.get_subscribed_events()
+    changes = {}
+    removed = [x for x in v1_events if x not in v2_events]
+    if removed:
+        changes['removed'] = removed
+    added = [x for x in v2_events if x not in v1_events]
+    if added:
+        changes['added'] = added
+    return changes
+
+
+def migrate_file(path, output):
+    """Convert the config at path into output; returns a Migration.
+
+    V2 configs are copied unchanged. The V1 entrypoint is copied next to
+    output when output is in another directory.
+    """
+    import yaml
+
+    try:
+        with open(path, 'rb') as f:
+            data = yaml.safe_load(f)
+        if isinstance(data, dict) and data.get('version') == 2:
+            task_v2.Task.parse_obj(data)
+            converted, unmapped, status = data, {}, 'unchanged'
+        else:
+            if not isinstance(data, dict):
+                raise ValueError('Task config must be a mapping')
+            converted, unmapped = convert(data)
+            status = 'converted'
+    except (OSError, yaml.YAMLError, ValidationError, ValueError) as e:
+        return Migration(path, 'failed', error=str(e))
+    except KeyError as e:
+        # str() of a KeyError is only the quoted key
+        return Migration(path, 'failed', error=f'Missing key {e}')
+
+    source_dir = os.path.dirname(os.path.abspath(path))
+    output_dir = os.path.dirname(os.path.abspath(output))
+    os.makedirs(output_dir, exist_ok=True)
+    if status == 'converted' and source_dir != output_dir:
+        entrypoint = os.path.join(
+            source_dir, ENTRYPOINTS[data.get('runtime') or 'bash'][0])
+        if os.path.exists(entrypoint):
+            shutil.copy2(entrypoint, output_dir)
+
+    tmp_path = f'{output}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        yaml.safe_dump(converted, f, sort_keys=False)
+    os.replace(tmp_path, output)
+    return Migration(path, status, output, unmapped)
+
+
+def migrate_catalog(root, out_dir, max_workers=None,
+                    filename=CONFIG_FILENAME):
+    """Convert every config under root into the same layout under out_dir.
+
+    Yields a Migration per config in discovery order as the pool finishes
+    them. out_dir may be root to convert the catalog in place.
+    """
+    items = [
+        (path, os.path.join(out_dir, os.path.relpath(path, root)))
+        for path in discover(root, filename)]
+    # Spawning a pool costs more than converting a handful of files
+    if len(items) < 8 or max_workers == 1:
+        for item in items:
+            yield _migrate(item)
+        return
+
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(items) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_migrate, items, chunksize=chunksize)
+
+
+def _migrate(item):
+    return migrate_file(*item)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Convert a catalog of V1 task configs to V2')
+    parser.add_argument('root', help='directory of task configs')
+    parser.add_argument('out_dir', help='directory to write V2 configs to')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    report = MigrationReport()
+    for migration in migrate_catalog(args.root, args.out_dir, args.workers):
+        report.migrations.append(migration)
+        for name, value in migration.unmapped.items():
+            print(f'{migration.path}: dropped {name}={value!r}')
+    if not report.ok:
+        print(report.format_errors())
+    print(f"{report.count('converted')} converted, "
+          f"{report.count('unchanged')} already V2, "
+          f"{report.count('failed')} failed")
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
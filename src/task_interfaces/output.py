@@ -0,0 +1,177 @@
+"""Bounded capture of command output.
+
+OutputBuffer keeps the first and last bytes of a stream in memory and
+spills everything in between to an anonymous temporary file, which is
+memory-mapped when it is read back. A command's memory use is therefore
+bounded by head_size + 2 * tail_size however much it prints.
+"""
+import mmap
+import tempfile
+
+DEFAULT_COMMAND_OUTPUT = 1024 * 1024
+DEFAULT_TASK_OUTPUT = 8 * 1024 * 1024
+
+
+class OutputBuffer:
+    def __init__(self, head_size=DEFAULT_COMMAND_OUTPUT // 2,
+                 tail_size=DEFAULT_COMMAND_OUTPUT // 2, spill_dir=None):
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.spill_dir = spill_dir
+        self.size = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._spill = None
+        self._spilled = 0
+        self._map = None
+
+    @property
+    def head(self):
+        return bytes(self._head)
+
+    @property
+    def tail(self):
+        self._trim(self.tail_size)
+        return bytes(self._tail)
+
+    @property
+    def spilled(self):
+        return self._spilled
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        room = self.head_size - len(self._head)
+        if room > 0:
+            self._head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk:
+            self._tail += chunk
+            # Trimming lazily at twice the size amortizes the memmove
+            if len(self._tail) > 2 * self.tail_size:
+                self._trim(self.tail_size)
+
+    def read(self, start=0, end=None):
+        """Bytes start:end of everything written so far."""
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return b''
+
+        self._trim(self.tail_size)
+        head_end = len(self._head)
+        spill_end = head_end + self._spilled
+        parts = []
+        if start < head_end:
+            parts.append(self._head[start:min(end, head_end)])
+        if self._spilled and start < spill_end and end > head_end:
+            mapped = self._mapped()
+            parts.append(mapped[max(start, head_end) - head_end:
+                                min(end, spill_end) - head_end])
+        if end > spill_end:
+            parts.append(self._tail[max(start, spill_end) - spill_end:
+                                    end - spill_end])
+        return b''.join(parts)
+
+    def text(self, limit=None):
+        """Decoded output, keeping the head and tail if it exceeds limit."""
+        if limit is None or self.size <= limit:
+            return self.read().decode(errors='replace')
+
+        half = limit // 2
+        omitted = self.size - 2 * half
+        return (
+            self.read(0, half).decode(errors='replace')
+            + f'\n... [{omitted} bytes omitted] ...\n'
+            + self.read(self.size - half).decode(errors='replace'))
+
+    def view(self, limit=None):
+        return OutputView(self, limit)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _trim(self, keep):
+        overflow = len(self._tail) - keep
+        if overflow <= 0:
+            return
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(dir=self.spill_dir)
+        self._spill.write(self._tail[:overflow])
+        self._spilled += overflow
+        del self._tail[:overflow]
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _mapped(self):
+        if self._map is None:
+            self._spill.flush()
+            self._map = mmap.mmap(
+                self._spill.fileno(), self._spilled, access=mmap.ACCESS_READ)
+        return self._map
+
+
+class OutputView:
+    """Output of a command rendered on first use, capped at limit bytes."""
+
+    def __init__(self, buffer, limit=None):
+        self.buffer = buffer
+        self.limit = limit
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self.buffer.text(self.limit)
+        return self._text
+
+    def __len__(self):
+        return len(str(self))
+
+    @property
+    def size(self):
+        return self.buffer.size
+
+    def read(self, start=0, end=None):
+        return self.buffer.read(start, end)
+
+    def close(self):
+        self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class OutputBudget:
+    """Caps output kept per command and across all commands of a task."""
+
+    def __init__(self, per_command=DEFAULT_COMMAND_OUTPUT,
+                 per_task=DEFAULT_TASK_OUTPUT):
+        self.per_command = per_command
+        self.remaining = per_task
+
+    def limit(self):
+        if self.remaining is None:
+            return self.per_command
+        if self.per_command is None:
+            return self.remaining
+        return min(self.per_command, self.remaining)
+
+    def charge(self, used):
+        if self.remaining is not None:
+            self.remaining = max(0, self.remaining - used)
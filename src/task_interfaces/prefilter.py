@@ -0,0 +1,113 @@
+"""Pre-dispatch evaluation of check runs that can pass without a runner.
+
+A check run task passes immediately when the pull request author is one of
+its ignored_authors, or when it allows hotfixes and the head branch or the
+pull request title contains "hotfix". Only the events that create a check
+run (CHECK_RUN_EVENTS) are short-circuited; anything else, such as a
+requested action or an event the task subscribed to itself, is always
+dispatched. Instead of looping over every task's settings per webhook, the
+evaluator precompiles one author -> tasks map and one set of hotfix tasks
+for the whole catalog.
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Tuple
+
+HOTFIX = re.compile('hotfix', re.IGNORECASE)
+# Events the check run capability subscribes a task to for running its check
+CHECK_RUN_EVENTS = frozenset({
+    'pull_request.opened',
+    'pull_request.reopened',
+    'pull_request.synchronize',
+    'check_run.rerequested',
+})
+
+
+@dataclass(frozen=True)
+class Decision:
+    # Check runs that can be completed as passing without a runner
+    passing: Tuple[Any, ...] = ()
+    # Tasks that still need a runner
+    dispatch: Tuple[Any, ...] = ()
+
+
+def check_run_settings(task):
+    """(enabled, ignored_authors, allow_hotfix) for a V1 or V2 task."""
+    capabilities = task.capabilities
+    if hasattr(capabilities, 'check_run'):
+        check_run = capabilities.check_run
+        return (check_run.enabled, check_run.ignored_authors or (),
+                bool(check_run.allow_hotfix))
+    return (task.has_check_run_capability(), task.ignored_authors() or (),
+            bool(task.allows_for_hotfixes()))
+
+
+def pull_request_facts(payload):
+    """(author, head branch, title) of the pull request behind a webhook."""
+    pull_request = payload.get('pull_request')
+    if pull_request is not None:
+        return (
+            (pull_request.get('user') or {}).get('login'),
+            (pull_request.get('head') or {}).get('ref'),
+            pull_request.get('title'))
+
+    # check_run.rerequested only carries the branch of its check suite
+    check_run = payload.get('check_run') or {}
+    check_suite = check_run.get('check_suite') or {}
+    return None, check_suite.get('head_branch'), None
+
+
+class ShortCircuitEvaluator:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        by_author = {}
+        hotfix = set()
+        for task in catalog:
+            enabled, ignored_authors, allow_hotfix = check_run_settings(task)
+            if not enabled:
+                continue
+            for author in ignored_authors:
+                by_author.setdefault(author, set()).add(task.slug)
+            if allow_hotfix:
+                hotfix.add(task.slug)
+        self._by_author = {
+            author: frozenset(slugs) for author, slugs in by_author.items()}
+        self._hotfix = frozenset(hotfix)
+
+    def passing_slugs(self, author=None, branch=None, title=None):
+        slugs = self._by_author.get(author, frozenset())
+        if self._hotfix and (
+                (branch and HOTFIX.search(branch))
+                or (title and HOTFIX.search(title))):
+            slugs = slugs | self._hotfix
+        return slugs
+
+    def evaluate_record(self, record):
+        """evaluate() for a routing.RoutingRecord extracted from a webhook."""
+        routed = self.catalog.route(record.event, record.action)
+        if not routed:
+            return Decision()
+        if record.event_name not in CHECK_RUN_EVENTS:
+            return Decision(dispatch=routed)
+
+        slugs = self.passing_slugs(
+            record.author, record.head_branch, record.title)
+        return self._decide(routed, slugs)
+
+    def evaluate(self, event, action, payload):
+        """Split the tasks routed for a webhook into passing and dispatch."""
+        routed = self.catalog.route(event, action)
+        if not routed:
+            return Decision()
+        if f'{event}.{action}' not in CHECK_RUN_EVENTS:
+            return Decision(dispatch=routed)
+
+        slugs = self.passing_slugs(*pull_request_facts(payload))
+        return self._decide(routed, slugs)
+
+    def _decide(self, routed, slugs):
+        if not slugs:
+            return Decision(dispatch=routed)
+        return Decision(
+            passing=tuple(x for x in routed if x.slug in slugs),
+            dispatch=tuple(x for x in routed if x.slug not in slugs))
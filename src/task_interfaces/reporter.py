@@ -0,0 +1,424 @@
+"""Batched reporting of findings to GitHub check runs.
+
+GitHub accepts at most 50 annotations per check run update, so tasks that
+find thousands of issues need many updates. CheckRunReporter parses
+findings from a command's output as it streams (see parse_annotation for
+the formats understood), fills batches of 50, and sends each batch as soon
+as it is full while parsing continues. Updates go over a small pool of
+kept-alive HTTP connections, and are paced from the X-RateLimit-Remaining
+and X-RateLimit-Reset headers: requests are spread over the time left
+until the reset once few remain, and a rate limited request waits for the
+reset (or Retry-After) and is sent again.
+
+Tasks whose CheckRun capability sets ``custom`` manage their own check run
+and are not reported; a task's ``actions`` are attached to the final update.
+"""
+import asyncio
+import http.client
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+from .tracing import NULL_TRACER
+
+API_URL = 'https://api.github.com'
+MAX_ANNOTATIONS = 50
+MAX_ACTIONS = 3
+MAX_TEXT = 65535
+READ_SIZE = 64 * 1024
+# Pacing starts once fewer requests than this remain in the window
+RATE_LIMIT_RESERVE = 100
+
+# path:line[:column]: message, as printed by flake8, pylint, mypy, eslint
+# (unix format), gcc, shellcheck (gcc format) and most other linters
+_UNIX = re.compile(
+    r'^(?:\./)?(?P<path>[^\s:]+):(?P<line>\d+):(?:(?P<column>\d+):)?\s*'
+    r'(?P<message>.+)$')
+# GitHub workflow commands, e.g. ::error file=a.py,line=3,col=1::message
+_WORKFLOW = re.compile(
+    r'^::(?P<level>error|warning|notice)(?:\s+(?P<properties>[^:]*))?::'
+    r'(?P<message>.*)$')
+_LEVELS = {'error': 'failure', 'warning': 'warning', 'notice': 'notice'}
+_WARNING = re.compile(r'^\W*(warning|warn|info|note|notice)\b', re.IGNORECASE)
+
+
+def check_run_reporting(task):
+    """(enabled, custom, actions) of a V1 or V2 task's check run."""
+    capabilities = task.capabilities
+    if hasattr(capabilities, 'check_run'):
+        check_run = capabilities.check_run
+        return (check_run.enabled, bool(check_run.custom),
+                [x.dict() for x in check_run.actions or ()])
+    return (task.has_check_run_capability(),
+            bool(task.has_custom_check_run_capability()),
+            task.get_check_run_actions() or [])
+
+
+def parse_annotation(line, root=None):
+    """A check run annotation for one line of output, or None.
+
+    Paths are made relative to root, the checkout the command ran in, and
+    findings outside of it are dropped; without a root, absolute paths are
+    dropped. Malformed line and column numbers are ignored.
+    """
+    line = line.rstrip('\r\n')
+    match = _WORKFLOW.match(line)
+    if match is not None:
+        properties = dict(
+            x.split('=', 1) for x in (match['properties'] or '').split(',')
+            if '=' in x)
+        path = annotation_path(properties.get('file'), root)
+        if path is None:
+            return None
+        start_line = _number(properties.get('line')) or 1
+        annotation = {
+            'path': path,
+            'start_line': start_line,
+            'end_line': max(
+                _number(properties.get('endLine')) or start_line,
+                start_line),
+            'annotation_level': _LEVELS[match['level']],
+            'message': match['message'],
+        }
+        if 'title' in properties:
+            annotation['title'] = properties['title']
+        column = _number(properties.get('col'))
+        if column is not None and start_line == annotation['end_line']:
+            annotation['start_column'] = column
+            annotation['end_column'] = max(
+                _number(properties.get('endColumn')) or column, column)
+        return annotation
+
+    match = _UNIX.match(line)
+    if match is None:
+        return None
+    path = annotation_path(match['path'], root)
+    if path is None:
+        return None
+    annotation = {
+        'path': path,
+        'start_line': int(match['line']),
+        'end_line': int(match['line']),
+        'annotation_level': 'warning' if _WARNING.match(match['message'])
+        else 'failure',
+        'message': match['message'],
+    }
+    if match['column'] is not None:
+        annotation['start_column'] = annotation['end_column'] = int(
+            match['column'])
+    return annotation
+
+
+def annotation_path(path, root=None):
+    """path relative to the checkout at root, None if it is outside."""
+    if not path:
+        return None
+    if os.path.isabs(path):
+        if root is None:
+            return None
+        path = os.path.relpath(path, os.path.abspath(root))
+    path = os.path.normpath(path)
+    if path == os.curdir or path == os.pardir \
+            or path.startswith(os.pardir + os.sep):
+        return None
+    return path
+
+
+def _number(value):
+    # Line and column numbers start at 1
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def iter_lines(source):
+    """Lines of an OutputBuffer, bytes or str, read a chunk at a time."""
+    if isinstance(source, (bytes, str)):
+        text = source.decode(errors='replace') \
+            if isinstance(source, bytes) else source
+        yield from text.splitlines()
+        return
+
+    pending = b''
+    for start in range(0, source.size, READ_SIZE):
+        lines = (pending + source.read(start, start + READ_SIZE)).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.decode(errors='replace')
+    if pending:
+        yield pending.decode(errors='replace')
+
+
+def iter_annotations(source, root=None):
+    for line in iter_lines(source):
+        annotation = parse_annotation(line, root)
+        if annotation is not None:
+            yield annotation
+
+
+def batches(annotations, size=MAX_ANNOTATIONS):
+    batch = []
+    for annotation in annotations:
+        batch.append(annotation)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@dataclass
+class ReportResult:
+    annotations: int = 0
+    requests: int = 0
+    # Requests sent again after being rate limited
+    retried: int = 0
+    # Seconds spent pacing or waiting for a rate limit reset
+    paced: float = 0.0
+    levels: dict = field(default_factory=dict)
+
+
+class ReportError(RuntimeError):
+    def __init__(self, status, body):
+        super().__init__(f'GitHub returned {status}: {body[:500]}')
+        self.status = status
+        self.body = body
+
+
+class _ConnectionPool:
+    def __init__(self, url, size, timeout):
+        parts = urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+
+    def request(self, method, path, body, headers):
+        with self._slots:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            for attempt in range(2):
+                if connection is None:
+                    connection = self._connect()
+                try:
+                    connection.request(method, self.prefix + path, body,
+                                       headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                    break
+                except (http.client.HTTPException, OSError):
+                    connection.close()
+                    connection = None
+                    # A kept-alive connection the server closed is retried
+                    # once on a fresh one
+                    if attempt:
+                        raise
+            with self._lock:
+                self._idle.append(connection)
+            return response.status, dict(response.getheaders()), data
+
+    def close(self):
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle = []
+
+    def _connect(self):
+        self.opened += 1
+        if self.https:
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(
+            self.host, self.port, timeout=self.timeout)
+
+
+class _Pacer:
+    """Spacing between requests derived from the rate limit headers."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.delay = 0.0
+        self.resume_at = 0.0
+        self._lock = asyncio.Lock()
+        self._last = 0.0
+
+    def update(self, status, headers):
+        """Returns the seconds to wait before retrying, None if not limited."""
+        headers = {k.lower(): v for k, v in headers.items()}
+        now = self.clock()
+        remaining = headers.get('x-ratelimit-remaining')
+        reset = headers.get('x-ratelimit-reset')
+        retry_after = headers.get('retry-after')
+
+        limited = status == 429 or (status == 403 and (
+            remaining == '0' or retry_after is not None))
+        if limited:
+            if retry_after is not None:
+                wait = float(retry_after)
+            elif reset is not None:
+                wait = max(0.0, float(reset) - now)
+            else:
+                wait = 60.0
+            self.resume_at = max(self.resume_at, now + wait)
+            return wait
+
+        if remaining is not None and reset is not None:
+            remaining = int(remaining)
+            if remaining < RATE_LIMIT_RESERVE:
+                self.delay = max(0.0, float(reset) - now) / max(remaining, 1)
+            else:
+                self.delay = 0.0
+        return None
+
+    async def wait(self):
+        """Sleep until the next request may start; returns seconds slept."""
+        async with self._lock:
+            now = self.clock()
+            start = max(self.resume_at, self._last + self.delay, now)
+            self._last = start
+        if start > now:
+            await asyncio.sleep(start - now)
+        return start - now
+
+
+class CheckRunReporter:
+    def __init__(self, token, api_url=API_URL, max_connections=4,
+                 timeout=30, max_retries=3, tracer=None, clock=time.time):
+        self.token = token
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.tracer = tracer or NULL_TRACER
+        self._pool = _ConnectionPool(api_url, max_connections, timeout)
+        self._pacer = _Pacer(clock)
+
+    async def report(self, task, repository, check_run_id, output,
+                     conclusion, title, summary='', text=None, root=None):
+        """Send the findings in output to a check run and complete it.
+
+        output is an OutputBuffer, bytes or str, and root the checkout the
+        command ran in (see parse_annotation). Returns a ReportResult, or
+        None for tasks that handle their own check run.
+        """
+        enabled, custom, actions = check_run_reporting(task)
+        if not enabled or custom:
+            return None
+
+        path = f'/repos/{repository}/check-runs/{check_run_id}'
+        result = ReportResult()
+        with self.tracer.span('report', task) as span:
+            await self._send_batches(
+                path, iter_annotations(output, root), title, summary,
+                result)
+            body = {
+                'status': 'completed',
+                'conclusion': conclusion,
+                'output': {'title': title, 'summary': summary[:MAX_TEXT]},
+            }
+            if text is not None:
+                body['output']['text'] = text[:MAX_TEXT]
+            if actions:
+                body['actions'] = actions[:MAX_ACTIONS]
+            await self._patch(path, body, result)
+            span.set(annotations=result.annotations,
+                     requests=result.requests, paced=result.paced)
+        return result
+
+    def close(self):
+        self._pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    async def _send_batches(self, path, annotations, title, summary, result):
+        # Parsing runs ahead of sending by at most max_connections batches
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(self.max_connections)
+
+        async def send():
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                await self._patch(path, {'output': {
+                    'title': title, 'summary': summary[:MAX_TEXT],
+                    'annotations': batch}}, result)
+
+        senders = [asyncio.ensure_future(send())
+                   for _ in range(self.max_connections)]
+        try:
+            iterator = batches(annotations)
+            while True:
+                batch = await loop.run_in_executor(None, next, iterator, None)
+                if batch is None:
+                    break
+                result.annotations += len(batch)
+                for annotation in batch:
+                    level = annotation['annotation_level']
+                    result.levels[level] = result.levels.get(level, 0) + 1
+                await self._put(queue, batch, senders)
+            for _ in senders:
+                await self._put(queue, None, senders)
+            await asyncio.gather(*senders)
+        except BaseException:
+            for sender in senders:
+                sender.cancel()
+            await asyncio.gather(*senders, return_exceptions=True)
+            raise
+
+    @staticmethod
+    async def _put(queue, batch, senders):
+        # A sender that failed stops reading the queue, so waiting for room
+        # alone could block forever; its error is raised instead
+        putter = asyncio.ensure_future(queue.put(batch))
+        try:
+            while True:
+                running = [x for x in senders if not x.done()]
+                await asyncio.wait([putter, *running],
+                                   return_when=asyncio.FIRST_COMPLETED)
+                for sender in senders:
+                    if sender.done() and (
+                            sender.cancelled() or sender.exception()):
+                        sender.result()
+                if putter.done():
+                    return
+        finally:
+            putter.cancel()
+
+    async def _patch(self, path, body, result):
+        data = json.dumps(body).encode()
+        headers = {
+            'Authorization': f'Bearer {self.token}',
+            'Accept': 'application/vnd.github+json',
+            'Content-Type': 'application/json',
+            'User-Agent': 'githaxs-task-interfaces',
+        }
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            result.paced += await self._pacer.wait()
+            status, response_headers, response = await loop.run_in_executor(
+                None, self._pool.request, 'PATCH', path, data, headers)
+            result.requests += 1
+            retry_in = self._pacer.update(status, response_headers)
+            if retry_in is None and status < 300:
+                return json.loads(response or b'null')
+            if (retry_in is None and status < 500) \
+                    or attempt == self.max_retries:
+                raise ReportError(status, response.decode(errors='replace'))
+            result.retried += 1
+            if retry_in is None:
+                # Server errors back off exponentially
+                await asyncio.sleep(min(2 ** attempt, 30))
@@ -0,0 +1,140 @@
+"""Content-addressed cache of Command results.
+
+A result is keyed on the command string, the task's RunnerId, the shell
+running it, the values of the environment variables the command lists in
+``cache_env`` and a hash of the checked out files. Only commands with
+``cacheable`` set are ever looked up or stored, so non-deterministic
+commands keep running. Commands with ``include_in_env`` store their whole
+output, since it is exported again when restored.
+Entries live in a local directory that is trimmed to max_bytes by evicting
+the least recently used entries.
+"""
+import hashlib
+import json
+import os
+import stat
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class TreeHasher:
+    """Hashes a directory tree, re-reading only files whose stat changed."""
+
+    def __init__(self, ignore=('.git',)):
+        self.ignore = frozenset(ignore)
+        self._files = {}
+
+    def digest(self, root):
+        digest = hashlib.sha256()
+        seen = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(x for x in dirnames if x not in self.ignore)
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                relpath = os.path.relpath(path, root)
+                seen[path] = file_digest = self._file_digest(path)
+                digest.update(relpath.encode() + b'\0' + file_digest)
+        self._files = {
+            path: self._files[path] for path in seen if path in self._files}
+        return digest.hexdigest()
+
+    def _file_digest(self, path):
+        info = os.lstat(path)
+        signature = (info.st_size, info.st_mtime_ns, info.st_ino, info.st_mode)
+        cached = self._files.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        if stat.S_ISLNK(info.st_mode):
+            file_digest = b'link:' + os.readlink(path).encode()
+        else:
+            file_hash = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    file_hash.update(chunk)
+            file_digest = file_hash.digest()
+        # Executable bit changes what a script does
+        file_digest += b'x' if info.st_mode & stat.S_IXUSR else b'-'
+        self._files[path] = (signature, file_digest)
+        return file_digest
+
+
+class ResultCache:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._tree = TreeHasher()
+        os.makedirs(root, exist_ok=True)
+        self._size = sum(info.st_size for _, info in self._entries())
+
+    def key(self, command, runner_id, env, cwd, files=None, shell=None):
+        runner_id = getattr(runner_id, 'value', runner_id)
+        material = json.dumps({
+            'command': command.command,
+            'files': files,
+            'runner_id': runner_id,
+            'shell': shell,
+            'env': {x: env.get(x) for x in sorted(command.cache_env or ())},
+            'tree': self._tree.digest(cwd or os.getcwd()),
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # mtime doubles as the last-use time for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return result
+
+    def put(self, key, exit_code, output):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({'exit_code': exit_code, 'output': output}).encode()
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until under 90% of max_bytes."""
+        entries = sorted(self._entries(), key=lambda x: x[1].st_mtime_ns)
+        size = sum(info.st_size for _, info in entries)
+        target = self.max_bytes * 9 // 10
+        for path, info in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= info.st_size
+        self._size = size
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    yield path, os.stat(path)
+                except OSError:
+                    continue
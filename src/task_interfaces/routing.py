@@ -0,0 +1,251 @@
+"""Field-selective extraction of routing data from raw webhook payloads.
+
+Routing only needs a handful of fields (action, repository id, pull
+request author, head branch and title, requested action identifier).
+A payload already in memory is parsed with json.loads, which beats any
+walk over it written in Python. A payload read from a stream is not
+parsed whole: extract_routing() walks it a chunk at a time and only
+descends into the objects on the path to those fields. Everything else
+is skipped with the C JSON scanner, and reading stops as soon as every
+field for the event has been found, so the tail of a streamed payload is
+never read or decoded.
+"""
+import codecs
+import json
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+CHUNK_SIZE = 16 * 1024
+
+# Fields extracted per X-GitHub-Event, as paths into the payload
+FIELDS = {
+    'pull_request': {
+        'action': ('action',),
+        'repository_id': ('repository', 'id'),
+        'author': ('pull_request', 'user', 'login'),
+        'head_branch': ('pull_request', 'head', 'ref'),
+        'title': ('pull_request', 'title'),
+    },
+    'check_run': {
+        'action': ('action',),
+        'repository_id': ('repository', 'id'),
+        'head_branch': ('check_run', 'check_suite', 'head_branch'),
+        'requested_action': ('requested_action', 'identifier'),
+    },
+    'push': {
+        'ref': ('ref',),
+        'repository_id': ('repository', 'id'),
+    },
+}
+DEFAULT_FIELDS = {
+    'action': ('action',),
+    'repository_id': ('repository', 'id'),
+}
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# An object key and its colon, matched in one step
+_KEY = re.compile(r'[ \t\n\r]*"([^"\\]*(?:\\.[^"\\]*)*)"[ \t\n\r]*:[ \t\n\r]*')
+_SEPARATOR = re.compile(r'[ \t\n\r]*([,}])')
+_DECODER = json.JSONDecoder()
+_scanstring = json.decoder.scanstring
+
+
+@dataclass(frozen=True)
+class RoutingRecord:
+    event: str
+    action: Optional[str] = None
+    repository_id: Optional[int] = None
+    author: Optional[str] = None
+    head_branch: Optional[str] = None
+    title: Optional[str] = None
+    requested_action: Optional[str] = None
+    ref: Optional[str] = None
+
+    @property
+    def event_name(self):
+        """Name tasks subscribe to, e.g. ``pull_request.synchronize``."""
+        if self.action is None:
+            return self.event
+        return f'{self.event}.{self.action}'
+
+
+def extract_routing(event, source, chunk_size=CHUNK_SIZE):
+    """Build a RoutingRecord from a raw payload (bytes or a binary file)."""
+    fields = FIELDS.get(event, DEFAULT_FIELDS)
+    if isinstance(source, (bytes, bytearray, memoryview, str)):
+        if isinstance(source, memoryview):
+            source = source.tobytes()
+        values = _pick(json.loads(source), fields)
+    else:
+        values = _Scanner(_Reader(source, chunk_size), fields).scan()
+    return RoutingRecord(event=event, **values)
+
+
+def _pick(payload, fields):
+    if not isinstance(payload, dict):
+        raise ValueError('Payload is not a JSON object')
+    values = {}
+    for name, path in fields.items():
+        value = payload
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            values[name] = value
+    return values
+
+
+def _trie(fields):
+    root = {}
+    for name, path in fields.items():
+        node = root
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = name
+    return root
+
+
+class _Done(Exception):
+    pass
+
+
+class _Reader:
+    def __init__(self, source, chunk_size):
+        self.pos = 0
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.eof = False
+        self._read = source.read
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def fill(self):
+        """Read another chunk, dropping what has been consumed already."""
+        if self.eof:
+            return False
+        # Reading at least as much as is buffered keeps a value that spans
+        # many chunks (a large body) from being re-scanned quadratically
+        chunk = self._read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not chunk:
+            self.eof = True
+            decoded = self._decoder.decode(b'', final=True)
+        else:
+            decoded = self._decoder.decode(chunk)
+        self.buf = self.buf[self.pos:] + decoded
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError('Unexpected end of payload')
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'Expected {char!r} at payload offset {self.pos}')
+        self.pos += 1
+
+    def match(self, pattern):
+        while True:
+            match = pattern.match(self.buf, self.pos)
+            if match is not None and (
+                    match.end() < len(self.buf) or self.eof):
+                self.pos = match.end()
+                return match
+            if not self.fill():
+                if match is not None:
+                    self.pos = match.end()
+                    return match
+                raise ValueError(
+                    f'Unexpected payload content at offset {self.pos}')
+
+    def key(self):
+        key = self.match(_KEY).group(1)
+        if '\\' in key:
+            key = json.loads(f'"{key}"')
+        return key
+
+    def skip(self):
+        """Consume a value that is not needed.
+
+        Strings, the bulk of large payloads (bodies, URLs), are stepped over
+        a buffer at a time, so a long one is never held in memory whole.
+        """
+        if self.peek() != '"':
+            self.value()
+            return
+
+        while True:
+            try:
+                self.pos = _scanstring(self.buf, self.pos + 1, True)[1]
+                return
+            except json.JSONDecodeError:
+                pass
+            # Unterminated so far: keep only a trailing run of backslashes
+            # (it may escape what comes next) behind a fresh opening quote
+            keep = len(self.buf)
+            while keep > self.pos + 1 and self.buf[keep - 1] == '\\':
+                keep -= 1
+            self.buf = '"' + self.buf[keep:]
+            self.pos = 0
+            if not self.fill():
+                raise ValueError('Unexpected end of payload')
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number or literal ending the buffer may continue in the
+            # next chunk
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+class _Scanner:
+    def __init__(self, reader, fields):
+        self.reader = reader
+        self.trie = _trie(fields)
+        self.remaining = len(fields)
+        self.values = {}
+
+    def scan(self):
+        try:
+            self._object(self.trie)
+        except _Done:
+            pass
+        return self.values
+
+    def _object(self, node):
+        reader = self.reader
+        reader.expect('{')
+        if reader.peek() == '}':
+            reader.pos += 1
+            return
+
+        while True:
+            child = node.get(reader.key())
+            if child is None:
+                reader.skip()
+            elif isinstance(child, str):
+                self.values[child] = reader.value()
+                self.remaining -= 1
+                if not self.remaining:
+                    raise _Done
+            elif reader.peek() == '{':
+                self._object(child)
+            else:
+                reader.skip()
+
+            if reader.match(_SEPARATOR).group(1) == '}':
+                return
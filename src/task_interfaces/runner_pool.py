@@ -0,0 +1,392 @@
+"""Pools of pre-started interpreter workers per RunnerId.
+
+Starting an interpreter and importing a task's dependencies is a large
+share of the latency of short Python task runs. RunnerPool keeps workers
+running per RunnerId, each with the preload modules already imported, and
+hands each run to an idle worker:
+
+- a run that finds an idle worker is a hit, one that has to start a worker
+  is a miss, and one that waits for a busy worker records its queue wait
+- a worker is retired after max_runs runs or once its RSS after a run
+  passes max_rss, and replaced in the background
+- the number of workers kept per runner follows demand, the highest number
+  of concurrent runs seen in the last demand_window seconds, between
+  min_size and max_size
+
+Workers speak JSON lines over stdin and stdout. A job names a Python file
+and a function in it, which is called with the job's args and kwargs; the
+function's return value (it must be JSON serializable) and anything it
+printed come back in a RunResult. The file is loaded afresh for each run so
+runs do not share module state, while imported dependencies stay warm.
+"""
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from .task_v2 import RunnerId
+from .tracing import NULL_TRACER
+
+DEFAULT_MAX_RUNS = 100
+DEFAULT_MAX_RSS = 512 * 1024 * 1024
+DEFAULT_DEMAND_WINDOW = 60.0
+
+WORKER_SOURCE = r'''
+import contextlib, importlib, importlib.util, io, json, os, resource, sys
+import traceback
+
+for name in json.loads(sys.argv[1]):
+    importlib.import_module(name)
+
+
+def rss():
+    # ru_maxrss is inherited from the parent, so read the current size
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# The protocol gets its own copy of stdout, fd 1 goes to stderr so output
+# written below Python's sys.stdout cannot corrupt it
+channel = os.fdopen(os.dup(1), 'w')
+os.dup2(2, 1)
+channel.write(json.dumps({'ready': True}) + '\n')
+channel.flush()
+
+for line in sys.stdin:
+    job = json.loads(line)
+    output = io.StringIO()
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    response = {'id': job['id']}
+    try:
+        os.environ.update(job.get('env') or {})
+        if job.get('cwd'):
+            os.chdir(job['cwd'])
+        spec = importlib.util.spec_from_file_location(
+            f"githaxs_job_{job['id']}", job['path'])
+        module = importlib.util.module_from_spec(spec)
+        with contextlib.redirect_stdout(output), \
+                contextlib.redirect_stderr(output):
+            spec.loader.exec_module(module)
+            result = getattr(module, job.get('function') or 'run')(
+                *job.get('args', ()), **job.get('kwargs', {}))
+        response.update(ok=True, result=result)
+    except BaseException:
+        response.update(ok=False, error=traceback.format_exc())
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+    response['output'] = output.getvalue()
+    response['rss'] = rss()
+    try:
+        data = json.dumps(response)
+    except (TypeError, ValueError) as e:
+        data = json.dumps({
+            'id': job['id'], 'ok': False, 'output': response['output'],
+            'rss': response['rss'], 'error': f'Result is not JSON: {e}'})
+    channel.write(data + '\n')
+    channel.flush()
+'''
+
+
+@dataclass
+class RunResult:
+    ok: bool
+    result: Any = None
+    output: str = ''
+    error: Optional[str] = None
+    # Time spent waiting for a worker and running the job
+    queue_wait: float = 0.0
+    duration: float = 0.0
+    # Whether an idle worker was ready when the run was submitted
+    hit: bool = False
+
+
+@dataclass
+class PoolMetrics:
+    hits: int = 0
+    misses: int = 0
+    # Runs that waited for a busy worker
+    queued: int = 0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    started: int = 0
+    recycled: int = 0
+    crashed: int = 0
+    recent_waits: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+    @property
+    def hit_rate(self):
+        runs = self.hits + self.misses
+        return self.hits / runs if runs else 0.0
+
+    @property
+    def mean_queue_wait(self):
+        runs = self.hits + self.misses
+        return self.queue_wait_total / runs if runs else 0.0
+
+    def record_wait(self, wait):
+        self.queue_wait_total += wait
+        self.queue_wait_max = max(self.queue_wait_max, wait)
+        self.recent_waits.append(wait)
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+class _Worker:
+    def __init__(self, process):
+        self.process = process
+        self.runs = 0
+        self.rss = 0
+        self._ids = 0
+
+    @classmethod
+    async def start(cls, command, preload):
+        process = await asyncio.create_subprocess_exec(
+            *command, '-u', '-c', WORKER_SOURCE, json.dumps(list(preload)),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            # Results of large jobs come back on a single line
+            limit=64 * 1024 * 1024)
+        worker = cls(process)
+        if not json.loads(await worker._read_line()).get('ready'):
+            raise WorkerCrashed('Worker did not start')
+        return worker
+
+    @property
+    def alive(self):
+        return self.process.returncode is None
+
+    async def run(self, job):
+        self._ids += 1
+        job = dict(job, id=self._ids)
+        self.process.stdin.write(json.dumps(job).encode() + b'\n')
+        await self.process.stdin.drain()
+        response = json.loads(await self._read_line())
+        self.runs += 1
+        self.rss = response.get('rss', 0)
+        return response
+
+    async def stop(self):
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+
+    async def _read_line(self):
+        line = await self.process.stdout.readline()
+        if not line:
+            await self.process.wait()
+            raise WorkerCrashed(
+                f'Worker exited with {self.process.returncode}')
+        return line
+
+
+class _Pool:
+    def __init__(self, command):
+        self.command = command
+        self.idle = deque()
+        self.size = 0
+        self.in_flight = 0
+        self.waiters = deque()
+        self.metrics = PoolMetrics()
+        # (time, concurrent runs) samples for sizing
+        self.demand = deque()
+
+
+class RunnerPool:
+    def __init__(self, commands=None, preload=(), min_size=0, max_size=4,
+                 max_runs=DEFAULT_MAX_RUNS, max_rss=DEFAULT_MAX_RSS,
+                 demand_window=DEFAULT_DEMAND_WINDOW, clock=time.monotonic,
+                 tracer=None):
+        # Interpreter command per runner; only Python runners can host
+        # workers by default
+        self.commands = commands or {RunnerId.PYTHON_3_10: [sys.executable]}
+        self.preload = tuple(preload)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_runs = max_runs
+        self.max_rss = max_rss
+        self.demand_window = demand_window
+        self.clock = clock
+        # Emits a 'dispatch' span per run, covering the wait for a worker
+        self.tracer = tracer or NULL_TRACER
+        self._pools: Dict[Any, _Pool] = {}
+        self._tasks = set()
+        self._closed = False
+
+    def metrics(self, runner_id):
+        return self._pool(runner_id).metrics
+
+    def target_size(self, runner_id):
+        """Workers to keep for runner_id given its recent demand."""
+        return self._target(self._pool(runner_id))
+
+    async def prewarm(self, runner_id, size=None):
+        """Start workers until size (default target_size) are running."""
+        pool = self._pool(runner_id)
+        size = self.target_size(runner_id) if size is None else size
+        starts = [self._start_worker(pool)
+                  for _ in range(min(size, self.max_size) - pool.size)]
+        for worker in await asyncio.gather(*starts):
+            self._release(pool, worker, keep=True)
+
+    async def run(self, runner_id, path, function='run', args=(),
+                  kwargs=None, env=None, cwd=None, task=None):
+        pool = self._pool(runner_id)
+        submitted = self.clock()
+        pool.in_flight += 1
+        self._record_demand(pool)
+        try:
+            with self.tracer.span('dispatch', task, runner_id) as span:
+                worker, hit = await self._acquire(pool)
+                span.set(hit=hit)
+            queue_wait = self.clock() - submitted
+            pool.metrics.record_wait(queue_wait)
+            start = self.clock()
+            try:
+                response = await worker.run({
+                    'path': path, 'function': function, 'args': list(args),
+                    'kwargs': kwargs or {}, 'env': env or {}, 'cwd': cwd})
+            except BaseException:
+                pool.metrics.crashed += 1
+                # Runs queued behind this worker get a replacement
+                self._spawn(self._replace(pool, worker))
+                raise
+            self._recycle_or_release(pool, worker)
+        finally:
+            pool.in_flight -= 1
+
+        return RunResult(
+            ok=response['ok'], result=response.get('result'),
+            output=response.get('output', ''), error=response.get('error'),
+            queue_wait=queue_wait, duration=self.clock() - start, hit=hit)
+
+    async def close(self):
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        stops = []
+        for pool in self._pools.values():
+            while pool.idle:
+                stops.append(pool.idle.popleft().stop())
+            pool.size = 0
+        await asyncio.gather(*stops)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _pool(self, runner_id):
+        runner_id = RunnerId(getattr(runner_id, 'value', runner_id))
+        pool = self._pools.get(runner_id)
+        if pool is None:
+            if runner_id not in self.commands:
+                raise ValueError(f'No worker command for {runner_id.value}')
+            pool = self._pools[runner_id] = _Pool(self.commands[runner_id])
+        return pool
+
+    async def _acquire(self, pool):
+        while pool.idle:
+            worker = pool.idle.popleft()
+            if worker.alive:
+                pool.metrics.hits += 1
+                return worker, True
+            pool.size -= 1
+
+        pool.metrics.misses += 1
+        if pool.size < self.max_size:
+            return await self._start_worker(pool), False
+
+        pool.metrics.queued += 1
+        waiter = asyncio.get_running_loop().create_future()
+        pool.waiters.append(waiter)
+        return await waiter, False
+
+    async def _start_worker(self, pool):
+        pool.size += 1
+        try:
+            worker = await _Worker.start(pool.command, self.preload)
+        except BaseException:
+            pool.size -= 1
+            raise
+        pool.metrics.started += 1
+        return worker
+
+    def _recycle_or_release(self, pool, worker):
+        if worker.runs >= self.max_runs or worker.rss >= self.max_rss \
+                or not worker.alive:
+            pool.metrics.recycled += 1
+            self._spawn(self._replace(pool, worker))
+        else:
+            self._release(pool, worker)
+
+    def _release(self, pool, worker, keep=False):
+        if self._closed:
+            self._spawn(self._retire(pool, worker))
+            return
+        while pool.waiters:
+            waiter = pool.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(worker)
+                return
+        # Shrink towards the demand-based size when nobody is waiting
+        if not keep and pool.size > self._target(pool):
+            self._spawn(self._retire(pool, worker))
+        else:
+            pool.idle.append(worker)
+
+    async def _replace(self, pool, worker):
+        await self._retire(pool, worker)
+        if self._closed or not (
+                pool.waiters or pool.size < self._target(pool)):
+            return
+        try:
+            replacement = await self._start_worker(pool)
+        except Exception as e:
+            # Fail the oldest waiter rather than leave it waiting forever
+            while pool.waiters:
+                waiter = pool.waiters.popleft()
+                if not waiter.done():
+                    waiter.set_exception(e)
+                    break
+            return
+        self._release(pool, replacement)
+
+    async def _retire(self, pool, worker):
+        pool.size -= 1
+        await worker.stop()
+
+    def _target(self, pool):
+        self._trim_demand(pool)
+        peak = max((x for _, x in pool.demand), default=0)
+        return max(self.min_size, min(self.max_size, peak))
+
+    def _record_demand(self, pool):
+        pool.demand.append((self.clock(), pool.in_flight))
+        self._trim_demand(pool)
+
+    def _trim_demand(self, pool):
+        horizon = self.clock() - self.demand_window
+        while pool.demand and pool.demand[0][0] < horizon:
+            pool.demand.popleft()
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
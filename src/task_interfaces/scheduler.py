@@ -0,0 +1,200 @@
+"""Dependency-aware parallel scheduling of task_v2 Command lists.
+
+Commands start as soon as the commands they depend on (depends_on plus
+implicit include_in_env consumers, see task_v2.command_dependencies) have
+finished, up to max_concurrency at a time. The first failing check command
+fails the task fast: commands still running are cancelled and nothing else
+starts, except commands with run_on_fail, which start once each of their
+dependencies finished or was skipped. Commands whose dependencies were
+skipped are skipped too unless they have run_on_fail. Command slugs must
+be unique.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .executor import (
+    CommandExecutor, base_env, export_output, task_files_changed)
+from .output import OutputView
+from .task_v2 import command_dependencies
+
+
+@dataclass
+class ScheduleReport:
+    passed: bool
+    failed_command: Optional[str] = None
+    # Wall-clock time of the whole run and per command that ran
+    duration: float = 0.0
+    durations: Dict[str, float] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+    # Longest chain of dependent commands by duration
+    critical_path: List[str] = field(default_factory=list)
+    critical_path_duration: float = 0.0
+    # Full output of each command with include_output that ran
+    outputs: Dict[str, OutputView] = field(default_factory=dict)
+
+    def close(self):
+        for output in self.outputs.values():
+            output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DagScheduler:
+    def __init__(self, executor=None, max_concurrency=None):
+        self.executor = executor or CommandExecutor()
+        self.max_concurrency = max_concurrency
+
+    async def run_task(self, task, env=None, cwd=None, files_changed=None):
+        with self.executor.tracer.span('task', task) as span:
+            report = await self._run_task(task, env, cwd, files_changed)
+            span.set(passed=report.passed,
+                     failed_command=report.failed_command,
+                     critical_path=report.critical_path)
+        return report
+
+    async def _run_task(self, task, env, cwd, files_changed):
+        start = time.monotonic()
+        env = base_env(env)
+        files_changed = task_files_changed(task, files_changed)
+        budget = self.executor.output_budget()
+        outputs = {}
+        commands = {x.slug: x for x in task.commands}
+        if len(commands) != len(task.commands):
+            raise ValueError(
+                f"Task '{task.slug}' repeats command slugs, run it with "
+                "CommandExecutor")
+        graph = command_dependencies(task.commands)
+        pending = dict(graph)
+        finished = set()
+        skipped = set()
+        running = {}
+        failed_command = None
+
+        while pending or running:
+            for slug, depends_on in list(pending.items()):
+                if not all(x in finished or x in skipped for x in depends_on):
+                    continue
+                command = commands[slug]
+                blocked = failed_command is not None or any(
+                    x in skipped for x in depends_on)
+                if blocked and not command.run_on_fail:
+                    del pending[slug]
+                    skipped.add(slug)
+                    continue
+                if self.max_concurrency is not None \
+                        and len(running) >= self.max_concurrency:
+                    break
+                del pending[slug]
+                # Each command sees the exports of everything finished so far
+                running[asyncio.ensure_future(self._run_command(
+                    task, command, dict(env), cwd, budget,
+                    files_changed))] = slug
+
+            if not running:
+                if pending and not self._can_progress(
+                        pending, finished, skipped):
+                    # Only reachable for unvalidated (constructed) tasks
+                    skipped.update(pending)
+                    break
+                continue
+
+            done = []
+            try:
+                finished_now, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED)
+                # Done futures leave running first, so that cancelling the
+                # rest after a failure cannot touch them
+                done = [(x, running.pop(x)) for x in finished_now]
+                for future, slug in done:
+                    outputs[slug] = future.result()
+                    finished.add(slug)
+                    command = commands[slug]
+                    export_output(command, env, outputs[slug])
+                    if not command.include_output:
+                        outputs.pop(slug).close()
+                    if command.check and command.exit_code != 0 \
+                            and failed_command is None:
+                        failed_command = slug
+                        skipped.update(await self._cancel(running, commands))
+            except BaseException:
+                # Nothing may keep running once the task failed to run
+                await self._abort(running, done, outputs)
+                raise
+
+        durations = {
+            slug: commands[slug].duration for slug in commands
+            if slug in finished}
+        path, path_duration = critical_path(graph, durations)
+        return ScheduleReport(
+            passed=failed_command is None,
+            failed_command=failed_command,
+            duration=time.monotonic() - start,
+            durations=durations,
+            skipped=[x for x in commands if x in skipped],
+            critical_path=path,
+            critical_path_duration=path_duration,
+            outputs=outputs,
+        )
+
+    async def _run_command(self, task, command, env, cwd, budget,
+                           files_changed):
+        with self.executor.tracer.span('command', task,
+                                       command=command.slug) as span:
+            output = await self.executor.run_command(
+                command, env, cwd, budget, task.runner_id, files_changed)
+            span.set(exit_code=command.exit_code, skipped=command.skipped)
+        return output
+
+    def _can_progress(self, pending, finished, skipped):
+        return any(
+            all(x in finished or x in skipped for x in depends_on)
+            for depends_on in pending.values())
+
+    async def _cancel(self, running, commands):
+        cancelled = [
+            future for future, slug in running.items()
+            if not commands[slug].run_on_fail]
+        for future in cancelled:
+            future.cancel()
+        await asyncio.gather(*cancelled, return_exceptions=True)
+        return [running.pop(future) for future in cancelled]
+
+    async def _abort(self, running, done, outputs):
+        for future in running:
+            future.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        # Outputs of the finished commands, collected or not
+        for future, _ in done:
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+        for output in outputs.values():
+            output.close()
+
+
+def critical_path(graph, durations):
+    """Longest duration path through the commands that ran."""
+    longest = {}
+
+    def visit(slug):
+        if slug not in longest:
+            best = ([], 0.0)
+            for dependency in graph[slug]:
+                path, total = visit(dependency)
+                if total > best[1]:
+                    best = (path, total)
+            longest[slug] = (
+                best[0] + [slug], best[1] + durations.get(slug, 0.0))
+        return longest[slug]
+
+    best = ([], 0.0)
+    for slug in graph:
+        path, total = visit(slug)
+        if slug in durations and total > best[1]:
+            best = (path, total)
+    return [x for x in best[0] if x in durations], best[1]
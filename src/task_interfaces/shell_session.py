@@ -0,0 +1,143 @@
+"""A long-lived shell that runs the commands of one task run.
+
+Spawning a shell per command costs its startup for every step, and state
+has to be passed on by re-exporting it. ShellSession starts one ``bash
+--noprofile --norc`` per task run and feeds it each command over stdin, so
+variables, exports and the working directory carry over natively.
+
+Each command is framed so its output and exit code can still be told
+apart: the command text is sent in a quoted here-document and run with
+``eval`` (a syntax error fails that command instead of swallowing the
+rest of the input), with stdin from /dev/null and stderr merged into
+stdout, followed by a marker line carrying a random per-session token and
+the exit status. A command that exits the shell is reported with its exit
+code; an EXIT trap saves the exported environment and working directory
+first and the next command starts a new shell from them.
+"""
+import asyncio
+import os
+import shlex
+import tempfile
+import uuid
+
+from .executor import READ_SIZE, kill_process_group
+
+DEFAULT_SHELL = 'bash'
+
+
+class ShellSession:
+    def __init__(self, env=None, cwd=None, shell=None):
+        self.env = env
+        self.cwd = cwd
+        self.shell = shell or DEFAULT_SHELL
+        self.started = 0
+        self._token = uuid.uuid4().hex
+        self._marker = self._token.encode()
+        self._state_dir = None
+        self._process = None
+        self._pending = b''
+
+    async def run(self, command, buffer):
+        """Run command in the session, streaming its output into buffer."""
+        if self._process is None:
+            await self._start()
+
+        delimiter = f'GITHAXS_{self._token}'
+        script = (
+            f"IFS= read -r -d '' __githaxs_command <<'{delimiter}'\n"
+            f'{command}\n'
+            f'{delimiter}\n'
+            '{ eval "$__githaxs_command"; } </dev/null 2>&1\n'
+            f"printf '{self._token} %d\\n' \"$?\"\n")
+        try:
+            self._process.stdin.write(script.encode())
+            await self._process.stdin.drain()
+            return await self._read_result(buffer)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def export(self, name, value):
+        """Set an exported variable for the rest of the session."""
+        if self._process is None:
+            await self._start()
+        self._process.stdin.write(
+            f'export {name}={shlex.quote(value)}\n'.encode())
+        await self._process.stdin.drain()
+
+    async def close(self):
+        process, self._process = self._process, None
+        if process is not None and process.returncode is None:
+            kill_process_group(process)
+            await process.wait()
+        if self._state_dir is not None:
+            self._state_dir.cleanup()
+            self._state_dir = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _start(self):
+        if self._state_dir is None:
+            self._state_dir = tempfile.TemporaryDirectory(
+                prefix='githaxs-shell-')
+        state = os.path.join(self._state_dir.name, 'state.sh')
+        self._process = await asyncio.create_subprocess_exec(
+            self.shell, '--noprofile', '--norc',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=self.env,
+            cwd=self.cwd,
+            # Own process group so the session and everything it started
+            # can be killed together
+            start_new_session=True,
+        )
+        self.started += 1
+        self._pending = b''
+        # On exit, save what the next shell needs and report the status
+        # with a marker that tells the reader the shell is gone
+        init = (
+            f'__githaxs_state={shlex.quote(state)}\n'
+            "trap '__githaxs_status=$?; "
+            '{ export -p; printf "cd %q\\n" "$PWD"; } >"$__githaxs_state"; '
+            f"printf \"{self._token}!%d\\n\" \"$__githaxs_status\"' EXIT\n"
+            '[ -f "$__githaxs_state" ] && . "$__githaxs_state" 2>/dev/null\n')
+        self._process.stdin.write(init.encode())
+        await self._process.stdin.drain()
+
+    async def _read_result(self, buffer):
+        stdout = self._process.stdout
+        data = self._pending
+        self._pending = b''
+        # Bytes that may be the start of a marker split across reads
+        keep = len(self._marker) + 32
+        while True:
+            index = data.find(self._marker)
+            if index != -1:
+                newline = data.find(b'\n', index)
+                if newline != -1:
+                    break
+            elif len(data) > keep:
+                buffer.write(data[:-keep])
+                data = data[-keep:]
+
+            chunk = await stdout.read(READ_SIZE)
+            if not chunk:
+                # The shell died without reporting a status
+                buffer.write(data)
+                process, self._process = self._process, None
+                return await process.wait()
+            data += chunk
+
+        buffer.write(data[:index])
+        status = data[index + len(self._marker):newline]
+        self._pending = data[newline + 1:]
+        if status.startswith(b'!'):
+            # The command exited the shell, the next one starts a new one
+            process, self._process = self._process, None
+            await process.wait()
+        return int(status[1:])
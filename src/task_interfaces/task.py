@@ -1,5 +1,6 @@
+import json
 from enum import Enum
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, PrivateAttr, validator
 from typing import Annotated, List, Any, Optional, Union, Literal
 from os.path import exists
 from enum import Enum
@@ -144,73 +145,106 @@ class Task(BaseModel):
     subscribed_events: Optional[List[str]] = []
     extra_sam_resources: Optional[List[str]] = [] # Deprecated in V2
 
+    _capability_table: dict = PrivateAttr(default_factory=dict)
+    _capability_source: Any = PrivateAttr(None)
+    _manifest: dict = PrivateAttr(None)
+    _manifest_bytes: bytes = PrivateAttr(None)
+
     @validator("slug", always=True)
     def create_slug(cls, v, values, **kwargs):
+        # name failed validation, its own error is reported instead
+        if 'name' not in values:
+            return v
         return values['name'].lower().replace(' ', '-')
 
-    def __check_for_capability(self, capability):
-        if self.capabilities is None:
-            return False
-
-        return any([isinstance(x, capability) for x in self.capabilities])
-
-    def __get_capability(self, capability):
-        return next(
-            (x for x in self.capabilities if isinstance(
-                x, capability)), None)
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.__capability_table()
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.__fields__:
+            self._forget_manifest()
+
+    def copy(self, **kwargs):
+        task = super().copy(**kwargs)
+        task._forget_manifest()
+        return task
+
+    def __capability_table(self):
+        # Capabilities are resolved into a dict keyed by their discriminator
+        # once, then every accessor is a single lookup. The table remembers
+        # which list it was built from so reassigning capabilities (or
+        # copy(update=...)) rebuilds it.
+        if self._capability_source is not self.capabilities:
+            table = {}
+            for capability in self.capabilities or ():
+                table.setdefault(capability.type, capability)
+            self._capability_table = table
+            self._capability_source = self.capabilities
+        return self._capability_table
+
+    def __check_for_capability(self, capability_type):
+        return capability_type in self.__capability_table()
+
+    def __get_capability(self, capability_type):
+        return self.__capability_table().get(capability_type)
 
     def has_check_run_capability(self):
-        return self.__check_for_capability(CheckRunCapability)
+        return self.__check_for_capability('checkrun')
 
     def has_main_branch_capability(self):
-        return self.__check_for_capability(MainBranchAnalysisCapability)
+        return self.__check_for_capability('main-branch-analysis')
 
     def has_githaxs_worker_capability(self):
-        return self.__check_for_capability(GithaxsWorker)
+        return self.__check_for_capability('githaxs-worker')
 
     def has_task_orchestrator_capability(self):
-        return self.__check_for_capability(TaskOrchestratorCapability)
+        return self.__check_for_capability('task-orchestrator')
 
     def has_aws_iam_assume_role_capability(self):
-        return self.__check_for_capability(AssumeIAMRoleCapability)
+        return self.__check_for_capability('aws-assume-iam-role')
 
     def has_inject_ssm_parameters_capability(self):
-        if not self.has_aws_iam_assume_role_capability():
+        capability = self.__get_capability('aws-assume-iam-role')
+        if capability is None:
             return False
-        capability = self.__get_capability(AssumeIAMRoleCapability)
 
         return capability.inject_ssm_parameters
 
     def has_docker_build_capability(self):
-        return self.__check_for_capability(DockerBuildCapability)
+        return self.__check_for_capability('docker-build')
 
     def allows_for_hotfixes(self):
-        if not self.__check_for_capability(CheckRunCapability):
+        capability = self.__get_capability('checkrun')
+        if capability is None:
             return False
-        capability = self.__get_capability(CheckRunCapability)
 
         return capability.allow_hotfix
 
     def get_checkout_depth(self):
-        capability = self.__get_capability(CheckoutCapability)
+        capability = self.__get_capability('checkout')
+        if capability is None:
+            return None
+
         return capability.depth
 
     def ignored_authors(self):
-        if not self.__check_for_capability(CheckRunCapability):
+        capability = self.__get_capability('checkrun')
+        if capability is None or capability.ignored_authors is None:
             return []
-        capability = self.__get_capability(CheckRunCapability)
 
         return capability.ignored_authors
 
     def get_check_run_actions(self):
-        if not self.has_check_run_capability():
+        capability = self.__get_capability('checkrun')
+        if capability is None:
             return None
 
-        capability = self.__get_capability(CheckRunCapability)
-        actions = capability.actions
-        if actions is None:
+        if capability.actions is None:
             return None
 
+        actions = list(capability.actions)
         if capability.fix_errors is True:
             actions.append(Action(
                 label='Fix',
@@ -231,19 +265,17 @@ class Task(BaseModel):
         return [x.dict() for x in actions]
 
     def has_custom_check_run_capability(self):
-        if not self.__check_for_capability(CheckRunCapability):
+        capability = self.__get_capability('checkrun')
+        if capability is None:
             return False
-        capability = self.__get_capability(CheckRunCapability)
+
         return capability.custom
 
     def has_inject_settings_capability(self):
-        return self.__check_for_capability(InjectSettingsCapability)
+        return self.__check_for_capability('inject-settings')
 
     def has_checkout_capability(self):
-        return self.__check_for_capability(CheckoutCapability)
-
-    def has_main_branch_capability(self):
-        return self.__check_for_capability(MainBranchAnalysisCapability)
+        return self.__check_for_capability('checkout')
 
     def validate(self):
         if self.runtime == 'bash':
@@ -262,10 +294,9 @@ class Task(BaseModel):
             exit(1)
 
     def get_parameters(self):
-        if self.parameters is None:
-            self.parameters = []
-        if self.__check_for_capability(AssumeIAMRoleCapability):
-            self.parameters.append(
+        parameters = list(self.parameters or [])
+        if self.has_aws_iam_assume_role_capability():
+            parameters.append(
                 Parameter(
                     name='iam_role_arn',
                     description='AWS IAM role ARN to assume',
@@ -276,26 +307,31 @@ class Task(BaseModel):
             )
 
         if self.has_inject_ssm_parameters_capability():
-            self.parameters.append(
+            parameters.append(
                 Parameter(
                     name='ssm_prefix',
                     description='Prefix path of SSM parameters to inject into environment (i.e. /prod/',
                     default=None,
                     type='string',
                     required=True))
-        return [x.dict() for x in self.parameters]
+        return [x.dict() for x in parameters]
 
     def get_subscribed_events(self):
-        events = self.subscribed_events
-        if self.has_check_run_capability():
+        events = list(self.subscribed_events or [])
+        check_run = self.__get_capability('checkrun')
+        if check_run is not None:
             events += [
                 'pull_request.opened',
                 'pull_request.reopened',
                 'pull_request.synchronize',
                 'check_run.rerequested',
             ]
-        if self.get_check_run_actions() is not None:
-            events += ['check_run.requested_action']
+            # Same condition as get_check_run_actions() returning actions,
+            # without building them
+            if check_run.actions is not None and (
+                    check_run.actions or check_run.fix_errors is True
+                    or check_run.allow_hotfix is True):
+                events += ['check_run.requested_action']
 
         if self.has_main_branch_capability():
             events += ['push']
@@ -306,6 +342,30 @@ class Task(BaseModel):
         return events
 
     def to_json(self):
+        # A new dict on every call, but its values are shared with the
+        # cached manifest and must not be changed in place
+        return dict(self._cached_manifest())
+
+    def to_json_bytes(self):
+        if self._manifest_bytes is None:
+            self._manifest_bytes = json.dumps(
+                self._cached_manifest(), separators=(',', ':')).encode()
+        return self._manifest_bytes
+
+    def _cached_manifest(self):
+        # The manifest only depends on the model's fields, so it is built
+        # once and reused until a field of the task is assigned. Nested
+        # models, lists and dicts changed in place are not noticed: replace
+        # them instead (task.capabilities = [...]).
+        if self._manifest is None:
+            self._manifest = self._build_manifest()
+        return self._manifest
+
+    def _forget_manifest(self):
+        self._manifest = None
+        self._manifest_bytes = None
+
+    def _build_manifest(self):
         return {
             'name': self.name,
             'slug': self.slug,
@@ -1,5 +1,7 @@
+import json
+import re
 from enum import Enum
-from pydantic import BaseModel, Field, validator, Extra
+from pydantic import BaseModel, Field, PrivateAttr, validator, Extra
 from typing import List, Any, Optional
 from enum import Enum
 
@@ -58,7 +60,9 @@ class CheckRun(BaseModel):
 
     @validator("actions", always=True)
     def _validate_actions(cls, v, values, **kwargs):
-        if values['fix_errors'] is True:
+        # Re-validating a dumped task must not add the generated actions twice
+        identifiers = {x.identifier for x in v}
+        if values.get('fix_errors') is True and 'fix' not in identifiers:
             v.append(
                 Action(
                     label='Fix',
@@ -67,7 +71,7 @@ class CheckRun(BaseModel):
                 )
             )
 
-        if values['allow_hotfix'] is True:
+        if values.get('allow_hotfix') is True and 'hotfix' not in identifiers:
             v.append(
                 Action(
                     label='Hotfix',
@@ -114,11 +118,46 @@ class Command(BaseModel):
     # This value is used to determine if the output of the command should
     # update the env for future commands.
     include_in_env: Optional[str] = None
+    # Slugs of commands that must finish before this one starts. Commands
+    # that reference an include_in_env variable of an earlier command
+    # depend on it implicitly.
+    depends_on: Optional[List[str]] = []
+    # Reuse the result of a previous run on identical checked out files.
+    # Only set this for deterministic commands.
+    cacheable: Optional[bool] = False
+    # Environment variables that change the result of a cacheable command
+    cache_env: Optional[List[str]] = []
+    # Glob patterns (fnmatch, '*' also matches '/') of changed files this
+    # command accepts as arguments. When the task includes files changed,
+    # the matching files are appended to the command, split into batches
+    # that fit in a command line, and the command is skipped if none match.
+    file_patterns: Optional[List[str]] = None
+    skipped: bool = False
     completed: bool = False
     duration: Optional[float] = None
     exit_code: Optional[int]
     output: Optional[str] = None
 
+def command_dependencies(commands):
+    """Map each command slug to the slugs it has to wait for."""
+    return dict(_dependencies(commands))
+
+
+def _dependencies(commands):
+    # (slug, slugs it has to wait for) of each command in order
+    producers = {}
+    for command in commands:
+        depends_on = list(command.depends_on or [])
+        for name, producer in producers.items():
+            pattern = r'\$(%s\b|\{%s\})' % (re.escape(name), re.escape(name))
+            if producer not in depends_on and re.search(
+                    pattern, command.command):
+                depends_on.append(producer)
+        yield command.slug, tuple(depends_on)
+        if command.include_in_env:
+            producers[command.include_in_env] = command.slug
+
+
 class Capabilities(BaseModel, extra=Extra.forbid):
     githaxs_worker: GithaxsWorker = Field(GithaxsWorker())
     task_settings: TaskSettings = Field(TaskSettings())
@@ -158,13 +197,60 @@ class Task(BaseModel):
 
     @validator("slug", always=True)
     def create_slug(cls, v, values, **kwargs):
+        # name failed validation, its own error is reported instead
+        if 'name' not in values:
+            return v
         return values['name'].lower().replace(' ', '-')
 
-    # TODO: fix this up
-    @validator("parameters")
-    def _validate_parameters(cls, v, values, **kwargs):
-        if values['capabilities'].assume_iam_role.enabled:
-            v.parameters.append(
+    @validator("commands")
+    def _validate_commands(cls, v, values, **kwargs):
+        dependencies = list(_dependencies(v))
+        graph = dict(dependencies)
+        # Repeated slugs are only ambiguous once commands depend on each
+        # other, configs without dependencies keep validating
+        assert len(graph) == len(v) or not any(
+            depends_on for _, depends_on in dependencies), \
+            'command slugs must be unique when commands depend on each other'
+        for slug, depends_on in graph.items():
+            for dependency in depends_on:
+                assert dependency in graph, \
+                    f"command '{slug}' depends on unknown command '{dependency}'"
+
+        # Depth-first search for a cycle through explicit dependencies
+        state = {}
+
+        def visit(slug):
+            state[slug] = 'visiting'
+            for dependency in graph[slug]:
+                assert state.get(dependency) != 'visiting', \
+                    f"dependency cycle through command '{dependency}'"
+                if dependency not in state:
+                    visit(dependency)
+            state[slug] = 'done'
+
+        for slug in graph:
+            if slug not in state:
+                visit(slug)
+        return v
+
+    _manifest: dict = PrivateAttr(None)
+    _manifest_bytes: bytes = PrivateAttr(None)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.__fields__:
+            self._forget_manifest()
+
+    def copy(self, **kwargs):
+        task = super().copy(**kwargs)
+        task._forget_manifest()
+        return task
+
+    def get_parameters(self):
+        parameters = list(self.parameters or [])
+        assume_iam_role = self.capabilities.assume_iam_role
+        if assume_iam_role.enabled:
+            parameters.append(
                 Parameter(
                     name='iam_role_arn',
                     description='AWS IAM role ARN to assume',
@@ -174,18 +260,18 @@ class Task(BaseModel):
                 )
             )
 
-            if values['capabilities'].assume_iam_role.inject_ssm_parameters:
-                v.parameters.append(
+            if assume_iam_role.inject_ssm_parameters:
+                parameters.append(
                     Parameter(
                         name='ssm_prefix',
                         description='Prefix path of SSM parameters to inject into environment (i.e. /prod/',
                         default=None,
                         type='string',
                         required=True))
-        return v
+        return [x.dict() for x in parameters]
 
     def get_subscribed_events(self):
-        events = self.subscribed_events
+        events = list(self.subscribed_events or [])
         if self.capabilities.check_run.enabled:
             events += [
                 'pull_request.opened',
@@ -205,19 +291,40 @@ class Task(BaseModel):
         return events
 
     def to_json(self):
+        # A new dict on every call, but its values are shared with the
+        # cached manifest and must not be changed in place
+        return dict(self._cached_manifest())
+
+    def to_json_bytes(self):
+        if self._manifest_bytes is None:
+            self._manifest_bytes = json.dumps(
+                self._cached_manifest(), separators=(',', ':')).encode()
+        return self._manifest_bytes
+
+    def _cached_manifest(self):
+        # Built once and reused until a field of the task is assigned, see
+        # task.Task._cached_manifest
+        if self._manifest is None:
+            self._manifest = self._build_manifest()
+        return self._manifest
+
+    def _forget_manifest(self):
+        self._manifest = None
+        self._manifest_bytes = None
+
+    def _build_manifest(self):
         return {
+            'version': self.version,
             'name': self.name,
             'slug': self.slug,
             'summary': self.summary,
             'description': self.description,
-            'memory': self.memory,
-            'timeout': self.timeout,
-            'storage': self.storage,
             'subscription_level': self.subscription_level,
             'parameters': self.get_parameters(),
             'show': self.show,
             'tags': self.tags,
-            'capabilities': self.capabilities,
+            'runner_id': self.runner_id.value,
+            'capabilities': self.capabilities.dict(),
             'subscribed_events': self.get_subscribed_events(),
-            'default_configuration': self.default_configuration.dict(),
+            'default_configuration': self.default_configuration.dict() if self.default_configuration is not None else None,
         }
@@ -0,0 +1,241 @@
+"""Span based instrumentation of the task lifecycle.
+
+Components that take a ``tracer`` (CommandExecutor, DagScheduler,
+CheckoutManager, EnvironmentCache, CredentialCache, RunnerPool) wrap their
+stages in spans:
+
+    dispatch     waiting for and handing a run to a runner worker
+    checkout     creating the task's working copy
+    env_prep     building or finding the dependency environment
+    credentials  assuming the task's role and reading SSM parameters
+    task         a whole task run
+    command      each Command
+    report       reporting results to the check run
+
+A Tracer sends every finished Span to its sinks. HistogramSink aggregates
+durations per span name by task slug and by runner to find p50/p99
+outliers; JsonLinesSink writes one JSON object per span. NULL_TRACER, the
+default everywhere, hands out a shared no-op span so disabled tracing
+costs a method call per stage.
+"""
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
+
+# Histogram buckets grow by 2**(1/8) (about 9%) from 1 microsecond
+_BUCKET_BASE = 1e-6
+_BUCKET_GROWTH = 2 ** (1 / 8)
+_LOG_GROWTH = math.log(_BUCKET_GROWTH)
+
+
+def task_labels(task):
+    """(slug, runner) of a V1 or V2 task; V1 tasks report their runtime."""
+    if task is None:
+        return None, None
+    runner_id = getattr(task, 'runner_id', None)
+    if runner_id is None:
+        runner_id = getattr(task, 'runtime', None)
+    return task.slug, getattr(runner_id, 'value', runner_id)
+
+
+@dataclass
+class Span:
+    name: str
+    task: Optional[str] = None
+    runner_id: Optional[str] = None
+    # Unix time the span started, and its duration in seconds
+    start: float = 0.0
+    duration: float = 0.0
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class _ActiveSpan:
+    __slots__ = ('tracer', 'span', '_start')
+
+    def __init__(self, tracer, span):
+        self.tracer = tracer
+        self.span = span
+
+    def set(self, **attributes):
+        self.span.attributes.update(attributes)
+
+    def __enter__(self):
+        self.span.start = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.span.error = exc_type.__name__
+        self.tracer.emit(self.span)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    enabled = True
+
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+
+    def span(self, name, task=None, runner_id=None, **attributes):
+        """Context manager timing a stage of task (a V1 or V2 Task)."""
+        slug, task_runner_id = task_labels(task)
+        runner_id = getattr(runner_id, 'value', runner_id) or task_runner_id
+        return _ActiveSpan(self, Span(
+            name, slug, runner_id, attributes=attributes))
+
+    def emit(self, span):
+        for sink in self.sinks:
+            sink.record(span)
+
+
+class NullTracer:
+    enabled = False
+
+    def span(self, name, task=None, runner_id=None, **attributes):
+        return _NULL_SPAN
+
+    def emit(self, span):
+        pass
+
+
+NULL_TRACER = NullTracer()
+
+
+class Histogram:
+    """Log-bucketed distribution of durations, about 9% resolution."""
+
+    def __init__(self):
+        self.buckets = defaultdict(int)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        index = 0 if value <= _BUCKET_BASE else math.ceil(
+            math.log(value / _BUCKET_BASE) / _LOG_GROWTH)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q quantile (0 < q <= 1)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(_BUCKET_BASE * _BUCKET_GROWTH ** index, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class HistogramSink:
+    """Aggregates span durations by name, per task slug and per runner."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = defaultdict(Histogram)
+
+    def record(self, span):
+        with self._lock:
+            self.histograms[(span.name, 'all', None)].add(span.duration)
+            if span.task is not None:
+                self.histograms[(span.name, 'task', span.task)].add(
+                    span.duration)
+            if span.runner_id is not None:
+                self.histograms[(span.name, 'runner', span.runner_id)].add(
+                    span.duration)
+
+    def histogram(self, name, task=None, runner_id=None):
+        if task is not None:
+            key = (name, 'task', task)
+        elif runner_id is not None:
+            key = (name, 'runner', runner_id)
+        else:
+            key = (name, 'all', None)
+        return self.histograms.get(key) or Histogram()
+
+    def percentile(self, name, q, task=None, runner_id=None):
+        return self.histogram(name, task, runner_id).percentile(q)
+
+    def outliers(self, name, by='task', q=0.99, top=10):
+        """(label, quantile, count) with the slowest q quantile first."""
+        with self._lock:
+            rows = [
+                (label, histogram.percentile(q), histogram.count)
+                for (span_name, kind, label), histogram
+                in self.histograms.items()
+                if span_name == name and kind == by]
+        return sorted(rows, key=lambda x: -x[1])[:top]
+
+    def summary(self, q=(0.5, 0.99)):
+        """{(name, kind, label): {'count', 'mean', 'p50', 'p99', 'max'}}."""
+        with self._lock:
+            return {
+                key: dict(
+                    count=x.count, mean=x.mean, max=x.max,
+                    **{f'p{round(p * 100)}': x.percentile(p) for p in q})
+                for key, x in self.histograms.items()}
+
+
+class JsonLinesSink:
+    """Writes each span as a line of JSON to a path or text file."""
+
+    def __init__(self, target):
+        self._lock = threading.Lock()
+        if isinstance(target, str):
+            self.file = open(target, 'a')
+            self._owned = True
+        else:
+            self.file = target
+            self._owned = False
+
+    def record(self, span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self.file.write(line + '\n')
+
+    def flush(self):
+        with self._lock:
+            self.file.flush()
+
+    def close(self):
+        if self._owned:
+            self.file.close()
+        else:
+            self.flush()
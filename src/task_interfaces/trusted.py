@@ -0,0 +1,137 @@
+"""Stamped task manifests that can be reloaded without validation.
+
+dumps() writes a one line header followed by the task's JSON. The header
+carries the schema the task was validated against and the sha256 of the
+JSON body. loads() rebuilds the model tree with construct(), skipping every
+validator, only when both still match. Anything else (no header, another
+schema, a modified body) goes through full validation.
+"""
+import gc
+import hashlib
+import json
+from enum import Enum
+from functools import lru_cache
+from inspect import isclass
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
+
+from . import task, task_v2
+from .loader import parse_task, schema_fingerprint
+
+# Bump when the stamp format itself changes
+STAMP_VERSION = 1
+MAGIC = b'#githaxs-task '
+
+
+def schema_version():
+    return f'{STAMP_VERSION}:{schema_fingerprint()}'
+
+
+def dumps(loaded):
+    """Serialize a validated task with an integrity stamp."""
+    body = loaded.json(by_alias=True).encode()
+    header = json.dumps({
+        'schema': schema_version(),
+        'version': getattr(loaded, 'version', 1),
+        'sha256': hashlib.sha256(body).hexdigest(),
+    }, separators=(',', ':')).encode()
+    return MAGIC + header + b'\n' + body
+
+
+def loads(data):
+    """Load a task from dumps() output, trusting it when the stamp matches.
+
+    Unstamped JSON task configs are accepted too and always validated.
+    """
+    if not data.startswith(MAGIC):
+        return parse_task(json.loads(data))
+
+    header, _, body = data[len(MAGIC):].partition(b'\n')
+    stamp = json.loads(header)
+    if stamp.get('schema') != schema_version() or \
+            stamp.get('sha256') != hashlib.sha256(body).hexdigest():
+        return parse_task(json.loads(body))
+
+    model = task_v2.Task if stamp.get('version') == 2 else task.Task
+    return construct(model, json.loads(body))
+
+
+def loads_many(items):
+    """loads() over a whole catalog.
+
+    Building thousands of small models triggers repeated full garbage
+    collections that can cost as much as the construction itself, so the
+    collector is paused for the duration of the batch.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return [loads(x) for x in items]
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def construct(model, data):
+    """Recursively build a model from trusted data without validating it."""
+    plan, defaults = _plan(model)
+    values = {}
+    for name, alias, build in plan:
+        if alias in data:
+            value = data[alias]
+            values[name] = value if build is None or value is None \
+                else build(value)
+        else:
+            get_default, default = defaults[name]
+            values[name] = default if get_default is None else get_default()
+    obj = model.__new__(model)
+    object.__setattr__(obj, '__dict__', values)
+    object.__setattr__(obj, '__fields_set__', set(data).intersection(values))
+    obj._init_private_attributes()
+    return obj
+
+
+@lru_cache(maxsize=None)
+def _plan(model):
+    # Resolving how to build each field is done once per model class so that
+    # construct() only dispatches on fields that hold models or enums.
+    plan = []
+    defaults = {}
+    for name, field in model.__fields__.items():
+        plan.append((name, field.alias, _builder(field)))
+        # Immutable defaults are shared, anything else is copied per object
+        if isinstance(field.default, (str, int, float, bool, type(None))):
+            defaults[name] = (None, field.default)
+        else:
+            defaults[name] = (field.get_default, None)
+    return tuple(plan), defaults
+
+
+def _builder(field):
+    if field.shape == SHAPE_LIST:
+        build = _item_builder(field.sub_fields[0])
+        if build is None:
+            return None
+        return lambda value: [None if x is None else build(x) for x in value]
+    if field.shape == SHAPE_SINGLETON:
+        return _item_builder(field)
+    return None
+
+
+def _item_builder(field):
+    if field.discriminator_key is not None:
+        key = field.discriminator_key
+        models = {
+            tag: sub_field.type_
+            for tag, sub_field in field.sub_fields_mapping.items()}
+        return lambda value: construct(models[value[key]], value)
+
+    type_ = field.type_
+    if not isclass(type_):
+        return None
+    if issubclass(type_, BaseModel):
+        return lambda value: construct(type_, value)
+    if issubclass(type_, Enum):
+        return type_
+    return None
@@ -0,0 +1,272 @@
+"""Incremental reloading of a task catalog while it is in use.
+
+CatalogWatcher loads a catalog once, then polls the task configs under
+its root. Each poll only stats files (and lists the tree for new ones);
+configs whose size or mtime changed are read, and only those whose
+content changed are validated, in a process pool when there are many
+(see loader.load_files). The changes are applied with
+TaskCatalog.with_changes, which reuses the events and eligibility keys of
+unchanged tasks instead of deriving them again. It still copies the
+catalog's per-task tables and rebuilds every route and posting set a
+changed task is in, so a reload stays linear in the size of the catalog;
+it is only much cheaper than building a new one (a one-task change to a
+catalog of 1,000 tasks takes about 1 ms, to one of 10,000 about 5 ms).
+
+Catalogs are immutable. A reload builds a new one and publishes it by
+assigning watcher.catalog, so readers are never blocked: a lookup that
+read the previous snapshot finishes on it. Take the reference once per
+request (``catalog = watcher.catalog``) to see one consistent snapshot.
+
+A config that fails to validate keeps the last good version of its task in
+the catalog and is reported; a deleted config removes its task. A config
+rejected because another config already defines its slug takes the slug
+over once that config gives it up. The watcher only records what it
+loaded once the new catalog is published, so an error while polling leaves
+the changed configs to be tried again; it is reported to the listeners and
+the watcher keeps polling. A listener that raises does not keep the others
+from being called.
+"""
+import hashlib
+import os
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field, replace
+from typing import Any, List
+
+from .catalog import TaskCatalog
+from .loader import CONFIG_FILENAME, LoadError, discover, load_files
+
+DEFAULT_INTERVAL = 1.0
+
+
+@dataclass
+class ReloadReport:
+    # Snapshot number of the catalog published by this reload
+    generation: int = 0
+    upserted: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    errors: List[LoadError] = field(default_factory=list)
+    # Configs found changed on disk, including touched but identical ones
+    checked: int = 0
+    duration: float = 0.0
+
+    @property
+    def changed(self):
+        return bool(self.upserted or self.removed)
+
+
+@dataclass
+class _Entry:
+    stat: tuple
+    digest: str
+    # Slug of the task last loaded from the file, None if it never loaded
+    slug: str = None
+    # Task rejected because another config owns its slug
+    rejected: Any = None
+
+
+class CatalogWatcher:
+    def __init__(self, root, catalog_type=TaskCatalog,
+                 filename=CONFIG_FILENAME, max_workers=None):
+        # catalog_type may be CompactCatalog to keep compacted snapshots
+        self.root = root
+        self.filename = filename
+        self.max_workers = max_workers
+        self.catalog_type = catalog_type
+        self.generation = 0
+        self.catalog = catalog_type()
+        self._entries = {}
+        self._slugs = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reload()
+
+    def subscribe(self, listener):
+        """Call listener(catalog, report) after each published reload.
+
+        Polls that fail are reported too, with a report holding the error.
+        """
+        self._listeners.append(listener)
+
+    def poll(self):
+        """Reload the configs changed since the last poll."""
+        changed = []
+        seen = set()
+        for path in discover(self.root, self.filename):
+            seen.add(path)
+            entry = self._entries.get(path)
+            try:
+                stat = _stat(path)
+            except OSError:
+                stat = None
+            if entry is None or stat is None or stat != entry.stat:
+                changed.append(path)
+        changed.extend(x for x in self._entries if x not in seen)
+        return self.reload(changed)
+
+    def reload(self, paths=None):
+        """Reload the given config paths, every config when None.
+
+        Paths that no longer exist remove their tasks. Returns a
+        ReloadReport; the new catalog is published before returning.
+        """
+        with self._lock:
+            return self._reload(paths)
+
+    def watch(self, interval=DEFAULT_INTERVAL):
+        """Poll every interval seconds until stop() is called."""
+        while not self._stop.wait(interval):
+            try:
+                self.poll()
+            except Exception:
+                # The next poll tries again, the current snapshot stays
+                report = ReloadReport(
+                    generation=self.generation,
+                    errors=[LoadError(self.root, traceback.format_exc())])
+                self._notify(report)
+
+    def start(self, interval=DEFAULT_INTERVAL):
+        """Watch in a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.watch, args=(interval,), daemon=True,
+            name='catalog-watcher')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _reload(self, paths):
+        start = time.perf_counter()
+        report = ReloadReport(generation=self.generation)
+        if paths is None:
+            paths = list(dict.fromkeys(
+                discover(self.root, self.filename) + list(self._entries)))
+
+        # Changes go to copies (entries are replaced, never changed in
+        # place), which are only kept once the new catalog is published
+        entries = dict(self._entries)
+        slugs = dict(self._slugs)
+        removals = []
+        pending = {}
+        for path in paths:
+            report.checked += 1
+            entry = entries.get(path)
+            try:
+                stat = _stat(path)
+                with open(path, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+            except FileNotFoundError:
+                if entry is not None:
+                    del entries[path]
+                    if entry.slug is not None:
+                        _forget(slugs, entry.slug, path, removals)
+                continue
+            except OSError as e:
+                report.errors.append(LoadError(path, str(e)))
+                continue
+
+            if entry is not None and entry.digest == digest:
+                # Touched without changing, nothing to validate
+                entries[path] = replace(entry, stat=stat)
+                continue
+            pending[path] = _Entry(stat, digest,
+                                   entry.slug if entry else None)
+
+        loaded = load_files(list(pending), max_workers=self.max_workers)
+        report.errors.extend(loaded.errors)
+        upserts = {}
+        for path, entry in pending.items():
+            task = loaded.tasks.get(path)
+            # A config that does not load keeps serving the last good
+            # version of its task and is looked at again once it changes
+            entries[path] = entry
+            if task is None:
+                continue
+            owner = slugs.get(task.slug)
+            if owner is not None and owner != path:
+                report.errors.append(LoadError(
+                    path, f"Duplicate task slug '{task.slug}' "
+                          f"(already defined in {owner})"))
+                entry.rejected = task
+                continue
+            _claim(slugs, path, entry, task, upserts, removals)
+
+        # Slugs given up in this reload go to configs rejected for them
+        offered = set()
+        while True:
+            slug = next((x for x in removals if x not in offered), None)
+            if slug is None:
+                break
+            offered.add(slug)
+            for path, entry in entries.items():
+                if entry.rejected is not None \
+                        and entry.rejected.slug == slug:
+                    entry = entries[path] = replace(entry)
+                    _claim(slugs, path, entry, entry.rejected, upserts,
+                           removals)
+                    break
+
+        report.upserted = list(upserts)
+        report.removed = removals
+        if report.changed:
+            if len(self.catalog):
+                catalog = self.catalog.with_changes(
+                    upserts=upserts.values(), removals=removals)
+            else:
+                # Indexing everything at once is cheaper than as changes
+                catalog = self.catalog_type(upserts.values())
+            self.generation += 1
+            report.generation = self.generation
+            # Publishing is a single reference assignment
+            self.catalog = catalog
+        self._entries = entries
+        self._slugs = slugs
+        report.duration = time.perf_counter() - start
+        if report.changed:
+            self._notify(report)
+        return report
+
+    def _notify(self, report):
+        catalog = self.catalog
+        for listener in self._listeners:
+            try:
+                listener(catalog, report)
+            except Exception:
+                # The reload is done, a broken listener only affects itself
+                traceback.print_exc()
+
+
+def _claim(slugs, path, entry, task, upserts, removals):
+    if entry.slug is not None and entry.slug != task.slug:
+        _forget(slugs, entry.slug, path, removals)
+    entry.slug = task.slug
+    entry.rejected = None
+    slugs[task.slug] = path
+    upserts[task.slug] = task
+    if task.slug in removals:
+        removals.remove(task.slug)
+
+
+def _forget(slugs, slug, path, removals):
+    if slugs.get(slug) == path:
+        del slugs[slug]
+        removals.append(slug)
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
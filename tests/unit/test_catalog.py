@@ -0,0 +1,120 @@
+from src.task_interfaces import EligibilityQuery, Task, TaskV2, TaskCatalog
+
+
+def make_task(name, capabilities=None, subscribed_events=None):
+    return Task(
+        name=name,
+        summary="",
+        description="",
+        capabilities=capabilities or [],
+        subscribed_events=subscribed_events or [],
+        runtime='python',
+    )
+
+
+def make_task_v2(name, capabilities=None):
+    return TaskV2(
+        name=name,
+        summary="",
+        description="",
+        capabilities=capabilities or {},
+        commands=[],
+        runner_id='python_3_10',
+    )
+
+
+def slugs(tasks):
+    return [x.slug for x in tasks]
+
+
+def test_routes_follow_capabilities():
+    catalog = TaskCatalog([
+        make_task("Lint", [{'type': 'checkrun'}]),
+        make_task("Scan", [{'type': 'main-branch-analysis'}]),
+        make_task_v2("Worker", {'githaxs_worker': {
+            'enabled': True, 'event_name': 'lint.worker'}}),
+    ])
+
+    assert slugs(catalog.tasks_for_event('pull_request.synchronize')) == [
+        'lint']
+    assert slugs(catalog.tasks_for_event('push')) == ['scan']
+    assert slugs(catalog.tasks_for_event('lint.worker')) == ['worker']
+    assert slugs(catalog.route('pull_request', 'opened')) == ['lint']
+    assert catalog.tasks_for_event('issues.opened') == ()
+
+
+def test_routing_does_not_grow_subscribed_events():
+    task = make_task("Lint", [{'type': 'checkrun'}], ['pull_request.opened'])
+    TaskCatalog([task])
+    TaskCatalog([task])
+
+    assert task.subscribed_events == ['pull_request.opened']
+
+
+def test_incremental_changes_leave_original_untouched():
+    lint = make_task("Lint", [{'type': 'checkrun'}])
+    scan = make_task("Scan", [{'type': 'checkrun'}])
+    catalog = TaskCatalog([lint, scan])
+
+    added = catalog.add(make_task("Push", [{'type': 'main-branch-analysis'}]))
+    removed = added.remove('lint')
+    replaced = added.replace(make_task("Lint", [{'type': 'githaxs-worker'}]))
+
+    assert slugs(catalog.tasks_for_event('push')) == []
+    assert slugs(added.tasks_for_event('push')) == ['push']
+    assert slugs(removed.tasks_for_event('pull_request.opened')) == ['scan']
+    assert slugs(replaced.tasks_for_event('pull_request.opened')) == ['scan']
+    assert slugs(replaced.tasks_for_event('githaxs.invoke_task')) == ['lint']
+    assert slugs(replaced) == ['lint', 'scan', 'push']
+    assert slugs(catalog) == ['lint', 'scan']
+
+
+def make_eligible_task(name, **fields):
+    return TaskV2(
+        name=name,
+        summary="",
+        description="",
+        commands=[],
+        runner_id='python_3_10',
+        **fields,
+    )
+
+
+def test_eligibility_queries():
+    catalog = TaskCatalog([
+        make_eligible_task("Free"),
+        make_eligible_task("Growth", subscription_level=2),
+        make_eligible_task("Go", installation={'repo_languages': ['Go']}),
+        make_eligible_task("Admin", show='admin'),
+        make_eligible_task("Private", has_public_repo=False),
+        make_eligible_task("Stable", beta=False),
+        make_eligible_task("Hidden", show='none'),
+    ])
+
+    free = EligibilityQuery(subscription_level=0, languages=['python'])
+    growth = EligibilityQuery(
+        subscription_level=2, languages=['Python', 'go'], role='admin')
+    public = EligibilityQuery(subscription_level=3, public=True)
+    stable = EligibilityQuery(subscription_level=3, include_beta=False)
+
+    assert slugs(catalog.eligible(free)) == ['free', 'private', 'stable']
+    assert slugs(catalog.eligible(growth)) == [
+        'free', 'growth', 'go', 'admin', 'private', 'stable']
+    assert slugs(catalog.eligible(public)) == ['free', 'growth', 'stable']
+    assert slugs(catalog.eligible(stable)) == ['stable']
+    assert catalog.eligible_many([free, public, free]) == [
+        catalog.eligible(free), catalog.eligible(public),
+        catalog.eligible(free)]
+
+
+def test_eligibility_follows_incremental_changes():
+    catalog = TaskCatalog([
+        make_eligible_task("A"),
+        make_eligible_task("B", subscription_level=3),
+    ])
+    query = EligibilityQuery(subscription_level=0)
+
+    updated = catalog.replace(make_eligible_task("B")).remove('a')
+
+    assert slugs(catalog.eligible(query)) == ['a']
+    assert slugs(updated.eligible(query)) == ['b']
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import subprocess
+
+import pytest
+
+from src.task_interfaces import CheckoutManager
+from src.task_interfaces.checkout import CheckoutError
+
+
+def git(*args, cwd=None):
+    return subprocess.run(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com',
+         *args], cwd=cwd, check=True, capture_output=True,
+        text=True).stdout.strip()
+
+
+def commit(work, name, content):
+    with open(os.path.join(work, name), 'w') as f:
+        f.write(content)
+    git('add', name, cwd=work)
+    git('commit', '-q', '-m', name, cwd=work)
+    git('push', '-q', 'origin', 'HEAD:main', cwd=work)
+    return git('rev-parse', 'HEAD', cwd=work)
+
+
+@pytest.fixture
+def remote(tmp_path):
+    url = str(tmp_path / 'remote.git')
+    git('init', '-q', '--bare', '-b', 'main', url)
+    work = str(tmp_path / 'work')
+    git('clone', '-q', url, work)
+    for i in range(3):
+        commit(work, f'file{i}.txt', str(i))
+    return url, work
+
+
+def count_commits(dest):
+    return int(git('rev-list', '--count', 'HEAD', cwd=dest))
+
+
+def test_checkouts_share_one_mirror(remote, tmp_path):
+    url, work = remote
+    manager = CheckoutManager(str(tmp_path / 'cache'))
+
+    async def main():
+        return await asyncio.gather(
+            manager.checkout(url, 'main', str(tmp_path / 'full'), depth=0),
+            manager.checkout(url, 'main', str(tmp_path / 'shallow'), depth=1),
+            manager.checkout(url, 'main', str(tmp_path / 'two'), depth=2))
+
+    asyncio.run(main())
+
+    assert manager.clones == 1
+    assert count_commits(str(tmp_path / 'full')) == 3
+    assert count_commits(str(tmp_path / 'shallow')) == 1
+    assert count_commits(str(tmp_path / 'two')) == 2
+    assert os.path.exists(str(tmp_path / 'shallow' / 'file2.txt'))
+    # The full checkout owns its objects and survives the mirror's eviction
+    assert not os.path.exists(str(
+        tmp_path / 'full' / '.git' / 'objects' / 'info' / 'alternates'))
+    manager.max_bytes = 0
+    manager.evict()
+    assert not os.path.exists(manager.mirror_path(url))
+    git('status', cwd=str(tmp_path / 'full'))
+    assert count_commits(str(tmp_path / 'full')) == 3
+
+
+def test_fetches_only_when_commit_is_missing(remote, tmp_path):
+    url, work = remote
+    manager = CheckoutManager(str(tmp_path / 'cache'))
+    first = git('rev-parse', 'HEAD', cwd=work)
+
+    asyncio.run(manager.checkout(url, first, str(tmp_path / 'a')))
+    asyncio.run(manager.checkout(url, first, str(tmp_path / 'b')))
+    assert manager.fetches == 0
+
+    new = commit(work, 'new.txt', 'new')
+    asyncio.run(manager.checkout(url, new, str(tmp_path / 'c')))
+    assert manager.fetches == 1
+    assert git('rev-parse', 'HEAD', cwd=str(tmp_path / 'c')) == new
+
+    with pytest.raises(CheckoutError):
+        asyncio.run(manager.checkout(url, '0' * 40, str(tmp_path / 'd')))
+
+
+def test_evicts_least_recently_used_mirror(tmp_path):
+    urls = []
+    for name in ('one', 'two'):
+        url = str(tmp_path / f'{name}.git')
+        git('init', '-q', '--bare', '-b', 'main', url)
+        work = str(tmp_path / f'{name}-work')
+        git('clone', '-q', url, work)
+        commit(work, 'data.bin', name * 10000)
+        urls.append(url)
+    manager = CheckoutManager(str(tmp_path / 'cache'))
+
+    for i, url in enumerate(urls):
+        asyncio.run(manager.checkout(url, 'main', str(tmp_path / f'co{i}')))
+        os.utime(manager.mirror_path(url), ns=(i, i))
+    manager.max_bytes = manager._sizes[manager.mirror_path(urls[1])] + 1
+    manager.evict()
+
+    assert not os.path.exists(manager.mirror_path(urls[0]))
+    assert os.path.exists(manager.mirror_path(urls[1]))
+
+
+def test_checks_out_branches_with_the_repository_as_origin(remote, tmp_path):
+    url, work = remote
+    git('checkout', '-q', '-b', 'feature', cwd=work)
+    with open(os.path.join(work, 'feature.txt'), 'w') as f:
+        f.write('feature')
+    git('add', 'feature.txt', cwd=work)
+    git('commit', '-q', '-m', 'feature', cwd=work)
+    git('push', '-q', 'origin', 'feature', cwd=work)
+    head = git('rev-parse', 'HEAD', cwd=work)
+    manager = CheckoutManager(str(tmp_path / 'cache'))
+
+    for depth in (0, 1):
+        dest = str(tmp_path / f'depth{depth}')
+        asyncio.run(manager.checkout(url, 'feature', dest, depth=depth))
+
+        assert git('rev-parse', 'HEAD', cwd=dest) == head
+        assert git('remote', 'get-url', 'origin', cwd=dest) == url
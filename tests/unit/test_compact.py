@@ -0,0 +1,115 @@
+import pytest
+
+from benchmarks.synthetic import task_configs
+from src.task_interfaces import (
+    CompactCatalog, EligibilityQuery, TaskCatalog, TaskV2)
+from src.task_interfaces.compact import Interner, memory_report
+from src.task_interfaces.loader import parse_task
+
+ACCESSORS = (
+    'has_check_run_capability', 'has_custom_check_run_capability',
+    'allows_for_hotfixes', 'has_main_branch_capability',
+    'has_githaxs_worker_capability', 'has_task_orchestrator_capability',
+    'has_aws_iam_assume_role_capability',
+    'has_inject_ssm_parameters_capability', 'has_docker_build_capability',
+    'has_inject_settings_capability', 'has_checkout_capability',
+    'get_checkout_depth', 'ignored_authors', 'get_check_run_actions',
+    'get_subscribed_events', 'get_parameters', 'to_json')
+
+
+def test_compact_tasks_answer_like_the_models():
+    tasks = [parse_task(x) for x in task_configs(200, 1)]
+    interner = Interner()
+    compacted = [interner.task(x) for x in tasks]
+
+    for task, compact in zip(tasks, compacted):
+        for name in ACCESSORS:
+            assert getattr(compact, name)() == getattr(task, name)(), name
+        assert compact.to_json_bytes() == task.to_json_bytes()
+        assert (compact.slug, compact.beta, compact.tags, compact.memory) \
+            == (task.slug, task.beta, task.tags, task.memory)
+        assert not hasattr(compact, 'runner_id')
+        assert compact.to_model() == task
+
+
+def test_compact_v2_tasks_share_default_submodels():
+    tasks = [parse_task(x) for x in task_configs(200, 2)]
+    interner = Interner()
+    compacted = [interner.task(x) for x in tasks]
+
+    for task, compact in zip(tasks, compacted):
+        assert compact.to_json() == task.to_json()
+        assert compact.capabilities == task.capabilities
+        assert compact.runner_id is task.runner_id
+        assert compact.has_check_run_capability() == \
+            task.capabilities.check_run.enabled
+        assert compact.get_checkout_depth() == task.capabilities.checkout.depth
+    assert len({id(x.capabilities.docker_build) for x in compacted}) == 1
+    assert len({id(x.capabilities.task_settings) for x in compacted}) == 1
+
+    model = compacted[0].to_model()
+    assert isinstance(model, TaskV2)
+    model.commands[0].completed = True
+    assert not compacted[0].commands[0].completed
+    with pytest.raises(AttributeError):
+        compacted[0].name = 'Renamed'
+
+
+def test_compact_catalog_routes_and_queries_like_a_catalog():
+    tasks = [parse_task(x) for x in task_configs(300, 1)] + [
+        parse_task(dict(x, name=f'V2 {x["name"]}'))
+        for x in task_configs(300, 2)]
+    catalog = TaskCatalog(tasks)
+    compact = CompactCatalog(tasks)
+    queries = [
+        EligibilityQuery(level, public, languages=['python'])
+        for level in range(4) for public in (False, True)]
+
+    def slugs(results):
+        return [x.slug for x in results]
+
+    for event in catalog.events:
+        assert slugs(compact.tasks_for_event(event)) == \
+            slugs(catalog.tasks_for_event(event))
+    for query in queries:
+        assert slugs(compact.eligible(query)) == slugs(catalog.eligible(query))
+
+    changed = tasks[0].copy(update={'subscribed_events': ['deployment']})
+    updated = compact.with_changes(upserts=[changed], removals=[tasks[1].slug])
+    assert isinstance(updated, CompactCatalog)
+    assert slugs(updated.tasks_for_event('deployment')) == [tasks[0].slug]
+    assert tasks[1].slug not in updated and tasks[1].slug in compact
+
+
+def test_interner_only_keeps_live_values():
+    tasks = [parse_task(x) for x in task_configs(50, 1)]
+    catalog = CompactCatalog(tasks)
+    first = catalog
+    sizes = []
+    for i in range(300):
+        changed = tasks[i % 50].copy(update={
+            'description': f'Revision {i}',
+            'subscribed_events': [f'event.{i}']})
+        catalog = catalog.with_changes(
+            upserts=[changed], removals=[tasks[(i + 1) % 50].slug])
+        catalog = catalog.with_changes(upserts=[tasks[(i + 1) % 50]])
+        sizes.append(len(catalog._interner))
+
+    live = len(CompactCatalog(catalog)._interner)
+    assert max(sizes) <= 2 * live + 20
+    assert sorted(x.slug for x in catalog) == sorted(x.slug for x in tasks)
+    assert catalog.get(tasks[49].slug).description == 'Revision 299'
+    assert [x.slug for x in catalog.tasks_for_event('event.299')] == \
+        [tasks[49].slug]
+    assert not catalog.tasks_for_event('event.249')
+    # Earlier snapshots keep working on their own interner
+    assert first.get(tasks[49].slug).description == tasks[49].description
+    for task in catalog:
+        assert task.to_model().to_json() == task.to_json()
+
+
+def test_memory_report():
+    report = memory_report(task_configs(500, 1))
+
+    assert report['tasks'] == 500
+    assert report['compact_bytes_per_task'] < report['bytes_per_task'] / 2
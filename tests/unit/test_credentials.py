@@ -0,0 +1,134 @@
+import asyncio
+import sys
+import types
+
+import pytest
+
+from src.task_interfaces import CredentialCache, LocalProvider, TaskV2
+from src.task_interfaces.credentials import Boto3Provider, Credentials
+
+ROLE = 'arn:aws:iam::123456789012:role/deploy'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(clock, **kwargs):
+    provider = LocalProvider(
+        roles={ROLE: 3600},
+        parameters={f'/prod/service-{i}/url': str(i) for i in range(25)},
+        page_size=10, delay=0.01, clock=clock)
+    return provider, CredentialCache(provider, clock=clock, **kwargs)
+
+
+def test_concurrent_requests_share_one_fetch():
+    clock = Clock()
+    provider, cache = make_cache(clock)
+
+    async def main():
+        return await asyncio.gather(
+            *(cache.environment(ROLE, '/prod/') for _ in range(20)))
+
+    envs = asyncio.run(main())
+
+    assert provider.assume_role_calls == 1
+    # 25 parameters in pages of 10
+    assert provider.parameter_calls == 3
+    assert all(x == envs[0] for x in envs)
+    assert envs[0]['SERVICE_7_URL'] == '7'
+    assert envs[0]['AWS_SESSION_TOKEN']
+
+
+def test_refresh_before_expiry_and_ttl():
+    clock = Clock()
+    provider, cache = make_cache(
+        clock, refresh_margin=300, parameters_ttl=60)
+
+    async def main():
+        first = await cache.credentials(ROLE)
+        await cache.parameters(ROLE, '/prod/')
+
+        # Inside the refresh margin the old credentials are still served
+        # while new ones are fetched
+        clock.now += 3400
+        assert await cache.credentials(ROLE) is first
+        await asyncio.sleep(0.05)
+        refreshed = await cache.credentials(ROLE)
+        assert refreshed is not first
+        assert refreshed.expiration == clock.now + 3600
+        assert provider.assume_role_calls == 2
+
+        # Parameters past their TTL are evicted and fetched again
+        assert provider.parameter_calls == 3
+        await cache.parameters(ROLE, '/prod/')
+        assert provider.parameter_calls == 6
+
+    asyncio.run(main())
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    clock = Clock()
+    provider, cache = make_cache(clock)
+
+    async def main():
+        results = await asyncio.gather(
+            *(cache.credentials('arn:aws:iam::1:role/other')
+              for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(x, PermissionError) for x in results)
+        assert provider.assume_role_calls == 1
+        with pytest.raises(PermissionError):
+            await cache.credentials('arn:aws:iam::1:role/other')
+        assert provider.assume_role_calls == 2
+
+    asyncio.run(main())
+
+
+def test_task_environment():
+    clock = Clock()
+    provider, cache = make_cache(clock)
+    task = TaskV2(
+        name="Deploy", summary="", description="", commands=[],
+        runner_id='python_3_10',
+        capabilities={'assume_iam_role': {
+            'enabled': True, 'role_arn': ROLE,
+            'inject_ssm_parameters': True}})
+    plain = TaskV2(name="Plain", summary="", description="", commands=[],
+                   runner_id='python_3_10')
+
+    env = asyncio.run(cache.task_environment(task, {'ssm_prefix': '/prod/'}))
+
+    assert env['SERVICE_0_URL'] == '0'
+    assert asyncio.run(cache.task_environment(plain)) == {}
+
+
+def test_boto3_provider_keeps_a_client_per_credentials(monkeypatch):
+    created = []
+
+    class Session:
+        def __init__(self, region_name=None):
+            created.append(('session', region_name))
+
+        def client(self, service, **kwargs):
+            created.append((service, kwargs.get('aws_access_key_id')))
+            return object()
+
+    monkeypatch.setitem(sys.modules, 'boto3', types.SimpleNamespace(
+        session=types.SimpleNamespace(Session=Session)))
+    provider = Boto3Provider(region_name='eu-west-1', max_clients=2)
+    one, two, three = (
+        Credentials(f'key-{i}', 'secret', 'token', 0.0) for i in range(3))
+
+    clients = [provider._ssm_client(x) for x in (one, two, one, two)]
+    assert clients[0] is clients[2] and clients[1] is clients[3]
+    provider._ssm_client(three)
+    provider._ssm_client(two)
+    provider._ssm_client(one)
+
+    assert created == [
+        ('session', 'eu-west-1'), ('ssm', 'key-0'), ('ssm', 'key-1'),
+        ('ssm', 'key-2'), ('ssm', 'key-0')]
@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+from src.task_interfaces import EnvironmentCache, Task, TaskV2
+from src.task_interfaces.envcache import (
+    environment_spec, install_script, warm_up)
+
+
+def v1_task(name, python=(), custom=()):
+    return Task(name=name, summary="", description="", runtime='python',
+                packages={'python': list(python), 'custom': list(custom)})
+
+
+def v2_task(name, runner_id='python_3_10'):
+    return TaskV2(name=name, summary="", description="", commands=[],
+                  runner_id=runner_id)
+
+
+class Builder:
+    def __init__(self, delay=0.0, size=10):
+        self.built = []
+        self.delay = delay
+        self.size = size
+
+    def __call__(self, spec, path):
+        time.sleep(self.delay)
+        self.built.append(spec)
+        with open(os.path.join(path, 'installed'), 'w') as f:
+            f.write('x' * self.size)
+
+
+def test_identical_specs_share_one_environment(tmp_path):
+    builder = Builder()
+    cache = EnvironmentCache(str(tmp_path), builder)
+
+    paths = []
+    for task in (v1_task('A', ['requests', 'black', 'black']),
+                 v1_task('B', ['black', 'requests']),
+                 v1_task('C', ['black']), v2_task('D')):
+        with cache.use_task(task) as path:
+            assert os.path.exists(os.path.join(path, 'installed'))
+            paths.append(path)
+
+    a, b, c, d = paths
+    assert a == b
+    assert len({a, c, d}) == 3
+    assert len(builder.built) == 3
+    assert cache.ensure_task(v2_task('D')) is False
+    assert environment_spec(v2_task('E', 'node_16')) == {
+        'runner_id': 'node_16'}
+
+
+def test_concurrent_builds_are_shared(tmp_path):
+    builder = Builder(delay=0.1)
+    cache = EnvironmentCache(str(tmp_path), builder)
+    spec = environment_spec(v1_task('A', ['black']))
+    built = []
+    threads = [
+        threading.Thread(target=lambda: built.append(cache.ensure(spec)))
+        for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builder.built) == 1
+    assert sorted(built) == [False] * 4 + [True]
+    assert cache.hits == 4
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = EnvironmentCache(str(tmp_path), Builder(size=1000))
+    specs = [environment_spec(v1_task(x, [x])) for x in 'abc']
+    for i, spec in enumerate(specs):
+        cache.ensure(spec)
+        os.utime(cache.path(spec), ns=(i, i))
+
+    with cache.use(specs[0]):
+        cache.max_bytes = 2500
+        cache.evict()
+        # In use, so the second least recently used goes instead
+        assert os.path.isdir(cache.path(specs[0]))
+        assert not os.path.isdir(cache.path(specs[1]))
+        assert os.path.isdir(cache.path(specs[2]))
+
+
+def test_warm_up_builds_most_used(tmp_path):
+    builder = Builder()
+    cache = EnvironmentCache(str(tmp_path), builder)
+    tasks = [v2_task('A'), v2_task('B'), v2_task('C', 'node_16'),
+             v1_task('D', ['black'])]
+
+    assert warm_up(cache, tasks, top=1) == 1
+    assert builder.built == [{'runner_id': 'python_3_10'}]
+
+
+def test_keeps_environment_larger_than_the_store(tmp_path):
+    cache = EnvironmentCache(str(tmp_path), Builder(size=1000), max_bytes=10)
+    spec = environment_spec(v1_task('A', ['black']))
+
+    with cache.use(spec) as path:
+        assert os.path.isdir(path)
+    assert os.path.isdir(path)
+
+    other = environment_spec(v1_task('B', ['flake8']))
+    cache.ensure(other)
+    assert not os.path.isdir(path)
+    assert os.path.isdir(cache.path(other))
+
+
+def test_install_script():
+    script = install_script(environment_spec(
+        v1_task('A', ['black', 'flake8'], custom=['echo done'])))
+
+    assert '"$ENV_DIR/venv/bin/pip" install --quiet black flake8' in script
+    assert script.endswith('echo done\n')
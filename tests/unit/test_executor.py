@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from src.task_interfaces import CommandExecutor, TaskV2
+
+
+def make_task(commands):
+    return TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        commands=[
+            dict({'title': x['slug'], 'check': False}, **x) for x in commands],
+        runner_id='python_3_10',
+    )
+
+
+def test_run_task_fills_in_commands():
+    task = make_task([
+        {'slug': 'version', 'command': 'echo 1.2.3', 'include_in_env': 'VER'},
+        {'slug': 'use', 'command': 'echo "v$VER"; exit 3'},
+    ])
+
+    run = asyncio.run(CommandExecutor().run_task(task))
+
+    version, use = task.commands
+    assert run.passed is True
+    assert version.completed is True
+    assert version.exit_code == 0
+    assert version.duration >= 0
+    assert use.output == 'v1.2.3\n'
+    assert use.exit_code == 3
+
+
+def test_failed_check_skips_remaining_commands():
+    task = make_task([
+        {'slug': 'lint', 'command': 'exit 1', 'check': True},
+        {'slug': 'test', 'command': 'echo test'},
+        {'slug': 'report', 'command': 'echo report', 'run_on_fail': True},
+    ])
+
+    run = asyncio.run(CommandExecutor().run_task(task))
+
+    lint, test, report = task.commands
+    assert run.passed is False
+    assert run.failed_command == 'lint'
+    assert test.completed is False
+    assert test.exit_code is None
+    assert report.output == 'report\n'
+
+
+def test_run_tasks_concurrently():
+    tasks = [make_task([{'slug': 'sleep', 'command': 'sleep 0.2'}])
+             for _ in range(5)]
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        runs = await CommandExecutor(max_concurrent_tasks=5).run_tasks(tasks)
+        return runs, loop.time() - start
+
+    runs, elapsed = asyncio.run(run())
+
+    assert all(x.passed for x in runs)
+    assert elapsed < 0.8
+
+
+def test_exported_output_is_not_capped():
+    task = make_task([
+        {'slug': 'long', 'command': 'head -c 3000 /dev/zero | tr "\\0" a',
+         'include_in_env': 'LONG'},
+        {'slug': 'length', 'command': 'echo ${#LONG}'},
+    ])
+
+    asyncio.run(CommandExecutor(max_output=100).run_task(task))
+
+    long, length = task.commands
+    assert 'bytes omitted' in long.output
+    assert length.output == '3000\n'
+
+
+def test_output_too_big_to_export_is_an_error():
+    task = make_task([
+        {'slug': 'huge', 'command': 'head -c 200000 /dev/zero | tr "\\0" a',
+         'include_in_env': 'HUGE'},
+        {'slug': 'use', 'command': 'echo used'},
+    ])
+
+    with pytest.raises(ValueError, match="'huge'.*too big to export as HUGE"):
+        asyncio.run(CommandExecutor().run_task(task))
+    assert task.commands[1].completed is False
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from src.task_interfaces import FanOut, LocalQueue, Task, TaskV2
+from src.task_interfaces.fanout import V1_WORKER_EVENT, worker_event
+
+
+def test_worker_event():
+    v1 = Task(name="Worker", summary="", description="", runtime='python',
+              capabilities=[{'type': 'githaxs-worker'}])
+    v2 = TaskV2(
+        name="Worker", summary="", description="", commands=[],
+        runner_id='python_3_10',
+        capabilities={'githaxs_worker': {'enabled': True,
+                                         'event_name': 'lint.worker'}})
+    plain = TaskV2(name="Plain", summary="", description="", commands=[],
+                   runner_id='python_3_10')
+
+    assert worker_event(v1) == V1_WORKER_EVENT
+    assert worker_event(v2) == 'lint.worker'
+    with pytest.raises(ValueError):
+        worker_event(plain)
+
+
+def test_shards_and_merges_in_order():
+    async def handler(items, payload):
+        await asyncio.sleep(0.001 * (items[0] % 3))
+        return [x * payload for x in items]
+
+    async def main():
+        async with LocalQueue({'lint.worker': handler}, workers=4) as queue:
+            fan_out = FanOut(queue, 'lint.worker', shard_size=7,
+                             max_in_flight=3)
+            report = await fan_out.run(iter(range(100)), payload=2)
+            return queue, report
+
+    queue, report = asyncio.run(main())
+
+    assert report.ok
+    assert report.results == [x * 2 for x in range(100)]
+    assert report.shards == 15
+    assert queue.sent == 15
+    # Never more shards outstanding than max_in_flight
+    assert queue.max_depth <= 3
+
+
+def test_partial_failures_are_merged():
+    attempts = {}
+
+    def handler(items, payload):
+        attempts[items[0]] = attempts.get(items[0], 0) + 1
+        if items[0] == 4:
+            raise RuntimeError('worker crashed')
+        if items[0] == 0 and attempts[0] == 1:
+            raise ConnectionError('flaky')
+        return {'results': [f'ok {x}' for x in items],
+                'errors': {'1': 'bad item'} if items[0] == 2 else {}}
+
+    async def main():
+        async with LocalQueue({'githaxs.invoke_task': handler}) as queue:
+            return await FanOut(queue, 'githaxs.invoke_task', shard_size=2,
+                                retries=1).run(range(6))
+
+    report = asyncio.run(main())
+
+    assert not report.ok
+    assert report.retried == 2
+    assert report.results == ['ok 0', 'ok 1', 'ok 2', None, None, None]
+    assert [(x.index, x.item) for x in report.failures] == [
+        (3, 3), (4, 4), (5, 5)]
+    assert report.failures[0].error == 'bad item'
+    assert report.failures[1].error == 'RuntimeError: worker crashed'
@@ -0,0 +1,65 @@
+import asyncio
+import sys
+
+from src.task_interfaces import CommandExecutor, TaskV2
+from src.task_interfaces.executor import argv_batches
+
+
+def make_task(include_files_changed=True):
+    return TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        capabilities={'checkout': {
+            'enabled': True, 'include_files_changed': include_files_changed}},
+        commands=[
+            {'title': 'Lint', 'slug': 'lint', 'check': True,
+             'command': 'echo lint', 'file_patterns': ['*.py']},
+            {'title': 'Eslint', 'slug': 'eslint', 'check': True,
+             'command': 'echo eslint', 'file_patterns': ['*.js']},
+            {'title': 'All', 'slug': 'all', 'check': True,
+             'command': 'echo all'},
+        ],
+        runner_id='python_3_10',
+    )
+
+
+def test_commands_receive_matching_files():
+    task = make_task()
+    files = ['README.md', 'src/app.py', "it's.py"]
+
+    asyncio.run(CommandExecutor().run_task(task, files_changed=files))
+
+    lint, eslint, everything = task.commands
+    assert lint.output == "lint src/app.py it's.py\n"
+    assert eslint.skipped is True
+    assert eslint.completed is True
+    assert eslint.exit_code == 0
+    assert everything.output == 'all\n'
+
+
+def test_files_are_ignored_without_include_files_changed():
+    task = make_task(include_files_changed=False)
+
+    asyncio.run(CommandExecutor().run_task(task, files_changed=['a.py']))
+
+    assert task.commands[0].output == 'lint\n'
+    assert task.commands[1].skipped is False
+
+
+def test_large_file_lists_are_batched():
+    files = [f'src/module_{i:05}.py' for i in range(20000)]
+    batches = argv_batches(files, 96 * 1024)
+
+    assert len(batches) > 1
+    assert all(len(x) <= 96 * 1024 for x in batches)
+    assert ' '.join(batches).split() == files
+
+    task = make_task()
+    task.commands[0].command = \
+        f'{sys.executable} -c "import sys; print(len(sys.argv) - 1)"'
+    asyncio.run(CommandExecutor().run_task(task, files_changed=files))
+
+    counts = [int(x) for x in task.commands[0].output.split()]
+    assert sum(counts) == len(files)
+    assert len(counts) == len(batches)
@@ -0,0 +1,83 @@
+import os
+import shutil
+
+from src.task_interfaces import load_tasks, Task, TaskV2
+
+HERE = os.path.dirname(__file__)
+
+V2_CONFIG = """
+version: 2
+name: Lint V2
+summary: Lint
+description: Lint
+runner_id: python_3_10
+commands:
+  - title: Lint
+    slug: lint
+    command: flake8
+    check: true
+"""
+
+
+def make_catalog(root, count):
+    for i in range(count):
+        path = os.path.join(root, f'task-{i}')
+        os.makedirs(path)
+        shutil.copy(os.path.join(HERE, 'task_config.yaml'), path)
+    os.makedirs(os.path.join(root, 'v2'))
+    with open(os.path.join(root, 'v2', 'task_config.yaml'), 'w') as f:
+        f.write(V2_CONFIG)
+    os.makedirs(os.path.join(root, 'broken'))
+    with open(os.path.join(root, 'broken', 'task_config.yaml'), 'w') as f:
+        f.write('name: Broken\n')
+
+
+def test_load_collects_errors(tmp_path):
+    make_catalog(tmp_path, 10)
+
+    report = load_tasks(tmp_path, max_workers=2)
+
+    assert report.validated == 11
+    assert len(report.errors) == 1
+    assert report.errors[0].path.endswith(
+        os.path.join('broken', 'task_config.yaml'))
+    assert 'summary' in report.format_errors()
+    tasks = list(report.tasks.values())
+    assert isinstance(tasks[-1], TaskV2)
+    assert all(isinstance(x, Task) for x in tasks[:-1])
+
+
+def test_warm_load_only_validates_changed_files(tmp_path):
+    root = tmp_path / 'tasks'
+    cache_path = tmp_path / 'tasks.cache'
+    make_catalog(root, 3)
+    load_tasks(root, cache_path=cache_path)
+
+    with open(root / 'v2' / 'task_config.yaml', 'a') as f:
+        f.write('beta: false\n')
+    report = load_tasks(root, cache_path=cache_path)
+
+    assert report.cached == 3
+    assert report.validated == 1
+    assert report.tasks[str(root / 'v2' / 'task_config.yaml')].beta is False
+    assert report.tasks[str(root / 'task-0' / 'task_config.yaml')].\
+        has_checkout_capability() is True
+
+
+def test_configs_failing_inside_validators_are_reported(tmp_path):
+    make_catalog(tmp_path, 8)
+    os.makedirs(tmp_path / 'nameless')
+    (tmp_path / 'nameless' / 'task_config.yaml').write_text(
+        'summary: Lint\ndescription: Lint\n')
+    os.makedirs(tmp_path / 'bad-check-run')
+    (tmp_path / 'bad-check-run' / 'task_config.yaml').write_text(
+        V2_CONFIG + 'capabilities:\n  check_run:\n    fix_errors: maybe\n')
+
+    report = load_tasks(tmp_path, max_workers=2)
+
+    assert report.validated == 9
+    errors = {os.path.basename(os.path.dirname(x.path)): x.error
+              for x in report.errors}
+    assert set(errors) == {'broken', 'nameless', 'bad-check-run'}
+    assert 'name' in errors['nameless']
+    assert 'fix_errors' in errors['bad-check-run']
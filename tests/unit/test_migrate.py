@@ -0,0 +1,140 @@
+import os
+
+import pytest
+import yaml
+
+from src.task_interfaces import TaskV2, load_tasks
+from src.task_interfaces import migrate
+from src.task_interfaces.migrate import (
+    MigrationReport, convert, migrate_catalog, migrate_file)
+
+V1_CONFIG = {
+    'name': 'Lint Task',
+    'summary': 'Lint',
+    'description': 'Lint',
+    'runtime': 'python',
+    'memory': 1024,
+    'platform': 'arm64',
+    'packages': {'python': ['flake8']},
+    'tags': ['lint'],
+    'subscribed_events': ['pull_request.opened'],
+    'capabilities': [
+        {'type': 'githaxs-worker'},
+        {'type': 'inject-settings'},
+        {'type': 'aws-assume-iam-role', 'inject_ssm_parameters': True},
+        {'type': 'checkout', 'depth': 0},
+        {'type': 'checkrun', 'allow_hotfix': True,
+         'ignored_authors': ['bot'],
+         'actions': [{'label': 'Hotfix', 'identifier': 'hotfix',
+                      'description': 'Force check to pass for hotfix.'}]},
+    ],
+    'default_configuration': {'installation': {'org': True},
+                              'settings': {'strict': True}},
+}
+
+
+def test_convert_maps_capabilities_runtime_and_entrypoint():
+    converted, unmapped = convert(V1_CONFIG)
+    task = TaskV2.parse_obj(converted)
+
+    capabilities = task.capabilities
+    assert capabilities.githaxs_worker.enabled
+    assert capabilities.githaxs_worker.event_name == 'githaxs.invoke_task'
+    assert capabilities.task_settings.enabled
+    assert capabilities.assume_iam_role.inject_ssm_parameters
+    assert (capabilities.checkout.enabled, capabilities.checkout.depth) == \
+        (True, 0)
+    assert capabilities.check_run.ignored_authors == ['bot']
+    # The generated hotfix action is not carried over twice
+    assert [x.identifier for x in capabilities.check_run.actions] == \
+        ['hotfix']
+    assert not capabilities.docker_build.enabled
+    assert task.runner_id.value == 'python_3_10'
+    assert [(x.slug, x.command, x.check) for x in task.commands] == [
+        ('run', "python -c 'import task; task.run()'", True)]
+    assert task.installation.org is True
+    assert task.settings == {'strict': True}
+    assert task.tags == ['lint']
+
+    # platform is at its default and not reported
+    assert unmapped == {'memory': 1024, 'packages': {
+        'python': ['flake8'], 'system': [], 'node': [], 'ruby': [],
+        'asdf': [], 'custom': []}}
+
+
+def test_entrypoint_is_checked_without_checkrun():
+    config = dict(V1_CONFIG, capabilities=[{'type': 'checkout'}])
+    converted, _ = convert(config)
+
+    assert TaskV2.parse_obj(converted).commands[0].check is True
+
+
+def test_unknown_runtime_is_an_error():
+    with pytest.raises(ValueError, match='go'):
+        convert(dict(V1_CONFIG, runtime='go'))
+
+
+def test_routing_differences_are_reported(monkeypatch):
+    base = {'name': 'Task', 'summary': 'Task', 'description': 'Task'}
+
+    # V2 tasks subscribe to requested actions even without actions
+    for capabilities in ([{'type': 'checkout'}], [{'type': 'checkrun'}]):
+        converted, unmapped = convert(dict(base, capabilities=capabilities))
+        assert 'check_run.requested_action' in \
+            TaskV2.parse_obj(converted).get_subscribed_events()
+        assert unmapped['routing'] == {
+            'added': ['check_run.requested_action']}
+
+    converted, unmapped = convert(dict(base, capabilities=[
+        {'type': 'checkrun', 'fix_errors': True}]))
+    assert 'routing' not in unmapped
+
+    monkeypatch.setattr(TaskV2, 'get_subscribed_events', lambda self: [])
+    converted, unmapped = convert(dict(base, subscribed_events=['push']))
+    assert unmapped['routing'] == {'removed': ['push']}
+
+
+def test_key_errors_fail_the_migration(tmp_path, monkeypatch):
+    def convert(data):
+        raise KeyError('name')
+
+    path = tmp_path / 'task_config.yaml'
+    path.write_text('name: Task\n')
+    monkeypatch.setattr(migrate, 'convert', convert)
+
+    migration = migrate_file(str(path), str(tmp_path / 'out.yaml'))
+
+    assert migration.status == 'failed'
+    assert migration.error == "Missing key 'name'"
+
+
+def test_catalog_loads_through_the_v2_path_only(tmp_path):
+    root = tmp_path / 'tasks'
+    out = tmp_path / 'v2'
+    for i in range(10):
+        path = root / f'task-{i}'
+        os.makedirs(path)
+        config = dict(V1_CONFIG, name=f'Task {i}',
+                      runtime='bash' if i % 2 else 'python')
+        with open(path / 'task_config.yaml', 'w') as f:
+            yaml.safe_dump(config, f)
+        (path / ('task.sh' if i % 2 else 'task.py')).write_text('run\n')
+    os.makedirs(root / 'broken')
+    (root / 'broken' / 'task_config.yaml').write_text('name: Broken\n')
+
+    report = MigrationReport(list(migrate_catalog(root, out, max_workers=2)))
+
+    assert report.count('converted') == 10
+    assert report.count('failed') == 1
+    assert 'summary' in report.format_errors()
+    assert 'memory=1024' in report.format_unmapped()
+    assert (out / 'task-1' / 'task.sh').exists()
+    assert (out / 'task-2' / 'task.py').exists()
+
+    loaded = load_tasks(out)
+    assert loaded.ok and len(loaded.tasks) == 10
+    assert all(isinstance(x, TaskV2) for x in loaded.tasks.values())
+
+    # Converting the output again leaves it as it is
+    again = MigrationReport(list(migrate_catalog(out, out, max_workers=1)))
+    assert again.count('unchanged') == 10
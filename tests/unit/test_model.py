@@ -1,4 +1,9 @@
-from src.task_interfaces import Task
+import json
+
+from src.task_interfaces import Task, TaskV2
+from src.task_interfaces.task import (
+    CheckoutCapability, MainBranchAnalysisCapability)
+from src.task_interfaces.task_v2 import MainBranchAnalysis
 
 
 def test_capabilities():
@@ -29,6 +34,18 @@ def test_get_subscribed_events():
     assert task.has_check_run_capability() is True
 
 
+def test_requested_action_follows_check_run_actions():
+    action = {'label': 'Run', 'identifier': 'run', 'description': 'Run'}
+    for checkrun in ({}, {'actions': None}, {'actions': [action]},
+                     {'fix_errors': True}, {'allow_hotfix': True},
+                     {'actions': None, 'fix_errors': True}):
+        task = Task(name="Test", summary="", description="",
+                    capabilities=[dict(checkrun, type='checkrun')])
+
+        assert ('check_run.requested_action' in task.get_subscribed_events()) \
+            is (task.get_check_run_actions() is not None)
+
+
 def test_get_actions():
     task = Task(name="Test",
                 slug="test",
@@ -84,3 +101,138 @@ def test_slug():
 
     assert 'slug' in task.dict()
     assert task.dict()['slug'] == 'test-foo-bar'
+
+
+def test_capability_accessors():
+    task = Task(
+        name="Test",
+        summary="",
+        description="",
+        capabilities=[
+            {'type': 'checkrun', 'allow_hotfix': True,
+             'ignored_authors': ['dependabot[bot]']},
+            {'type': 'checkout', 'depth': 5},
+        ],
+        runtime='python',
+    )
+
+    assert task.has_check_run_capability() is True
+    assert task.has_main_branch_capability() is False
+    assert task.allows_for_hotfixes() is True
+    assert task.ignored_authors() == ['dependabot[bot]']
+    assert task.get_checkout_depth() == 5
+
+    task = task.copy(update={'capabilities': [
+        MainBranchAnalysisCapability(type='main-branch-analysis')]})
+
+    assert task.has_main_branch_capability() is True
+    assert task.has_check_run_capability() is False
+
+
+def test_missing_capabilities():
+    task = Task(
+        name="Test",
+        summary="",
+        description="",
+        runtime='python',
+    )
+
+    assert task.get_checkout_depth() is None
+    assert task.ignored_authors() == []
+    assert task.allows_for_hotfixes() is False
+    assert task.has_inject_ssm_parameters_capability() is False
+
+
+def test_to_json_is_idempotent():
+    task = Task(
+        name="Test",
+        summary="",
+        description="",
+        capabilities=[
+            {'type': 'checkrun', 'fix_errors': True, 'allow_hotfix': True},
+            {'type': 'aws-assume-iam-role', 'inject_ssm_parameters': True},
+        ],
+        subscribed_events=['issues.opened'],
+        runtime='python',
+    )
+
+    first = task.to_json()
+    Task(**task.dict()).to_json()
+    task.copy().to_json()
+
+    assert len(first['parameters']) == 2
+    assert len(task.get_check_run_actions()) == 2
+    assert first['subscribed_events'].count('issues.opened') == 1
+    assert task.parameters == []
+    assert task.subscribed_events == ['issues.opened']
+    assert task.to_json() == first
+    assert json.loads(task.to_json_bytes()) == first
+
+    first['name'] = 'Changed'
+    assert task.to_json()['name'] == 'Test'
+
+
+def test_to_json_v2():
+    task = TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        capabilities={
+            'check_run': {'enabled': True, 'allow_hotfix': True},
+            'assume_iam_role': {'enabled': True},
+        },
+        commands=[],
+        runner_id='python_3_10',
+    )
+
+    manifest = task.to_json()
+
+    assert manifest['parameters'][0]['name'] == 'iam_role_arn'
+    assert manifest['capabilities']['check_run']['enabled'] is True
+    assert len(TaskV2(**task.dict()).capabilities.check_run.actions) == 1
+    assert json.loads(task.to_json_bytes()) == manifest
+
+    task.show = 'admin'
+
+    assert task.to_json()['show'] == 'admin'
+
+
+def test_to_json_sees_replaced_nested_models():
+    task = TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        commands=[],
+        runner_id='python_3_10',
+    )
+    other = task.copy(deep=True)
+    manifest = other.to_json_bytes()
+    assert 'push' not in task.to_json()['subscribed_events']
+
+    # Nested models are replaced rather than changed in place
+    task.capabilities = task.capabilities.copy(update={
+        'main_branch_analysis': MainBranchAnalysis(enabled=True)})
+
+    assert 'push' in task.to_json()['subscribed_events']
+    assert json.loads(task.to_json_bytes()) == task.to_json()
+    assert other.to_json_bytes() is manifest
+
+    v1 = Task(name="Test", summary="", description="",
+              capabilities=[{'type': 'checkout', 'depth': 0}])
+    v1.to_json()
+    v1.capabilities = [CheckoutCapability(type='checkout', depth=1)]
+    assert v1.to_json()['capabilities'][0]['depth'] == 1
+
+
+def test_iam_role_parameter_v2():
+    task = TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        capabilities={'assume_iam_role': {
+            'enabled': True, 'role_arn': 'arn:aws:iam::1:role/x'}},
+        commands=[],
+        runner_id='python_3_10',
+    )
+
+    assert [x['name'] for x in task.get_parameters()] == ['iam_role_arn']
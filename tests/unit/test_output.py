@@ -0,0 +1,109 @@
+import asyncio
+
+from src.task_interfaces import CommandExecutor, TaskV2
+from src.task_interfaces.output import OutputBuffer
+
+
+def test_buffer_keeps_head_and_tail_in_memory():
+    data = bytes(range(256)) * 100
+    with OutputBuffer(head_size=100, tail_size=100) as buffer:
+        for i in range(0, len(data), 37):
+            buffer.write(data[i:i + 37])
+
+        assert buffer.size == len(data)
+        assert buffer.head == data[:100]
+        assert buffer.tail == data[-100:]
+        assert buffer.spilled == len(data) - 200
+        assert buffer.read() == data
+        assert buffer.read(50, 5000) == data[50:5000]
+        assert buffer.read(len(data) - 150) == data[-150:]
+
+
+def test_text_is_capped():
+    buffer = OutputBuffer(head_size=4, tail_size=4)
+    buffer.write(b'0123456789' * 3)
+
+    assert buffer.text() == '0123456789' * 3
+    assert buffer.text(8) == '0123\n... [22 bytes omitted] ...\n6789'
+    assert str(buffer.view(8)) == buffer.text(8)
+
+
+def test_executor_caps_command_and_task_output():
+    task = TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        commands=[
+            {'title': 'Noisy', 'slug': 'noisy', 'check': True,
+             'command': 'head -c 100000 /dev/zero | tr "\\0" a'},
+            {'title': 'Quiet', 'slug': 'quiet', 'check': True,
+             'command': 'echo done'},
+        ],
+        runner_id='python_3_10',
+    )
+    executor = CommandExecutor(max_output=1000, max_task_output=1000)
+
+    run = asyncio.run(executor.run_task(task))
+
+    noisy, quiet = task.commands
+    assert noisy.output.startswith('a' * 500)
+    assert '[99000 bytes omitted]' in noisy.output
+    assert quiet.output == '\n... [5 bytes omitted] ...\n'
+    assert run.outputs['noisy'].size == 100000
+    assert run.outputs['noisy'].read(99990) == b'a' * 10
+
+
+def test_buffer_reads_output_that_did_not_spill():
+    data = bytes(range(15))
+    with OutputBuffer(head_size=10, tail_size=10) as buffer:
+        buffer.write(data)
+
+        assert buffer.spilled == 0
+        assert buffer.read() == data
+        assert buffer.read(5, 12) == data[5:12]
+        assert buffer.text(8) == \
+            data[:4].decode() + '\n... [7 bytes omitted] ...\n' \
+            + data[-4:].decode()
+
+
+def test_executor_keeps_output_between_head_and_tail_size():
+    task = TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        commands=[
+            {'title': 'Medium', 'slug': 'medium', 'check': True,
+             'command': 'head -c 700 /dev/zero | tr "\\0" a'},
+        ],
+        runner_id='python_3_10',
+    )
+    executor = CommandExecutor(max_output=1000)
+
+    run = asyncio.run(executor.run_task(task))
+
+    assert run.passed is True
+    assert task.commands[0].output == 'a' * 700
+    assert run.outputs['medium'].buffer.spilled == 0
+
+
+def test_output_is_only_kept_for_commands_that_include_it():
+    task = TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        commands=[
+            {'title': 'Setup', 'slug': 'setup', 'check': True,
+             'include_output': False, 'include_in_env': 'SETUP',
+             'command': 'echo ready'},
+            {'title': 'Test', 'slug': 'test', 'check': True,
+             'command': 'echo "$SETUP"'},
+        ],
+        runner_id='python_3_10',
+    )
+
+    with asyncio.run(CommandExecutor().run_task(task)) as run:
+        setup, test = task.commands
+        assert setup.output is None
+        assert test.output == 'ready\n'
+        assert list(run.outputs) == ['test']
+        assert str(run.outputs['test']) == 'ready\n'
@@ -0,0 +1,95 @@
+from src.task_interfaces import (
+    ShortCircuitEvaluator, Task, TaskCatalog, TaskV2)
+
+
+def make_catalog():
+    return TaskCatalog([
+        Task(
+            name="Lint",
+            summary="",
+            description="",
+            capabilities=[{'type': 'checkrun',
+                           'ignored_authors': ['dependabot[bot]']}],
+            runtime='python',
+        ),
+        TaskV2(
+            name="Tests",
+            summary="",
+            description="",
+            capabilities={'check_run': {'enabled': True,
+                                        'allow_hotfix': True}},
+            commands=[],
+            runner_id='python_3_10',
+        ),
+        Task(
+            name="Notify",
+            summary="",
+            description="",
+            subscribed_events=['pull_request.opened'],
+            runtime='python',
+        ),
+    ])
+
+
+def payload(author='octocat', branch='feature', title='Add feature'):
+    return {'action': 'opened', 'pull_request': {
+        'user': {'login': author}, 'head': {'ref': branch}, 'title': title}}
+
+
+def slugs(tasks):
+    return [x.slug for x in tasks]
+
+
+def test_ignored_author_passes():
+    evaluator = ShortCircuitEvaluator(make_catalog())
+
+    decision = evaluator.evaluate(
+        'pull_request', 'opened', payload(author='dependabot[bot]'))
+
+    assert slugs(decision.passing) == ['lint']
+    assert slugs(decision.dispatch) == ['tests', 'notify']
+
+
+def test_hotfix_branch_or_title_passes():
+    evaluator = ShortCircuitEvaluator(make_catalog())
+
+    by_branch = evaluator.evaluate(
+        'pull_request', 'opened', payload(branch='HOTFIX/login'))
+    by_title = evaluator.evaluate(
+        'pull_request', 'opened', payload(title='Hotfix: broken login'))
+    regular = evaluator.evaluate('pull_request', 'opened', payload())
+
+    assert slugs(by_branch.passing) == ['tests']
+    assert slugs(by_title.passing) == ['tests']
+    assert regular.passing == ()
+    assert slugs(regular.dispatch) == ['lint', 'tests', 'notify']
+
+
+def test_only_check_run_events_pass():
+    catalog = TaskCatalog([
+        TaskV2(
+            name="Format",
+            summary="",
+            description="",
+            capabilities={'check_run': {'enabled': True,
+                                        'allow_hotfix': True,
+                                        'fix_errors': True}},
+            subscribed_events=['pull_request.labeled'],
+            commands=[],
+            runner_id='python_3_10',
+        ),
+    ])
+    evaluator = ShortCircuitEvaluator(catalog)
+    check_run = {'check_run': {'check_suite': {'head_branch': 'hotfix/x'}}}
+
+    rerequested = evaluator.evaluate('check_run', 'rerequested', check_run)
+    requested_action = evaluator.evaluate(
+        'check_run', 'requested_action', check_run)
+    labeled = evaluator.evaluate(
+        'pull_request', 'labeled', payload(branch='hotfix/x'))
+
+    assert slugs(rerequested.passing) == ['format']
+    assert requested_action.passing == ()
+    assert slugs(requested_action.dispatch) == ['format']
+    assert labeled.passing == ()
+    assert slugs(labeled.dispatch) == ['format']
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.task_interfaces import CheckRunReporter, TaskV2
+from src.task_interfaces.output import OutputBuffer
+from src.task_interfaces.reporter import ReportError, parse_annotation
+
+
+def make_task(**check_run):
+    return TaskV2(
+        name="Lint", summary="", description="", commands=[],
+        runner_id='python_3_10',
+        capabilities={'check_run': dict({'enabled': True}, **check_run)})
+
+
+class StubGitHub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.requests = []
+        self.connections = set()
+        # Responses to send before succeeding: (status, headers)
+        self.failures = []
+        self.remaining = 5000
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_PATCH(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.connections.add(self.client_address)
+            failure = server.failures.pop(0) if server.failures else None
+            if failure is None:
+                server.requests.append((self.path, body))
+                server.remaining -= 1
+            remaining = server.remaining
+        status, headers = failure or (200, {})
+        data = b'{}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-RateLimit-Remaining', str(remaining))
+        self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def github():
+    server = StubGitHub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_annotation():
+    assert parse_annotation('./src/app.py:12:5: E501 line too long') == {
+        'path': 'src/app.py', 'start_line': 12, 'end_line': 12,
+        'start_column': 5, 'end_column': 5, 'annotation_level': 'failure',
+        'message': 'E501 line too long'}
+    assert parse_annotation('lib/a.rb:3: warning: unused')[
+        'annotation_level'] == 'warning'
+    assert parse_annotation(
+        '::warning file=a.py,line=2,endLine=4,title=Slow::Loop') == {
+        'path': 'a.py', 'start_line': 2, 'end_line': 4, 'title': 'Slow',
+        'annotation_level': 'warning', 'message': 'Loop'}
+    assert parse_annotation('All checks passed') is None
+    assert parse_annotation('::error::no file') is None
+
+
+def test_parse_annotation_skips_bad_fields_and_foreign_paths():
+    assert parse_annotation('::error file=a.py,line=abc,col=x::Bad') == {
+        'path': 'a.py', 'start_line': 1, 'end_line': 1,
+        'annotation_level': 'failure', 'message': 'Bad'}
+    assert parse_annotation(
+        '/work/repo/src/app.py:3: E1', root='/work/repo')['path'] == \
+        'src/app.py'
+    assert parse_annotation(
+        '::error file=/work/repo/./a.py,line=2::E', root='/work/repo/')[
+        'path'] == 'a.py'
+    assert parse_annotation('/usr/lib/python3/os.py:1: E1',
+                            root='/work/repo') is None
+    assert parse_annotation('/work/repo/src/app.py:3: E1') is None
+    assert parse_annotation('../other/app.py:3: E1') is None
+
+
+def test_reports_in_batches_of_50(github):
+    buffer = OutputBuffer(head_size=1000, tail_size=1000)
+    for i in range(1234):
+        buffer.write(f'src/module_{i % 7}.py:{i + 1}:1: F401 unused\n'.encode())
+        if i % 100 == 0:
+            buffer.write(b'checking...\n')
+    task = make_task(allow_hotfix=True)
+    with CheckRunReporter('token', github.url, max_connections=3) as reporter:
+        result = asyncio.run(reporter.report(
+            task, 'acme/api', 7, buffer, 'failure', 'Lint', '1234 problems'))
+
+    assert result.annotations == 1234
+    assert result.requests == 26
+    assert {x[0] for x in github.requests} == {'/repos/acme/api/check-runs/7'}
+    sizes = sorted(len(x[1]['output'].get('annotations', ()))
+                   for x in github.requests)
+    assert sizes == [0, 34] + [50] * 24
+    final = [x[1] for x in github.requests if 'status' in x[1]]
+    assert final[0]['conclusion'] == 'failure'
+    assert final[0]['actions'] == [{
+        'label': 'Hotfix', 'identifier': 'hotfix',
+        'description': 'Force check to pass for hotfix.'}]
+    # Connections are kept alive and reused
+    assert len(github.connections) <= 3
+
+
+def test_waits_out_rate_limits(github):
+    github.failures = [(403, {'Retry-After': '0.2'})]
+    start = time.monotonic()
+    with CheckRunReporter('token', github.url, max_connections=1) as reporter:
+        result = asyncio.run(reporter.report(
+            make_task(), 'acme/api', 7, 'a.py:1: bad', 'failure', 'Lint'))
+
+    assert time.monotonic() - start >= 0.2
+    assert result.retried == 1
+    assert result.requests == 3
+    assert len(github.requests) == 2
+
+
+def test_error_status_fails_the_report(github):
+    github.failures = [(401, {})] * 100
+    output = ''.join(f'a.py:{i}: bad\n' for i in range(1, 2001))
+    with CheckRunReporter('token', github.url, max_connections=2) as reporter:
+        with pytest.raises(ReportError) as error:
+            asyncio.run(asyncio.wait_for(reporter.report(
+                make_task(), 'acme/api', 7, output, 'failure', 'Lint'), 10))
+
+    assert error.value.status == 401
+    assert github.requests == []
+
+
+def test_paces_when_few_requests_remain():
+    from src.task_interfaces.reporter import _Pacer
+
+    pacer = _Pacer(clock=lambda: 1000.0)
+    assert pacer.update(200, {'X-RateLimit-Remaining': '4000',
+                              'X-RateLimit-Reset': '4600'}) is None
+    assert pacer.delay == 0
+    pacer.update(200, {'X-RateLimit-Remaining': '10',
+                       'X-RateLimit-Reset': '1100'})
+    assert pacer.delay == 10
+
+
+def test_custom_check_runs_are_left_alone(github):
+    with CheckRunReporter('token', github.url) as reporter:
+        result = asyncio.run(reporter.report(
+            make_task(custom=True), 'acme/api', 7, 'a.py:1: bad', 'failure',
+            'Lint'))
+
+    assert result is None
+    assert github.requests == []
@@ -0,0 +1,109 @@
+import asyncio
+
+from src.task_interfaces import CommandExecutor, TaskV2
+from src.task_interfaces.result_cache import ResultCache
+
+
+def make_task(cacheable=True):
+    return TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        commands=[{
+            'title': 'Count', 'slug': 'count', 'check': True,
+            'command': 'echo run >> ../runs; cat *.txt; exit 2',
+            'cacheable': cacheable, 'cache_env': ['MODE'],
+        }],
+        runner_id='python_3_10',
+    )
+
+
+def run(executor, tree, env=None):
+    task = make_task()
+    asyncio.run(executor.run_task(task, env=env, cwd=tree))
+    return task.commands[0]
+
+
+def test_cache_hit_skips_execution(tmp_path):
+    tree = tmp_path / 'tree'
+    tree.mkdir()
+    (tree / 'a.txt').write_text('one\n')
+    cache = ResultCache(str(tmp_path / 'cache'))
+    executor = CommandExecutor(cache=cache)
+
+    first = run(executor, tree)
+    second = run(executor, tree)
+
+    assert (first.exit_code, first.output) == (2, 'one\n')
+    assert (second.exit_code, second.output) == (2, 'one\n')
+    assert second.completed is True
+    assert (tmp_path / 'runs').read_text() == 'run\n'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    (tree / 'a.txt').write_text('two\n')
+    assert run(executor, tree).output == 'two\n'
+    assert run(executor, tree, env={'MODE': 'strict'}).output == 'two\n'
+    assert (tmp_path / 'runs').read_text() == 'run\n' * 3
+
+
+def test_commands_are_not_cached_by_default(tmp_path):
+    tree = tmp_path / 'tree'
+    tree.mkdir()
+    cache = ResultCache(str(tmp_path / 'cache'))
+    task = make_task(cacheable=False)
+    executor = CommandExecutor(cache=cache)
+    asyncio.run(executor.run_task(task, cwd=tree))
+    asyncio.run(executor.run_task(task, cwd=tree))
+
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert (tmp_path / 'runs').read_text() == 'run\n' * 2
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=300)
+    for i in range(10):
+        cache.put(f'{i:064x}', 0, 'x' * 50)
+
+    assert cache.get(f'{9:064x}') is not None
+    assert cache.get(f'{0:064x}') is None
+    assert cache._size <= 300
+
+
+def test_cached_output_is_exported_whole(tmp_path):
+    def make():
+        return TaskV2(
+            name="Test",
+            summary="",
+            description="",
+            commands=[
+                {'title': 'Make', 'slug': 'make', 'check': True,
+                 'cacheable': True, 'include_in_env': 'VALUE',
+                 'command': 'head -c 5000 /dev/zero | tr "\\0" a'},
+                {'title': 'Use', 'slug': 'use', 'check': True,
+                 'command': 'printf %s "$VALUE" | wc -c'},
+            ],
+            runner_id='python_3_10',
+        )
+
+    tree = tmp_path / 'tree'
+    tree.mkdir()
+    cache = ResultCache(str(tmp_path / 'cache'))
+    executor = CommandExecutor(cache=cache, max_output=1000)
+    outputs = []
+    for _ in range(2):
+        task = make()
+        asyncio.run(executor.run_task(task, cwd=tree))
+        outputs.append(task.commands[1].output.strip())
+
+    assert cache.hits == 1
+    assert outputs == ['5000', '5000']
+
+
+def test_shell_is_part_of_the_key(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    task = make_task()
+    keys = {
+        cache.key(task.commands[0], task.runner_id, {}, str(tmp_path),
+                  shell=shell) for shell in (None, '/bin/bash')}
+
+    assert len(keys) == 2
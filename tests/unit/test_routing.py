@@ -0,0 +1,102 @@
+import io
+import json
+
+from src.task_interfaces import (
+    RoutingRecord, ShortCircuitEvaluator, extract_routing)
+
+from .test_prefilter import make_catalog, slugs
+
+
+def pull_request(body='Fixes "the" bug \\ and é', **extra):
+    payload = {
+        'action': 'opened',
+        'number': 3,
+        'pull_request': {
+            'url': 'https://api.github.com/repos/acme/api/pulls/3',
+            'title': 'Hotfix: login',
+            'user': {'login': 'octocat', 'id': 1},
+            'body': body,
+            'head': {'label': 'octocat:fix', 'ref': 'fix/login',
+                     'repo': {'id': 7, 'topics': ['a', 'b']}},
+        },
+        'repository': {'id': 42, 'name': 'api'},
+    }
+    payload.update(extra)
+    return json.dumps(payload, indent=2).encode()
+
+
+class TrackingReader(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.read_bytes += len(chunk)
+        return chunk
+
+
+def test_extracts_pull_request_fields():
+    expected = RoutingRecord(
+        event='pull_request', action='opened', repository_id=42,
+        author='octocat', head_branch='fix/login', title='Hotfix: login')
+
+    assert extract_routing('pull_request', pull_request()) == expected
+    assert expected.event_name == 'pull_request.opened'
+    # Tiny chunks split keys, escapes and numbers across reads
+    for chunk_size in (1, 3, 7, 64):
+        assert extract_routing(
+            'pull_request', io.BytesIO(pull_request()), chunk_size) == expected
+
+
+def test_skips_large_strings_and_stops_early():
+    data = pull_request(body='x\\"' * 100000, sender={'login': 'z' * 50000})
+    source = TrackingReader(data)
+
+    record = extract_routing('pull_request', source, chunk_size=1024)
+
+    assert record.repository_id == 42
+    assert record.head_branch == 'fix/login'
+    # The sender after the repository is never read
+    assert source.read_bytes < len(data) - 40000
+
+
+def test_check_run_requested_action():
+    data = json.dumps({
+        'action': 'requested_action',
+        'check_run': {'id': 1, 'check_suite': {'head_branch': 'main'}},
+        'requested_action': {'identifier': 'hotfix'},
+        'repository': {'id': 42},
+    }).encode()
+
+    record = extract_routing('check_run', data)
+
+    assert record.requested_action == 'hotfix'
+    assert record.head_branch == 'main'
+    assert record.event_name == 'check_run.requested_action'
+
+
+def test_missing_fields_and_streams_agree():
+    data = json.dumps({
+        'action': 'closed',
+        'pull_request': {'user': None, 'head': {'ref': 'main'}},
+        'repository': {'id': 42},
+    }).encode()
+
+    record = extract_routing('pull_request', data)
+
+    assert record == RoutingRecord(
+        event='pull_request', action='closed', repository_id=42,
+        head_branch='main')
+    assert extract_routing('pull_request', io.BytesIO(data)) == record
+    assert extract_routing('pull_request', memoryview(data)) == record
+
+
+def test_evaluate_record():
+    evaluator = ShortCircuitEvaluator(make_catalog())
+
+    decision = evaluator.evaluate_record(
+        extract_routing('pull_request', pull_request()))
+
+    assert slugs(decision.passing) == ['tests']
+    assert slugs(decision.dispatch) == ['lint', 'notify']
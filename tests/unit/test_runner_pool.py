@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from src.task_interfaces import RunnerPool
+from src.task_interfaces.runner_pool import WorkerCrashed
+
+SCRIPT = '''
+import os
+
+calls = []
+
+
+def run(value, scale=1):
+    calls.append(value)
+    print('running', value)
+    return {'value': value * scale, 'calls': len(calls), 'pid': os.getpid(),
+            'mode': os.environ.get('MODE')}
+
+
+def fail():
+    raise ValueError('broken task')
+
+
+def crash():
+    os._exit(3)
+
+
+def grow():
+    # Kept alive past the run, like a leaking task would
+    os.blob = bytearray(64 * 1024 * 1024)
+'''
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / 'task.py'
+    path.write_text(SCRIPT)
+    return str(path)
+
+
+def test_runs_reuse_warm_workers(script):
+    async def main():
+        async with RunnerPool(preload=['json'], max_size=2) as pool:
+            await pool.prewarm('python_3_10', 1)
+            first = await pool.run('python_3_10', script, args=[2],
+                                   kwargs={'scale': 3}, env={'MODE': 'ci'})
+            second = await pool.run('python_3_10', script, args=[1])
+            return first, second, pool.metrics('python_3_10')
+
+    first, second, metrics = asyncio.run(main())
+
+    assert first.ok and first.hit
+    assert first.result['value'] == 6
+    assert first.result['mode'] == 'ci'
+    assert first.output == 'running 2\n'
+    # Same process, fresh module, environment restored
+    assert second.result['pid'] == first.result['pid']
+    assert second.result['calls'] == 1
+    assert second.result['mode'] is None
+    assert metrics.hits == 2
+    assert metrics.misses == 0
+    assert metrics.started == 1
+
+
+def test_waits_for_busy_workers_and_records_demand(script):
+    async def main():
+        async with RunnerPool(max_size=2) as pool:
+            results = await asyncio.gather(
+                *(pool.run('python_3_10', script, args=[i])
+                  for i in range(6)))
+            return results, pool.metrics('python_3_10'), \
+                pool.target_size('python_3_10')
+
+    results, metrics, target = asyncio.run(main())
+
+    assert [x.result['value'] for x in results] == list(range(6))
+    assert len({x.result['pid'] for x in results}) == 2
+    assert metrics.misses == 2 + metrics.queued
+    assert metrics.queued >= 1
+    assert metrics.queue_wait_max > 0
+    assert target == 2
+
+
+def test_recycles_and_reports_failures(script):
+    async def main():
+        async with RunnerPool(max_runs=2, max_rss=48 * 1024 * 1024) as pool:
+            pids = []
+            for _ in range(3):
+                result = await pool.run('python_3_10', script, args=[0])
+                pids.append(result.result['pid'])
+                await asyncio.sleep(0.05)
+            failed = await pool.run('python_3_10', script, 'fail')
+            with pytest.raises(WorkerCrashed):
+                await pool.run('python_3_10', script, 'crash')
+            await pool.run('python_3_10', script, 'grow')
+            await asyncio.sleep(0.05)
+            return pids, failed, pool.metrics('python_3_10')
+
+    pids, failed, metrics = asyncio.run(main())
+
+    assert pids[0] == pids[1] != pids[2]
+    assert not failed.ok
+    assert 'ValueError: broken task' in failed.error
+    assert metrics.crashed == 1
+    # After max_runs and after growing past max_rss
+    assert metrics.recycled == 3
+
+
+def test_crash_does_not_strand_queued_runs(script):
+    async def main():
+        async with RunnerPool(max_size=1) as pool:
+            crashed, queued = await asyncio.wait_for(asyncio.gather(
+                pool.run('python_3_10', script, 'crash'),
+                pool.run('python_3_10', script, args=[5]),
+                return_exceptions=True), 10)
+            return crashed, queued, pool.metrics('python_3_10')
+
+    crashed, queued, metrics = asyncio.run(main())
+
+    assert isinstance(crashed, WorkerCrashed)
+    assert queued.ok and queued.result['value'] == 5
+    assert metrics.crashed == 1 and metrics.started == 2
+
+
+def test_unknown_runner(script):
+    with pytest.raises(ValueError):
+        asyncio.run(RunnerPool().run('node_16', script))
@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from src.task_interfaces import CommandExecutor, DagScheduler, TaskV2
+
+
+def make_task(commands):
+    return TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        commands=[
+            dict({'title': x['slug'], 'check': False}, **x) for x in commands],
+        runner_id='python_3_10',
+    )
+
+
+def test_independent_commands_run_in_parallel():
+    task = make_task([
+        {'slug': 'lint', 'command': 'sleep 0.3'},
+        {'slug': 'types', 'command': 'sleep 0.3'},
+        {'slug': 'version', 'command': 'echo 7', 'include_in_env': 'VER'},
+        {'slug': 'test', 'command': 'sleep 0.1; echo $VER',
+         'depends_on': ['lint']},
+    ])
+
+    report = asyncio.run(DagScheduler(max_concurrency=3).run_task(task))
+
+    assert report.passed is True
+    assert task.commands[3].output == '7\n'
+    assert report.critical_path == ['lint', 'test']
+    assert report.critical_path_duration >= 0.4
+    assert report.duration < 0.7
+    assert set(report.durations) == {'lint', 'types', 'version', 'test'}
+
+
+def test_failed_check_fails_fast():
+    task = make_task([
+        {'slug': 'lint', 'command': 'exit 1', 'check': True},
+        {'slug': 'slow', 'command': 'sleep 5'},
+        {'slug': 'test', 'command': 'echo test', 'depends_on': ['slow']},
+        {'slug': 'report', 'command': 'echo report', 'run_on_fail': True,
+         'depends_on': ['lint']},
+    ])
+
+    report = asyncio.run(DagScheduler().run_task(task))
+
+    assert report.passed is False
+    assert report.failed_command == 'lint'
+    assert report.skipped == ['slow', 'test']
+    assert report.duration < 2
+    assert task.commands[1].completed is False
+    assert task.commands[3].output == 'report\n'
+
+
+def test_checks_failing_together():
+    class InstantScheduler(DagScheduler):
+        async def _run_command(self, task, command, *args):
+            command.exit_code, command.duration = 1, 0.0
+            return ''
+
+    task = make_task([
+        {'slug': 'lint', 'command': 'exit 1', 'check': True},
+        {'slug': 'types', 'command': 'exit 1', 'check': True},
+    ])
+
+    report = asyncio.run(InstantScheduler().run_task(task))
+
+    assert report.passed is False
+    assert report.failed_command in ('lint', 'types')
+    assert set(report.durations) == {'lint', 'types'}
+    assert report.skipped == []
+
+
+def test_invalid_dependencies_are_rejected():
+    with pytest.raises(ValidationError):
+        make_task([{'slug': 'a', 'command': 'true', 'depends_on': ['b']}])
+
+    with pytest.raises(ValidationError):
+        make_task([
+            {'slug': 'a', 'command': 'true', 'depends_on': ['b']},
+            {'slug': 'b', 'command': 'true', 'depends_on': ['a']},
+        ])
+
+
+def test_slugs_only_have_to_be_unique_with_dependencies():
+    # Configs from before dependencies could repeat slugs
+    task = make_task([
+        {'slug': 'lint', 'command': 'echo one'},
+        {'slug': 'lint', 'command': 'echo two'},
+    ])
+    with asyncio.run(CommandExecutor().run_task(task)) as run:
+        assert run.passed is True
+        assert str(run.outputs['lint']) == 'two\n'
+    with pytest.raises(ValueError):
+        asyncio.run(DagScheduler().run_task(task))
+
+    with pytest.raises(ValidationError):
+        make_task([
+            {'slug': 'lint', 'command': 'true'},
+            {'slug': 'lint', 'command': 'true', 'depends_on': ['lint']},
+        ])
+    with pytest.raises(ValidationError):
+        make_task([
+            {'slug': 'lint', 'command': 'echo 1', 'include_in_env': 'ONE'},
+            {'slug': 'lint', 'command': 'echo $ONE'},
+        ])
+
+
+def test_command_errors_cancel_the_others(tmp_path):
+    task = make_task([
+        {'slug': 'slow', 'command': f'sleep 0.5; touch {tmp_path}/ran'},
+        {'slug': 'broken', 'command': 'true'},
+    ])
+    scheduler = DagScheduler()
+    run_command = scheduler.executor.run_command
+
+    async def fail_broken(command, *args, **kwargs):
+        if command.slug == 'broken':
+            raise OSError('no such directory')
+        return await run_command(command, *args, **kwargs)
+
+    scheduler.executor.run_command = fail_broken
+
+    async def main():
+        with pytest.raises(OSError):
+            await scheduler.run_task(task)
+        # Still on the loop that ran the task
+        await asyncio.sleep(0.7)
+
+    asyncio.run(main())
+    assert not (tmp_path / 'ran').exists()
+
+
+def test_run_on_fail_commands_run_after_skipped_dependencies():
+    task = make_task([
+        {'slug': 'check', 'command': 'exit 1', 'check': True},
+        {'slug': 'build', 'command': 'echo build', 'depends_on': ['check']},
+        {'slug': 'cleanup', 'command': 'echo cleanup', 'run_on_fail': True,
+         'depends_on': ['build']},
+    ])
+
+    report = asyncio.run(DagScheduler().run_task(task))
+
+    assert report.failed_command == 'check'
+    assert report.skipped == ['build']
+    assert task.commands[2].output == 'cleanup\n'
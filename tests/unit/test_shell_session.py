@@ -0,0 +1,51 @@
+import asyncio
+
+from src.task_interfaces import CommandExecutor
+from src.task_interfaces.output import OutputBuffer
+from src.task_interfaces.shell_session import ShellSession
+
+from .test_executor import make_task
+
+
+def test_state_persists_between_commands(tmp_path):
+    async def main():
+        results = []
+        async with ShellSession(cwd=str(tmp_path)) as session:
+            for command in (
+                    'export GREETING=hello; cd /; printf "no newline"',
+                    'echo "$GREETING from $PWD"; echo oops >&2; false',
+                    'echo "unterminated',
+                    'read line; echo "read: $line"',
+                    'exit 7',
+                    'echo "$GREETING again from $PWD"'):
+                buffer = OutputBuffer()
+                exit_code = await session.run(command, buffer)
+                results.append((exit_code, buffer.read()))
+            return results, session.started
+
+    results, started = asyncio.run(main())
+
+    assert results[0] == (0, b'no newline')
+    assert results[1] == (1, b'hello from /\noops\n')
+    # A syntax error fails only its own command
+    assert results[2][0] == 2
+    assert results[3] == (0, b'read: \n')
+    # Exiting restarts the shell with the exported state
+    assert results[4] == (7, b'')
+    assert results[5] == (0, b'hello again from /\n')
+    assert started == 2
+
+
+def test_executor_persistent_shell():
+    task = make_task([
+        {'slug': 'setup', 'command': 'export MODE=fast; cd /tmp'},
+        {'slug': 'version', 'command': 'echo 1.2.3', 'include_in_env': 'VER'},
+        {'slug': 'use', 'command': 'echo "$MODE $VER $PWD"'},
+    ])
+
+    run = asyncio.run(
+        CommandExecutor(persistent_shell=True).run_task(task))
+
+    assert run.passed is True
+    assert task.commands[2].output == 'fast 1.2.3 /tmp\n'
+    assert all(x.duration >= 0 for x in task.commands)
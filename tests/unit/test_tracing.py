@@ -0,0 +1,71 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+from src.task_interfaces import (
+    CommandExecutor, DagScheduler, HistogramSink, JsonLinesSink, Tracer)
+from src.task_interfaces.tracing import NULL_TRACER, Histogram, Span
+
+from .test_executor import make_task
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for i in range(1, 1001):
+        histogram.add(i / 1000)
+
+    assert histogram.count == 1000
+    assert histogram.percentile(0.5) == pytest.approx(0.5, rel=0.1)
+    assert histogram.percentile(0.99) == pytest.approx(0.99, rel=0.1)
+    assert histogram.percentile(1) == 1.0
+    assert Histogram().percentile(0.5) is None
+
+
+def test_outliers_by_task_and_runner():
+    sink = HistogramSink()
+    tracer = Tracer(sink)
+    for i in range(100):
+        tracer.emit(Span('command', 'lint', 'python_3_10', duration=0.01))
+        tracer.emit(Span('command', 'tests', 'node_16',
+                         duration=5.0 if i == 99 else 0.01))
+
+    slowest = sink.outliers('command', q=1)
+    assert [x[0] for x in slowest] == ['tests', 'lint']
+    assert sink.percentile('command', 0.5, task='tests') == pytest.approx(
+        0.01, rel=0.1)
+    assert sink.percentile('command', 1, runner_id='node_16') == 5.0
+    assert sink.summary()[('command', 'all', None)]['count'] == 200
+
+
+def test_executor_and_scheduler_emit_spans():
+    sink = HistogramSink()
+    lines = io.StringIO()
+    tracer = Tracer(sink, JsonLinesSink(lines))
+    task = make_task([
+        {'slug': 'build', 'command': 'echo build'},
+        {'slug': 'test', 'command': 'exit 2', 'check': True},
+    ])
+
+    asyncio.run(CommandExecutor(tracer=tracer).run_task(task))
+    asyncio.run(DagScheduler(CommandExecutor(tracer=tracer)).run_task(
+        task.copy(deep=True)))
+
+    spans = [json.loads(x) for x in lines.getvalue().splitlines()]
+    assert [(x['name'], x['attributes'].get('command')) for x in spans[:3]] \
+        == [('command', 'build'), ('command', 'test'), ('task', None)]
+    assert spans[1]['attributes']['exit_code'] == 2
+    assert spans[2]['task'] == 'test'
+    assert spans[2]['runner_id'] == 'python_3_10'
+    assert spans[2]['attributes']['passed'] is False
+    assert len(spans) == 6
+    assert sink.histogram('command', task='test').count == 4
+
+
+def test_null_tracer_is_shared_noop():
+    span = NULL_TRACER.span('command', None, command='x')
+    with span as active:
+        active.set(exit_code=0)
+
+    assert span is NULL_TRACER.span('task')
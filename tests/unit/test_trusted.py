@@ -0,0 +1,62 @@
+import json
+
+from src.task_interfaces import Task, TaskV2, trusted
+from src.task_interfaces.task_v2 import RunnerId
+
+
+def make_task_v2():
+    return TaskV2(
+        name="Test",
+        summary="",
+        description="",
+        capabilities={'check_run': {'enabled': True, 'fix_errors': True}},
+        commands=[{'title': 'Lint', 'slug': 'lint', 'command': 'flake8',
+                   'check': True}],
+        runner_id='python_3_10',
+    )
+
+
+def test_round_trip_skips_validation(monkeypatch):
+    task = make_task_v2()
+    data = trusted.dumps(task)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('validated a trusted manifest')
+
+    monkeypatch.setattr(trusted, 'parse_task', fail)
+    loaded = trusted.loads(data)
+
+    assert loaded == task
+    assert loaded.runner_id is RunnerId.PYTHON_3_10
+    assert loaded.commands[0].check is True
+    assert loaded.to_json() == task.to_json()
+
+
+def test_round_trip_v1():
+    task = Task(
+        name="Test",
+        summary="",
+        description="",
+        capabilities=[{'type': 'checkout', 'depth': 3},
+                      {'type': 'checkrun', 'ignored_authors': ['bot']}],
+        runtime='python',
+    )
+
+    loaded = trusted.loads(trusted.dumps(task))
+
+    assert loaded == task
+    assert loaded.get_checkout_depth() == 3
+    assert loaded.ignored_authors() == ['bot']
+
+
+def test_tampered_or_stale_manifest_is_validated(monkeypatch):
+    task = make_task_v2()
+    data = trusted.dumps(task)
+    tampered = data.replace(b'"Test"', b'"Other"', 1)
+
+    assert trusted.loads(tampered).slug == 'other'
+
+    monkeypatch.setattr(trusted, 'schema_version', lambda: 'stale')
+    assert trusted.loads(data) == task
+    assert trusted.loads(task.json().encode()) == task
+    assert json.loads(data.partition(b'\n')[2])['slug'] == 'test'
@@ -0,0 +1,165 @@
+import os
+import threading
+
+import pytest
+
+from src.task_interfaces import CatalogWatcher, CompactCatalog
+
+CONFIG = """
+name: {name}
+summary: Test Task
+description: Test Task
+subscribed_events:
+  - {event}
+capabilities:
+  - type: checkout
+runtime: python
+"""
+
+
+def write(root, directory, name, event='pull_request.opened'):
+    path = root / directory
+    os.makedirs(path, exist_ok=True)
+    (path / 'task_config.yaml').write_text(
+        CONFIG.format(name=name, event=event))
+    return path / 'task_config.yaml'
+
+
+def bump(path):
+    # Content changes within the same mtime tick must still be seen
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def slugs(tasks):
+    return [x.slug for x in tasks]
+
+
+def test_only_changed_configs_are_reloaded(tmp_path):
+    for i in range(10):
+        write(tmp_path, f'task-{i}', f'Task {i}')
+    watcher = CatalogWatcher(tmp_path, max_workers=1)
+    before = watcher.catalog
+    assert len(before) == 10 and watcher.generation == 1
+
+    bump(write(tmp_path, 'task-3', 'Task 3', event='issues.opened'))
+    report = watcher.poll()
+
+    assert report.upserted == ['task-3'] and report.checked == 1
+    assert report.generation == watcher.generation == 2
+    assert slugs(watcher.catalog.tasks_for_event('issues.opened')) == [
+        'task-3']
+    assert 'task-3' not in slugs(
+        watcher.catalog.tasks_for_event('pull_request.opened'))
+    # The previous snapshot is untouched
+    assert slugs(before.tasks_for_event('issues.opened')) == []
+
+    # Touching a file without changing it publishes nothing
+    bump(tmp_path / 'task-4' / 'task_config.yaml')
+    report = watcher.poll()
+    assert report.checked == 1 and not report.changed
+    assert watcher.catalog is not before and watcher.generation == 2
+    assert not watcher.poll().checked
+
+
+def test_broken_deleted_and_duplicate_configs(tmp_path):
+    write(tmp_path, 'a', 'Task A')
+    write(tmp_path, 'b', 'Task B')
+    watcher = CatalogWatcher(tmp_path, max_workers=1)
+
+    broken = tmp_path / 'a' / 'task_config.yaml'
+    broken.write_text('name: Task A\n')
+    bump(broken)
+    report = watcher.poll()
+    assert not report.changed and len(report.errors) == 1
+    # The last good version keeps serving
+    assert 'task-a' in watcher.catalog
+    assert not watcher.poll().errors
+
+    os.remove(tmp_path / 'b' / 'task_config.yaml')
+    write(tmp_path, 'c', 'Task A')
+    report = watcher.poll()
+    assert report.removed == ['task-b']
+    assert 'Duplicate task slug' in report.errors[0].error
+    assert slugs(watcher.catalog) == ['task-a']
+
+    # Once a gives up the slug, the config rejected for it takes it over
+    bump(write(tmp_path, 'a', 'Task A2'))
+    report = watcher.poll()
+    assert sorted(report.upserted) == ['task-a', 'task-a2']
+    assert not report.removed
+    assert sorted(slugs(watcher.catalog)) == ['task-a', 'task-a2']
+    assert watcher.catalog.get('task-a') is not None
+
+    os.remove(tmp_path / 'c' / 'task_config.yaml')
+    assert watcher.poll().removed == ['task-a']
+
+
+def test_watch_survives_failing_polls(tmp_path, monkeypatch):
+    write(tmp_path, 'a', 'Task A')
+    watcher = CatalogWatcher(tmp_path)
+    reports = []
+    recovered = threading.Event()
+    calls = []
+    poll = watcher.poll
+
+    def flaky_poll():
+        calls.append(1)
+        if len(calls) == 1:
+            raise KeyError('name')
+        recovered.set()
+        return poll()
+
+    monkeypatch.setattr(watcher, 'poll', flaky_poll)
+    watcher.subscribe(lambda catalog, report: reports.append(report))
+    with watcher.start(interval=0.01):
+        assert recovered.wait(5)
+
+    assert "KeyError: 'name'" in reports[0].errors[0].error
+    assert not reports[0].changed
+
+
+def test_failed_reloads_are_retried(tmp_path, monkeypatch, capsys):
+    write(tmp_path, 'a', 'Task A')
+    watcher = CatalogWatcher(tmp_path, max_workers=1)
+    catalog_type = type(watcher.catalog)
+
+    def broken(self, upserts=(), removals=()):
+        raise RuntimeError('with_changes')
+
+    bump(write(tmp_path, 'a', 'Task A', event='issues.opened'))
+    monkeypatch.setattr(catalog_type, 'with_changes', broken)
+    with pytest.raises(RuntimeError):
+        watcher.poll()
+    monkeypatch.undo()
+    assert watcher.generation == 1
+
+    reports = []
+
+    def failing(catalog, report):
+        raise RuntimeError('listener')
+
+    watcher.subscribe(failing)
+    watcher.subscribe(lambda catalog, report: reports.append(report))
+    report = watcher.poll()
+
+    assert report.upserted == ['task-a'] and watcher.generation == 2
+    assert slugs(watcher.catalog.tasks_for_event('issues.opened')) == [
+        'task-a']
+    assert reports == [report]
+    assert 'RuntimeError: listener' in capsys.readouterr().err
+
+
+def test_watch_thread_publishes_compact_snapshots(tmp_path):
+    write(tmp_path, 'a', 'Task A')
+    reloaded = threading.Event()
+    with CatalogWatcher(tmp_path, CompactCatalog) as watcher:
+        watcher.subscribe(lambda catalog, report: reloaded.set())
+        watcher.start(interval=0.01)
+        write(tmp_path, 'b', 'Task B')
+        assert reloaded.wait(5)
+
+    catalog = watcher.catalog
+    assert isinstance(catalog, CompactCatalog)
+    assert slugs(catalog.tasks_for_event('pull_request.opened')) == [
+        'task-a', 'task-b']